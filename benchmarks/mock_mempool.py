@@ -0,0 +1,400 @@
+"""Local stand-in for the mempool.space API, serving a synthetic transaction graph.
+
+Serves GET /tx/{txid}, /tx/{txid}/outspends and the bulk /txs/outspends?txids=a,b
+like mempool.space, a websocket at /v1/ws that pushes new transactions to clients
+tracking their addresses ({"track-addresses": [...]}), plus control endpoints:
+    /__stats   request counters (total, per endpoint, duplicates, injected faults)
+    /__reset   zero the counters
+    /__spend?txid=...&vout=...[&replace=1]   broadcast a new tx spending that output (see spend())
+    /__confirm?txid=...   mine a mempool tx (see confirm())
+
+Run standalone to poke at it by hand:
+    python -m benchmarks.mock_mempool --fanout 3 --depth 4 --port 8999
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+FEE = 200 # sats taken out of every synthetic transaction
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11" # RFC 6455 handshake constant
+
+def _txid(n):
+    return hashlib.sha256(f"synthetic-{n}".encode()).hexdigest()
+
+def _address(txid, vout):
+    return "bc1q" + hashlib.sha256(f"{txid}:{vout}".encode()).hexdigest()[:38]
+
+def generate_graph(fanout=3, depth=4, unspent_rate=0.1, merge_rate=0.0, root_value=100_000_000, seed=1):
+    """Build a layered spend graph rooted at one output.
+
+    Every output of layer d is spent by a layer d+1 transaction with `fanout` outputs,
+    except round(unspent_rate * outputs in the layer) randomly picked ones that stay
+    unspent (as does the whole last layer); a fixed count keeps the graph size stable
+    across seeds.
+    With `merge_rate` > 0 consecutive outputs are sometimes spent together by one
+    multi-input transaction, so the tracer reaches the same tx along several paths.
+    Returns (root_txid, txs, outspends): txs maps txid -> mempool-style tx JSON and
+    outspends maps txid -> list of (spending_txid, vin) or None per output.
+    """
+    rnd = random.Random(seed)
+    txs, outspends = {}, {}
+
+    def add_tx(inputs, n_outputs):
+        txid = _txid(len(txs))
+        total = sum(txs[prev]["vout"][vout]["value"] for prev, vout in inputs) if inputs else root_value
+        weights = [rnd.random() ** 3 for _ in range(n_outputs)] # Skewed, like a payment plus change
+        values = [max(int((total - FEE) * w / sum(weights)), 1) for w in weights]
+        txs[txid] = {
+            "txid": txid,
+            "vin": [{"txid": prev, "vout": vout, "prevout": txs[prev]["vout"][vout]} for prev, vout in inputs],
+            "vout": [{"value": value, "scriptpubkey_type": rnd.choice(("v0_p2wpkh", "v1_p2tr", "p2pkh")),
+                      "scriptpubkey_address": _address(txid, vout)}
+                     for vout, value in enumerate(values)],
+            "status": {"confirmed": True},
+        }
+        outspends[txid] = [None] * n_outputs
+        for vin, (prev, vout) in enumerate(inputs):
+            outspends[prev][vout] = (txid, vin)
+        return txid
+
+    root = add_tx([], 1)
+    layer = [(root, 0)]
+    for _ in range(depth):
+        next_layer = []
+        unspent = set(rnd.sample(range(len(layer)), round(unspent_rate * len(layer))))
+        i = 0
+        while i < len(layer):
+            inputs = [layer[i]]
+            i += 1
+            if i - 1 in unspent:
+                continue
+            while i < len(layer) and i not in unspent and rnd.random() < merge_rate:
+                inputs.append(layer[i])
+                i += 1
+            txid = add_tx(inputs, fanout)
+            next_layer.extend((txid, vout) for vout in range(fanout))
+        layer = next_layer
+    return root, txs, outspends
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 256 # The default backlog of 5 drops bursts of new connections (1s SYN retries)
+
+class _WebSocketConnection:
+    """Server side of one RFC 6455 connection: text frames, ping/pong and close, just enough for the spend feed."""
+
+    def __init__(self, handler):
+        self.rfile = handler.rfile
+        self.wfile = handler.wfile
+        self.sock = handler.connection
+        self._send_lock = threading.Lock()
+
+    def send_json(self, body):
+        self._send(0x1, json.dumps(body).encode())
+
+    def _send(self, opcode, payload):
+        n = len(payload)
+        if n < 126:
+            header = bytes([0x80 | opcode, n])
+        elif n < 1 << 16:
+            header = bytes([0x80 | opcode, 126]) + n.to_bytes(2, "big")
+        else:
+            header = bytes([0x80 | opcode, 127]) + n.to_bytes(8, "big")
+        with self._send_lock:
+            try:
+                self.wfile.write(header + payload)
+                self.wfile.flush()
+            except OSError:
+                pass # The reader side notices the dead connection
+
+    def receive(self):
+        """Next text message, or None once the connection is closed."""
+        while True:
+            head = self.rfile.read(2)
+            if len(head) < 2:
+                return None
+            opcode, length = head[0] & 0x0F, head[1] & 0x7F
+            if length == 126:
+                length = int.from_bytes(self.rfile.read(2), "big")
+            elif length == 127:
+                length = int.from_bytes(self.rfile.read(8), "big")
+            mask = self.rfile.read(4) if head[1] & 0x80 else bytes(4) # Clients always mask
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self.rfile.read(length)))
+            if opcode == 0x8: # Close
+                self._send(0x8, payload[:2])
+                return None
+            if opcode == 0x9: # Ping
+                self._send(0xA, payload)
+            elif opcode == 0x1:
+                return payload.decode()
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+class MockMempoolServer:
+    """Threaded HTTP server for a generated graph, with injectable latency, errors and throttling.
+
+    latency is seconds slept per request, error_rate the fraction of requests answered
+    with a 500 and throttle_rate the fraction answered with a 429 carrying `retry_after`.
+    websocket=False answers /v1/ws with 404; clients asking to track more than
+    max_tracked_addresses addresses get mempool.space's "track-addresses-error".
+    """
+
+    def __init__(self, txs, outspends, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0,
+                 throttle_rate=0.0, retry_after=1, seed=1, bulk_outspends=True, websocket=True,
+                 max_tracked_addresses=1000):
+        self.txs = txs
+        self.outspends = outspends
+        self.bulk_outspends = bulk_outspends # Serve /txs/outspends?txids=...; False answers it with 404
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.websocket = websocket
+        self.max_tracked_addresses = max_tracked_addresses
+        self._ws_clients = {} # _WebSocketConnection -> set of tracked addresses
+        self._broadcasts = 0 # Makes the txids of replacement spends unique
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset_stats()
+        self.httpd = _Server((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_port}"
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = Counter() # endpoint -> requests received
+            self.served = Counter() # path -> successful responses
+            self.errors = 0
+            self.throttled = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": sum(self.requests.values()),
+                "by_endpoint": dict(self.requests),
+                "duplicates": sum(n - 1 for n in self.served.values()), # Same path served more than once
+                "errors_injected": self.errors,
+                "throttles_injected": self.throttled,
+                "websocket_clients": len(self._ws_clients),
+            }
+
+    def _respond(self, path):
+        """(status, headers, body) for a GET of `path`."""
+        if path == "/__stats":
+            return 200, {}, self.stats()
+        if path == "/__reset":
+            self.reset_stats()
+            return 200, {}, {}
+        if path.startswith("/__spend?"):
+            query = parse_qs(path.partition("?")[2])
+            try:
+                return 200, {}, {"txid": self.spend(query["txid"][0], int(query["vout"][0]),
+                                                    replace=query.get("replace", ["0"])[0] == "1")}
+            except (KeyError, IndexError, ValueError) as e:
+                return 400, {}, {"error": f"cannot spend that output: {e!r}"}
+        if path.startswith("/__confirm?"):
+            try:
+                self.confirm(parse_qs(path.partition("?")[2])["txid"][0])
+            except (KeyError, IndexError) as e:
+                return 400, {}, {"error": f"cannot confirm that tx: {e!r}"}
+            return 200, {}, {}
+
+        path, _, query = path.partition("?")
+        parts = path.strip("/").split("/")
+        if parts == ["txs", "outspends"]:
+            endpoint = "outspends_bulk"
+        else:
+            endpoint = "outspends" if parts[-1] == "outspends" else "tx"
+        with self._lock:
+            self.requests[endpoint] += 1
+            roll = self._random.random()
+            if roll < self.throttle_rate:
+                self.throttled += 1
+                return 429, {"Retry-After": str(self.retry_after)}, {"error": "Too Many Requests"}
+            if roll < self.throttle_rate + self.error_rate:
+                self.errors += 1
+                return 500, {}, {"error": "Internal Server Error"}
+
+        if endpoint == "outspends_bulk":
+            return self._respond_bulk_outspends(parse_qs(query).get("txids", [""])[0].split(","))
+        if self.latency:
+            time.sleep(self.latency)
+        if len(parts) < 2 or parts[-2 if endpoint == "outspends" else -1] not in self.txs:
+            return 404, {}, "Transaction not found"
+        if endpoint == "outspends":
+            body = self._outspends_body(parts[-2])
+        else:
+            body = self.txs[parts[-1]]
+        with self._lock:
+            self.served[path] += 1
+        return 200, {}, body
+
+    def _outspends_body(self, txid):
+        return [{"spent": True, "txid": spend[0], "vin": spend[1], "status": dict(self.txs[spend[0]]["status"])}
+                if spend else {"spent": False} for spend in self.outspends[txid]]
+
+    def _respond_bulk_outspends(self, txids):
+        """Esplora's bulk route: one outspends list per requested txid, in order (empty if unknown)."""
+        if not self.bulk_outspends:
+            return 404, {}, "Not Found"
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            for txid in txids:
+                self.served[f"/tx/{txid}/outspends"] += 1 # Counted per tx, so duplicates compare with single calls
+        return 200, {}, [self._outspends_body(txid) if txid in self.txs else [] for txid in txids]
+
+    def spend(self, txid, vout, n_outputs=2, replace=False):
+        """Broadcast a new mempool tx spending txid:vout: REST serves it from now on and websocket
+        clients tracking the output's address get it pushed. Returns the new txid.
+        replace=True RBF-replaces an unconfirmed spend of the output; the old spender is then gone (404)."""
+        with self._lock:
+            spend = self.outspends[txid][vout]
+            if spend is not None:
+                if not replace or self.txs[spend[0]]["status"]["confirmed"]:
+                    raise ValueError(f"{txid}:{vout} is already spent")
+                del self.txs[spend[0]], self.outspends[spend[0]]
+            prevout = self.txs[txid]["vout"][vout]
+            self._broadcasts += 1
+            new_txid = hashlib.sha256(f"spend-{txid}:{vout}-{self._broadcasts}".encode()).hexdigest()
+            value = max((prevout["value"] - FEE) // n_outputs, 1)
+            tx = {
+                "txid": new_txid,
+                "vin": [{"txid": txid, "vout": vout, "prevout": prevout}],
+                "vout": [{"value": value, "scriptpubkey_type": "v0_p2wpkh", "scriptpubkey_address": _address(new_txid, i)}
+                         for i in range(n_outputs)],
+                "status": {"confirmed": False},
+            }
+            self.txs[new_txid] = tx
+            self.outspends[new_txid] = [None] * n_outputs
+            self.outspends[txid][vout] = (new_txid, 0)
+            address = prevout.get("scriptpubkey_address")
+            clients = [client for client, addresses in self._ws_clients.items() if address in addresses]
+        for client in clients:
+            client.send_json({"multi-address-transactions": {address: {"mempool": [tx], "confirmed": [], "removed": []}}})
+        return new_txid
+
+    def confirm(self, txid):
+        """Mine a mempool tx: from now on outspends report its spends as confirmed."""
+        with self._lock:
+            self.txs[txid]["status"] = {"confirmed": True, "block_height": 900_000}
+
+    def drop_websockets(self):
+        """Close every websocket connection, e.g. to test a client's fallback and reconnect."""
+        with self._lock:
+            clients = list(self._ws_clients)
+        for client in clients:
+            client.close()
+
+    def _serve_websocket(self, client):
+        with self._lock:
+            self.requests["ws"] += 1
+            self._ws_clients[client] = set()
+        try:
+            while True:
+                raw = client.receive()
+                if raw is None:
+                    return
+                try:
+                    message = json.loads(raw)
+                except ValueError:
+                    continue
+                addresses = message.get("track-addresses") if isinstance(message, dict) else None
+                if addresses is None:
+                    continue
+                if len(addresses) > self.max_tracked_addresses:
+                    client.send_json({"track-addresses-error": f"too many addresses requested, this connection "
+                                                              f"supports tracking a maximum of {self.max_tracked_addresses} addresses"})
+                    addresses = []
+                with self._lock:
+                    self._ws_clients[client] = set(addresses) # Replaces what the client tracked before
+        finally:
+            with self._lock:
+                self._ws_clients.pop(client, None)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # Keep-alive, so the client's connection pool is exercised
+
+            def do_GET(self):
+                if self.path == "/v1/ws" and server.websocket and self.headers.get("Upgrade", "").lower() == "websocket":
+                    self._upgrade_to_websocket()
+                    return
+                status, headers, body = server._respond(self.path)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _upgrade_to_websocket(self):
+                key = self.headers.get("Sec-WebSocket-Key", "")
+                accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+                self.send_response(101, "Switching Protocols")
+                self.send_header("Upgrade", "websocket")
+                self.send_header("Connection", "Upgrade")
+                self.send_header("Sec-WebSocket-Accept", accept)
+                self.end_headers()
+                self.close_connection = True
+                server._serve_websocket(_WebSocketConnection(self))
+
+            def log_message(self, format, *args):
+                pass # One line per request would drown the benchmark output
+
+        return Handler
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def start(self):
+        """Serve from a daemon thread and return self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a synthetic transaction graph with a mempool.space-like API.")
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--unspent-rate", type=float, default=0.1)
+    parser.add_argument("--merge-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--no-bulk-route", action="store_true", help="answer /txs/outspends with 404")
+    parser.add_argument("--no-websocket", action="store_true", help="answer /v1/ws with 404")
+    parser.add_argument("--port", type=int, default=8999)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    root, txs, outspends = generate_graph(args.fanout, args.depth, args.unspent_rate, args.merge_rate, seed=args.seed)
+    server = MockMempoolServer(txs, outspends, port=args.port, latency=args.latency, error_rate=args.error_rate,
+                               throttle_rate=args.throttle_rate, seed=args.seed, bulk_outspends=not args.no_bulk_route,
+                               websocket=not args.no_websocket)
+    print(f"Serving {len(txs)} transactions at {server.url}, root output {root}:0")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Offline benchmarks: trace a synthetic graph served by benchmarks.mock_mempool.
+
+Usage:
+    python -m benchmarks.run_benchmarks --fanout 3 --depth 6 --latency 0.02 --engines threads,async --cache
+
+The mock server runs in its own process so its threads don't compete with the
+tracer for the GIL or show up in the memory numbers. Every scenario (engine x
+cache mode) traces the whole graph headlessly with a fresh MempoolAPI and reports:
+    requests     HTTP requests the server received (retries included)
+    duplicates   successful responses for a path that had already been served
+    wall         seconds from trace_utxo() until trace_done
+    peak_mib     tracemalloc peak while tracing (slows tracing down; --no-tracemalloc to skip)
+    render       seconds for one full Agg draw of the finished graph (--no-render to skip; --lod-depth -1 draws every node)
+    p95_ms       client-side 95th percentile request latency (from graph.stats)
+    lock_wait    total seconds workers spent waiting for graph_lock
+"""
+import argparse
+import contextlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import requests
+from utxo_tracer.api import MempoolAPI
+from utxo_tracer.graph import UTXOGraph
+from utxo_tracer.traversal import TraceBudget
+from .mock_mempool import MockMempoolServer, generate_graph
+
+def _serve(graph_config, server_config, ready):
+    root, txs, outspends = generate_graph(**graph_config)
+    server = MockMempoolServer(txs, outspends, **server_config)
+    ready.put((server.url, root, len(txs)))
+    server.serve_forever()
+
+def start_mock_server(graph_config, server_config):
+    """Start the mock API in a child process. Returns (process, url, root_txid, num_txs)."""
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(graph_config, server_config, ready), daemon=True)
+    process.start()
+    url, root, num_txs = ready.get(timeout=60)
+    return process, url, root, num_txs
+
+def run_scenario(url, root, engine, max_depth, max_workers, requests_per_second, cache_path=None,
+                 measure_memory=True, render=True, timeout=None, priority=None, budget=None, bulk_size=25,
+                 lod_depth=4):
+    """Trace `root`:0 once and return a dict of measurements."""
+    requests.get(f"{url}/__reset", timeout=10)
+    api = MempoolAPI(base_url=url, cache=cache_path, requests_per_second=requests_per_second,
+                     max_connections=max(max_workers, 10), bulk_size=bulk_size)
+    graph = UTXOGraph(max_depth=max_depth, max_workers=max_workers, engine=engine, api=api,
+                      priority=priority, budget=budget() if budget else None) # Budgets hold per-trace state
+
+    if measure_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    graph.trace_utxo(root, 0)
+    finished = graph.wait_for_trace(timeout)
+    wall = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] if measure_memory else None
+    if measure_memory:
+        tracemalloc.stop()
+    if not finished:
+        print(f"[WARN] {engine} trace did not finish within {timeout}s; numbers are partial.", file=sys.stderr)
+
+    render_time = None
+    if render:
+        import matplotlib
+        matplotlib.use("Agg") # Headless; only loaded when render timing is wanted
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots(figsize=(16, 12))
+        graph.set_active_drawing_surface(fig, ax, lod_depth=lod_depth)
+        started = time.perf_counter()
+        graph.visualize(ax=ax)
+        fig.canvas.draw() # draw_idle() is a no-op without an event loop
+        render_time = time.perf_counter() - started
+        plt.close(fig)
+
+    server_stats = requests.get(f"{url}/__stats", timeout=10).json()
+    stats = graph.stats.snapshot()
+    latency = [h for name, h in stats["histograms"].items() if name.startswith("http_request_seconds")]
+    graph.executor.shutdown(wait=True)
+    if api.cache: api.cache.close()
+    return {
+        "engine": engine,
+        "cache": "none" if cache_path is None else "sqlite",
+        "nodes": len(graph.store),
+        "edges": graph.store.num_edges(),
+        "unspent": len(graph.unspent_utxos_found),
+        "failed": len(graph.failed_utxos),
+        "queued": len(graph.queued_utxos),
+        "unspent_sats": sum(entry["value"] for entry in graph.unspent_utxos_found),
+        "requests": server_stats["requests"],
+        "duplicates": server_stats["duplicates"],
+        "errors_injected": server_stats["errors_injected"],
+        "throttles_injected": server_stats["throttles_injected"],
+        "wall": round(wall, 3),
+        "nodes_per_sec": round(len(graph.store) / wall, 1) if wall else None,
+        "peak_mib": round(peak / 2 ** 20, 2) if peak is not None else None,
+        "render": round(render_time, 3) if render_time is not None else None,
+        "p95_ms": round(max((h["p95"] for h in latency), default=0.0) * 1000, 1),
+        "lock_wait": round(stats["histograms"]["graph_lock_wait_seconds"]["sum"], 4),
+        "hit_rates": stats["hit_rates"],
+    }
+
+def _run_engines(url, root, engines, with_cache, scenario):
+    for engine in engines:
+        yield run_scenario(url, root, engine, **scenario)
+        if with_cache:
+            with tempfile.TemporaryDirectory() as tmp:
+                cache_path = os.path.join(tmp, "bench_cache.sqlite")
+                for label in ("cold", "warm"): # Same cache file, so the second run is served locally
+                    result = run_scenario(url, root, engine, cache_path=cache_path, **scenario)
+                    result["cache"] = f"sqlite-{label}"
+                    yield result
+
+def print_table(results):
+    columns = ["engine", "cache", "nodes", "unspent", "unspent_sats", "failed", "requests", "duplicates", "wall",
+               "nodes_per_sec", "p95_ms", "lock_wait", "peak_mib", "render"]
+    rows = [[str(result.get(c, "")) if result.get(c) is not None else "-" for c in columns] for result in results]
+    widths = [max(len(c), *(len(row[i]) for row in rows)) for i, c in enumerate(columns)]
+    print("  ".join(c.rjust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(v.rjust(w) for v, w in zip(row, widths)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark UTXOGraph against a local mock mempool API.")
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--depth", type=int, default=5)
+    parser.add_argument("--unspent-rate", type=float, default=0.1)
+    parser.add_argument("--merge-rate", type=float, default=0.1, help="fraction of multi-input spends")
+    parser.add_argument("--latency", type=float, default=0.01, help="server-side seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--engines", default="threads,async", help="comma-separated engines to run")
+    parser.add_argument("--workers", type=int, default=10, help="worker threads for the threads engine")
+    parser.add_argument("--requests-per-second", type=float, default=1000.0, help="client-side rate limit")
+    parser.add_argument("--max-depth", type=int, default=None, help="tracer max depth (default: whole graph)")
+    parser.add_argument("--priority", default=None, help="best-first order: value, depth or value_per_hop")
+    parser.add_argument("--max-requests", type=int, default=None, help="trace budget: HTTP requests")
+    parser.add_argument("--max-nodes", type=int, default=None, help="trace budget: graph nodes")
+    parser.add_argument("--min-value", type=int, default=None, help="trace budget: skip outputs below this many sats")
+    parser.add_argument("--bulk-size", type=int, default=25, help="txids per bulk outspends request (1 disables)")
+    parser.add_argument("--no-bulk-route", action="store_true", help="mock server answers bulk outspends with 404")
+    parser.add_argument("--cache", action="store_true", help="also run each engine with a cold and a warm SQLite cache")
+    parser.add_argument("--no-render", action="store_true", help="skip the Agg render timing")
+    parser.add_argument("--lod-depth", type=int, default=4, help="render: fold outputs deeper than this (-1 draws every node)")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip peak memory (tracemalloc slows tracing)")
+    parser.add_argument("--timeout", type=float, default=600, help="give up on a scenario after this many seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", default=None, help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+    if "async" in engines and importlib.util.find_spec("aiohttp") is None:
+        print("[WARN] aiohttp is not installed; skipping the async engine.", file=sys.stderr)
+        engines.remove("async")
+
+    graph_config = {"fanout": args.fanout, "depth": args.depth, "unspent_rate": args.unspent_rate,
+                    "merge_rate": args.merge_rate, "seed": args.seed}
+    server_config = {"latency": args.latency, "error_rate": args.error_rate, "throttle_rate": args.throttle_rate,
+                     "retry_after": args.retry_after, "seed": args.seed, "bulk_outspends": not args.no_bulk_route}
+    process, url, root, num_txs = start_mock_server(graph_config, server_config)
+    print(f"Mock API at {url}: {num_txs} transactions, fan-out {args.fanout}, depth {args.depth}, "
+          f"latency {args.latency}s", file=sys.stderr)
+
+    scenario = dict(max_depth=args.max_depth if args.max_depth is not None else args.depth + 1,
+                    max_workers=args.workers, requests_per_second=args.requests_per_second,
+                    measure_memory=not args.no_tracemalloc, render=not args.no_render, timeout=args.timeout,
+                    priority=args.priority, bulk_size=args.bulk_size,
+                    lod_depth=args.lod_depth if args.lod_depth >= 0 else None)
+    if any(v is not None for v in (args.max_requests, args.max_nodes, args.min_value)):
+        scenario["budget"] = lambda: TraceBudget(max_requests=args.max_requests, max_nodes=args.max_nodes,
+                                                 min_value=args.min_value)
+    results = []
+    try:
+        with contextlib.redirect_stdout(sys.stderr): # Tracer progress prints stay out of the results table
+            results.extend(_run_engines(url, root, engines, args.cache, scenario))
+    finally:
+        process.terminate()
+
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"graph": graph_config, "server": server_config, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
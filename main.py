@@ -1,4 +1,7 @@
 from utxo_tracer.graph import UTXOGraph
+from utxo_tracer.export import open_exporter
+from utxo_tracer.watch import SpendWatcher
+import os
 import time
 import matplotlib.pyplot as plt
 
@@ -6,41 +9,93 @@ def main():
     txid = "9996f5ad442be27bdc8c05ba32c0837185a36626fd8bc1c9cd0a4a2576277ec2"
     vout = 0
     max_graph_depth = 10
-    refresh_interval_seconds = 120
-    max_workers_for_graph = 5 # Number of threads for processing branches
-
-    graph_manager = UTXOGraph(max_depth=max_graph_depth, max_workers=max_workers_for_graph)
+    refresh_interval_seconds = 120 # Without watch_spends: full frontier re-check this often. With it: polling fallback and failed/queued retry interval
+    max_workers_for_graph = 10 # Number of threads for processing branches
+    requests_per_second = 5 # Shared by all threads; backs off automatically on 429/503
+    cache_path = "utxo_cache.sqlite" # Confirmed txs and spent outputs are served from here on refresh
+    incremental_refresh = True # After the first trace, only re-check unspent/depth-limited leaves
+    engine = "threads" # "threads" (ThreadPoolExecutor) or "async" (asyncio + aiohttp, many concurrent requests)
+    metrics_port = None # e.g. 9464 to serve Prometheus metrics at http://127.0.0.1:9464/metrics
+    metrics_json_path = None # e.g. "trace_metrics.json", rewritten every 10 seconds
+    profile_path = None # e.g. "trace.prof" to run the first trace under cProfile
+    priority = None # "value" follows the biggest outputs first; None traces every output up to max_graph_depth
+    budget = None # e.g. TraceBudget(max_requests=500, max_wall_time=120, min_value=10_000) from utxo_tracer.traversal, per trace/refresh
+    export_path = None # e.g. "trace.jsonl", "trace.graphml", "trace.csv" or "trace.parquet"; written while tracing
+    checkpoint_path = "utxo_checkpoint.json" # Saved every 60s while tracing; the next run resumes from it
+    lod_depth = 4 # Deeper outputs are folded into summary nodes (click one to unfold it); None draws every node
+    lod_min_value = 0 # e.g. 100_000 also folds outputs worth less than this many sats
+    watch_spends = True # Expand unspent UTXOs the moment they are spent (mempool.space websocket, needs websocket-client)
+    taint_rule = None # "proportional" or "fifo": also show how many sats of the seed each unspent UTXO holds (needs scipy)
+
+    graph_manager = UTXOGraph(max_depth=max_graph_depth, max_workers=max_workers_for_graph, cache_path=cache_path,
+                              requests_per_second=requests_per_second, engine=engine, priority=priority, budget=budget,
+                              checkpoint_path=checkpoint_path)
+    if metrics_port: graph_manager.stats.serve_prometheus(port=metrics_port)
+    if metrics_json_path: graph_manager.stats.start_json_dump(metrics_json_path, interval=10)
+    if profile_path: graph_manager.profile_next_trace(profile_path)
+    if export_path: graph_manager.add_exporter(open_exporter(export_path))
 
     plt.ion()
     fig, ax = plt.subplots(figsize=(17, 13))
-    graph_manager.set_active_drawing_surface(fig, ax)
+    graph_manager.set_active_drawing_surface(fig, ax, lod_depth=lod_depth, lod_min_value=lod_min_value)
+    watcher = None
+    spends = [] # (txid, vout, spending_txid) reported by the watcher
 
     try:
+        first_cycle = True
         while True:
-            print(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] Starting/Refreshing trace for UTXO {txid}:{vout}...")
-
-            graph_manager.reset()
-
-            ax.clear() # Initial clear by main thread
-            initial_prep_message = f"Preparing to trace {txid[:8]}...:{vout}"
-            ax.set_title(initial_prep_message)
-            ax.axis("off")
-            fig.canvas.draw_idle()
-            plt.pause(0.01)
-
-            graph_manager.is_tracing = True # Set overall tracing state
-            graph_manager.status_message = "Trace in progress (multithreaded)..."
-            graph_manager.queue_ui_update('status_message', {'message': graph_manager.status_message})
-
-
-            graph_manager.trace_utxo(initial_txid=txid, initial_vout=vout) # Kicks off threaded tasks
+            if first_cycle or not incremental_refresh:
+                # Pick up an interrupted run of the same seed instead of starting over
+                resuming = (first_cycle and checkpoint_path and os.path.exists(checkpoint_path)
+                            and graph_manager.load_checkpoint(checkpoint_path, expected_seed=(txid, vout)))
+                if resuming:
+                    print(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] Resuming trace for UTXO {txid}:{vout} from {checkpoint_path}...")
+                else:
+                    print(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] Starting trace for UTXO {txid}:{vout}...")
+                    graph_manager.reset()
+
+                ax.clear() # Initial clear by main thread
+                initial_prep_message = f"Preparing to trace {txid[:8]}...:{vout}"
+                ax.set_title(initial_prep_message)
+                ax.axis("off")
+                fig.canvas.draw_idle()
+                plt.pause(0.01)
+
+                graph_manager.is_tracing = True # Set overall tracing state
+                graph_manager.status_message = "Trace in progress (multithreaded)..."
+                graph_manager.queue_ui_update('status_message', {'message': graph_manager.status_message})
+
+                if resuming:
+                    graph_manager.resume_trace() # Only what the checkpoint left unfinished
+                else:
+                    graph_manager.trace_utxo(initial_txid=txid, initial_vout=vout) # Kicks off background tasks
+                first_cycle = False
+            elif spends:
+                print(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] {len(spends)} watched UTXO(s) spent; expanding...")
+                graph_manager.is_tracing = True
+                graph_manager.status_message = "Expanding newly spent UTXOs..."
+                graph_manager.queue_ui_update('status_message', {'message': graph_manager.status_message})
+                graph_manager.recheck_outputs([(spent_txid, spent_vout) for spent_txid, spent_vout, _ in spends])
+            elif watch_spends:
+                print(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] Retrying failed and queued UTXOs of {txid}:{vout}...")
+                graph_manager.is_tracing = True
+                graph_manager.status_message = "Retrying failed and queued UTXOs..."
+                graph_manager.queue_ui_update('status_message', {'message': graph_manager.status_message})
+                retried = graph_manager.refresh_frontier(recheck_unspent=False) # The watcher covers the unspent ones
+                print(f"Retrying {retried} UTXO(s).")
+            else:
+                print(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] Refreshing unspent frontier of {txid}:{vout}...")
+                graph_manager.is_tracing = True
+                graph_manager.status_message = "Re-checking unspent frontier..."
+                graph_manager.queue_ui_update('status_message', {'message': graph_manager.status_message})
+                rechecked = graph_manager.refresh_frontier() # Keeps the graph; only new spends are expanded
+                print(f"Re-checking {rechecked} frontier UTXO(s).")
 
             # Loop to process UI updates and wait for tasks to complete
             while graph_manager.is_tracing: # is_tracing will be set to False when tasks are done
                 updated_ui = graph_manager.process_ui_updates()
 
-                active_tasks = graph_manager.get_active_tasks_count()
-                if active_tasks == 0:
+                if graph_manager.is_trace_done():
                     graph_manager.is_tracing = False # All submitted tasks are done
                     print("All worker tasks seem complete.")
                     # Process any final updates that might have been queued just before tasks ended
@@ -53,10 +108,9 @@ def main():
                     plt.pause(0.05) # Shorter pause if UI was just updated
 
                 if not plt.fignum_exists(fig.number):
-                    print("Plot window closed during trace. Attempting to stop.")
+                    print("Plot window closed during trace. Stopping.")
                     graph_manager.is_tracing = False # Signal to stop
-                    # Consider telling executor to shutdown if this happens
-                    # graph_manager.executor.shutdown(wait=False, cancel_futures=True) # Python 3.9+ for cancel_futures
+                    graph_manager.cancel_trace(reason="window closed") # Workers stop before their next request
                     break
 
             # --- Post-trace processing ---
@@ -65,34 +119,61 @@ def main():
             # Display Unspent UTXOs found (remains the same)
             if graph_manager.unspent_utxos_found:
                 print("\n--- Unspent UTXOs Found at Trace Limit ---")
-                for i, utxo_info in enumerate(graph_manager.unspent_utxos_found):
-                    print(f"  {i+1}. Label: {utxo_info['label']}") # ... (rest of print)
+                utxos = graph_manager.unspent_utxos_found
+                if taint_rule:
+                    from utxo_tracer.taint import leaf_taint # numpy/scipy only when asked for
+                    utxos = leaf_taint(graph_manager, rule=taint_rule)
+                for i, utxo_info in enumerate(utxos):
+                    tainted = (f", {utxo_info['tainted_sats'] / 1e8:.8f} BTC of the seed ({utxo_info['taint_share']:.2%})"
+                               if 'tainted_sats' in utxo_info else "")
+                    print(f"  {i+1}. {utxo_info['txid']}:{utxo_info['vout']} ({utxo_info['script_type']}, "
+                          f"{utxo_info['value'] / 1e8:.8f} BTC, depth {utxo_info['depth']}{tainted})")
                 graph_manager.status_message = f"Trace complete. Found {len(graph_manager.unspent_utxos_found)} unspent UTXO(s)."
             else:
                 graph_manager.status_message = "Trace complete. No unspent UTXOs at trace limit."
-            print(graph_manager.status_message + "\n")
+            print(graph_manager.status_message)
+            print(f"Stats: {graph_manager.stats.summary()}\n")
 
             # Final visualization call
             graph_manager.visualize(ax=ax, is_incremental_update=False, current_process_message=graph_manager.status_message)
             fig.canvas.draw_idle()
 
-            print(f"Refresh cycle complete. Waiting for {refresh_interval_seconds} seconds...")
             if not plt.fignum_exists(fig.number): break
+            if watch_spends:
+                if watcher is None:
+                    watcher = SpendWatcher(graph_manager, poll_interval=refresh_interval_seconds).start()
+                else:
+                    watcher.sync() # Watch the new frontier
+                print(f"Refresh cycle complete. Watching {watcher.watched_count()} unspent UTXO(s) for spends...")
+                spends = []
+                retry_at = time.monotonic() + refresh_interval_seconds
+                while not spends and plt.fignum_exists(fig.number):
+                    graph_manager.process_ui_updates()
+                    plt.pause(0.5)
+                    spends = watcher.pop_spends()
+                    if time.monotonic() >= retry_at:
+                        if graph_manager.failed_utxos or graph_manager.queued_utxos: break # Retried at the top of the loop
+                        retry_at = time.monotonic() + refresh_interval_seconds
+                if not plt.fignum_exists(fig.number): break # Window closed
+                continue
+
+            print(f"Refresh cycle complete. Waiting for {refresh_interval_seconds} seconds...")
             for i in range(refresh_interval_seconds):
                 if not plt.fignum_exists(fig.number): break
                 # Keep processing UI events during long wait, though unlikely any will come
                 if i % 5 == 0 : graph_manager.process_ui_updates() # Occasionally process if needed
                 plt.pause(1)
 
-    except KeyboardInterrupt: # (remains the same)
+    except KeyboardInterrupt:
         print("\nStopping real-time updates (Ctrl+C).")
-        if graph_manager: graph_manager.is_tracing = False; graph_manager.executor.shutdown(wait=False) # Python 3.9+ for cancel_futures in executor.shutdown
+        if graph_manager: graph_manager.is_tracing = False; graph_manager.cancel_trace(reason="Ctrl+C")
     except Exception as e: # (remains the same)
         print(f"An unexpected error occurred in main loop: {e}"); import traceback; traceback.print_exc()
-        if graph_manager: graph_manager.is_tracing = False; graph_manager.executor.shutdown(wait=False)
-    finally: # (remains the same)
+        if graph_manager: graph_manager.is_tracing = False; graph_manager.cancel_trace(reason="error")
+    finally:
         plt.ioff()
-        if graph_manager: graph_manager.executor.shutdown(wait=True) # Ensure threads are cleaned up
+        if watcher: watcher.stop()
+        if graph_manager: graph_manager.shutdown(wait=True) # Cancels the trace, saves what was still queued, joins the threads
         if plt.fignum_exists(fig.number): plt.show()
 
 if __name__ == "__main__":
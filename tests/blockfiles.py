@@ -0,0 +1,87 @@
+"""Tiny writer for synthetic Bitcoin Core block files (blk*.dat, optionally xor.dat obfuscated)."""
+import hashlib
+import os
+import struct
+
+from utxo_tracer.blockfile import MAINNET_MAGIC, NULL_TXID
+
+EASY_BITS = 0x207fffff # regtest difficulty: almost no work per block
+HARD_BITS = 0x1d00ffff # mainnet difficulty 1: far more work per block
+
+def _dsha256(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+def _varint(n):
+    if n < 0xfd:
+        return bytes([n])
+    if n <= 0xffff:
+        return b"\xfd" + struct.pack("<H", n)
+    if n <= 0xffffffff:
+        return b"\xfe" + struct.pack("<I", n)
+    return b"\xff" + struct.pack("<Q", n)
+
+def p2wpkh(tag):
+    return b"\x00\x14" + hashlib.sha256(tag.encode()).digest()[:20]
+
+def p2pkh(tag):
+    return b"\x76\xa9\x14" + hashlib.sha256(tag.encode()).digest()[:20] + b"\x88\xac"
+
+class Tx:
+    """inputs: (prev_txid, prev_vout); outputs: (value_sats, script). witness=True uses segwit serialization."""
+
+    def __init__(self, inputs, outputs, witness=False):
+        self.inputs = inputs
+        self.outputs = outputs
+        self.witness = witness
+
+    def _body(self):
+        body = _varint(len(self.inputs))
+        for prev_txid, prev_vout in self.inputs:
+            body += bytes.fromhex(prev_txid)[::-1] + struct.pack("<I", prev_vout) + _varint(1) + b"\x51" + b"\xff" * 4
+        body += _varint(len(self.outputs))
+        for value, script in self.outputs:
+            body += struct.pack("<q", value) + _varint(len(script)) + script
+        return body
+
+    def serialize(self):
+        version, locktime = struct.pack("<i", 2), b"\x00" * 4
+        if not self.witness:
+            return version + self._body() + locktime
+        witnesses = b"".join(_varint(2) + _varint(71) + b"\x30" * 71 + _varint(33) + b"\x02" * 33 for _ in self.inputs)
+        return version + b"\x00\x01" + self._body() + witnesses + locktime
+
+    @property
+    def txid(self):
+        return _dsha256(struct.pack("<i", 2) + self._body() + b"\x00" * 4)[::-1].hex()
+
+def coinbase(tag, value=50 * 100_000_000):
+    return Tx([(NULL_TXID, 0xffffffff)], [(value, p2pkh(tag))])
+
+class Block:
+    def __init__(self, prev_hash, txs, bits=EASY_BITS, nonce=0):
+        self.prev_hash = prev_hash
+        self.txs = txs
+        self.bits = bits
+        self.nonce = nonce # Vary it to get a different hash for otherwise identical blocks
+
+    def serialize(self):
+        merkle = _dsha256(b"".join(bytes.fromhex(tx.txid)[::-1] for tx in self.txs)) # Not checked by the indexer
+        header = (struct.pack("<i", 0x20000000) + bytes.fromhex(self.prev_hash)[::-1] + merkle
+                  + struct.pack("<III", 1_700_000_000, self.bits, self.nonce))
+        return header + _varint(len(self.txs)) + b"".join(tx.serialize() for tx in self.txs)
+
+    @property
+    def hash(self):
+        return _dsha256(self.serialize()[:80])[::-1].hex()
+
+def write_blocks(blocks_dir, name, blocks, xor_key=None, padding=64):
+    """Write `blocks` to blocks_dir/name the way Core stores them (magic, size, block, zero padding).
+    With xor_key (8 bytes) the file is obfuscated and the key written to xor.dat, like Core 28+."""
+    data = b"".join(MAINNET_MAGIC + struct.pack("<I", len(raw)) + raw for raw in (b.serialize() for b in blocks))
+    data += b"\x00" * padding # Preallocated space after the last block
+    if xor_key:
+        with open(os.path.join(blocks_dir, "xor.dat"), "wb") as f:
+            f.write(xor_key)
+        data = bytes(byte ^ xor_key[i % len(xor_key)] for i, byte in enumerate(data))
+    with open(os.path.join(blocks_dir, name), "wb") as f:
+        f.write(data)
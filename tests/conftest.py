@@ -0,0 +1,68 @@
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_mempool import MockMempoolServer, generate_graph
+from utxo_tracer.api import MempoolAPI
+from utxo_tracer.graph import UTXOGraph
+
+@pytest.fixture
+def synthetic():
+    """(root_txid, txs, outspends) of a small layered graph: 1 + 3 + 9 + 27 txs."""
+    return generate_graph(fanout=3, depth=3, unspent_rate=0.1)
+
+@pytest.fixture
+def server(synthetic):
+    _, txs, outspends = synthetic
+    srv = MockMempoolServer(txs, outspends).start()
+    yield srv
+    srv.stop()
+
+@pytest.fixture
+def make_api(server):
+    """MempoolAPI against the mock server, without the default rate limit."""
+    apis = []
+
+    def make(**kwargs):
+        kwargs.setdefault("requests_per_second", 1000)
+        api = MempoolAPI(base_url=server.url, **kwargs)
+        apis.append(api)
+        return api
+    yield make
+    for api in apis:
+        if api.cache: api.cache.close()
+
+@pytest.fixture
+def make_graph():
+    """UTXOGraph factory (max_depth=10, max_workers=4 unless given). Every graph it built is
+    shut down when the test ends, passed or failed, so no worker threads outlive it."""
+    graphs = []
+
+    def make(api, **options):
+        options.setdefault("max_depth", 10)
+        options.setdefault("max_workers", 4)
+        graph = UTXOGraph(api=api, **options)
+        graphs.append(graph)
+        return graph
+    try:
+        yield make
+    finally:
+        for graph in graphs:
+            graph.shutdown()
+
+@pytest.fixture
+def trace_graph(request, make_graph):
+    """trace(root, api=None, **options): a make_graph() graph that has traced root:0 to the end.
+    api defaults to make_api(), i.e. the synthetic graph's mock server."""
+    def trace(root, api=None, **options):
+        graph = make_graph(api or request.getfixturevalue("make_api")(), **options)
+        with contextlib.redirect_stdout(io.StringIO()):
+            graph.trace_utxo(root, 0)
+            assert graph.wait_for_trace(60)
+        return graph
+    return trace
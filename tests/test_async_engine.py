@@ -0,0 +1,19 @@
+import pytest
+
+def summary(graph):
+    with graph.graph_lock:
+        return (len(graph.store), graph.store.num_edges(),
+                sorted((entry['txid'], entry['vout']) for entry in graph.unspent_utxos_found))
+
+def test_async_engine_matches_threads(synthetic, trace_graph):
+    root = synthetic[0]
+    assert summary(trace_graph(root, engine="async")) == summary(trace_graph(root, engine="threads"))
+
+@pytest.mark.parametrize("bulk_size", [1, 25])
+def test_async_engine_writes_the_cache(tmp_path, server, synthetic, make_api, trace_graph, bulk_size):
+    root = synthetic[0]
+    path = str(tmp_path / "cache.sqlite")
+    first = summary(trace_graph(root, make_api(cache=path, bulk_size=bulk_size), engine="async"))
+    server.reset_stats()
+    assert summary(trace_graph(root, make_api(cache=path, bulk_size=bulk_size), engine="async")) == first
+    assert server.stats()["requests"] == 0 # Everything was flushed to SQLite when the first trace ended
@@ -0,0 +1,30 @@
+import json
+
+from utxo_tracer.batch import main, read_seeds
+
+def test_read_seeds_skips_comments_and_malformed_lines(tmp_path, capsys):
+    txid = "ab" * 32
+    path = tmp_path / "seeds.txt"
+    path.write_text(f"# seeds\n{txid.upper()}:1\n\nnot-a-seed\n{txid}:x\n{txid}:0 # trailing comment\n")
+    assert list(read_seeds(str(path))) == [(txid, 1), (txid, 0)]
+    assert capsys.readouterr().err.count("[WARN] Skipping malformed seed") == 2
+
+def test_batch_writes_one_line_per_seed(tmp_path, server, synthetic):
+    root, txs, _ = synthetic
+    seeds = tmp_path / "seeds.txt"
+    seeds.write_text("".join(f"{root}:{vout}\n" for vout in range(len(txs[root]["vout"]))))
+    output = tmp_path / "results.jsonl"
+    main([str(seeds), "-o", str(output), "--processes", "2", "--workers", "2", "--api-url", server.url,
+          "--cache", str(tmp_path / "cache.sqlite"), "--requests-per-second", "1000"])
+
+    results = {}
+    for line in output.read_text().splitlines():
+        result = json.loads(line)
+        results[result["seed"]] = result
+    assert sorted(results) == sorted(f"{root}:{vout}" for vout in range(len(txs[root]["vout"])))
+    for seed, result in results.items():
+        txid, vout = seed.split(":")
+        assert (result["nodes"][0]["txid"], result["nodes"][0]["vout"]) == (txid, int(vout))
+        assert result["stats"]["nodes"] == len(result["nodes"])
+        assert all(0 <= src < len(result["nodes"]) and 0 <= dst < len(result["nodes"]) for src, dst in result["edges"])
+        assert result["stats"]["failed"] == 0
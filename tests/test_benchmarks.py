@@ -0,0 +1,19 @@
+import json
+
+from benchmarks import run_benchmarks
+from benchmarks.mock_mempool import generate_graph
+
+def test_benchmark_traces_the_whole_synthetic_graph(tmp_path, capsys):
+    out = tmp_path / "bench.json"
+    run_benchmarks.main(["--fanout", "2", "--depth", "3", "--latency", "0", "--engines", "threads", "--cache",
+                         "--no-render", "--no-tracemalloc", "--timeout", "60", "--json", str(out)])
+    _, txs, _ = generate_graph(fanout=2, depth=3, unspent_rate=0.1, merge_rate=0.1, seed=1)
+    outputs = sum(len(tx["vout"]) for tx in txs.values())
+
+    results = json.loads(out.read_text())["results"]
+    assert [result["cache"] for result in results] == ["none", "sqlite-cold", "sqlite-warm"]
+    for result in results:
+        assert result["nodes"] == outputs and result["failed"] == 0 and result["queued"] == 0
+        assert result["duplicates"] == 0
+    assert results[2]["requests"] < results[1]["requests"] # The warm cache serves confirmed txs locally
+    assert "engine" in capsys.readouterr().out # The results table
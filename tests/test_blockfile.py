@@ -0,0 +1,129 @@
+import contextlib
+import io
+
+import pytest
+
+from blockfiles import HARD_BITS, Block, Tx, coinbase, p2pkh, p2wpkh, write_blocks
+from utxo_tracer.blockfile import NULL_TXID, BlockFileAPI, block_work
+
+GENESIS_PREV = "00" * 32
+
+def open_api(blocks_dir, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return BlockFileAPI(str(blocks_dir), **kwargs)
+
+@pytest.fixture
+def chain():
+    """Three blocks: a coinbase, a segwit spend of it, and a legacy spend of the segwit tx's change."""
+    cb = coinbase("miner")
+    segwit = Tx([(cb.txid, 0)], [(30 * 10**8, p2wpkh("alice")), (19 * 10**8, p2wpkh("change"))], witness=True)
+    legacy = Tx([(segwit.txid, 1)], [(18 * 10**8, p2pkh("bob"))])
+    b0 = Block(GENESIS_PREV, [cb])
+    b1 = Block(b0.hash, [coinbase("miner1"), segwit])
+    b2 = Block(b1.hash, [coinbase("miner2"), legacy])
+    return [b0, b1, b2], cb, segwit, legacy
+
+@pytest.mark.parametrize("xor_key", [None, bytes.fromhex("0123456789abcdef")])
+def test_segwit_chain(tmp_path, chain, xor_key):
+    blocks, cb, segwit, legacy = chain
+    write_blocks(tmp_path, "blk00000.dat", blocks, xor_key=xor_key)
+    api = open_api(tmp_path)
+
+    details = api.get_transaction_details(segwit.txid) # txid from the stripped (non-witness) serialization
+    assert details["txid"] == segwit.txid
+    assert [(out["value"], out["scriptpubkey_type"]) for out in details["vout"]] == \
+        [(30 * 10**8, "v0_p2wpkh"), (19 * 10**8, "v0_p2wpkh")]
+    assert details["vin"][0]["txid"] == cb.txid
+    assert details["status"]["block_height"] == 1
+
+    assert api.get_spending_transactions(cb.txid) == {0: segwit.txid}
+    assert api.get_spending_transactions(segwit.txid) == {0: None, 1: legacy.txid}
+    assert api.get_input_position(segwit.txid, cb.txid, 0) == (-1, -1) # No prevouts in block files
+    api.close()
+
+def test_xor_key_is_applied(tmp_path, chain):
+    blocks = chain[0]
+    write_blocks(tmp_path, "blk00000.dat", blocks, xor_key=bytes.fromhex("0123456789abcdef"))
+    with open(tmp_path / "blk00000.dat", "rb") as f:
+        assert f.read(4) != bytes.fromhex("f9beb4d9") # Really obfuscated on disk
+    api = open_api(tmp_path)
+    assert api.get_transaction_details(chain[1].txid) is not None
+    api.close()
+
+def test_stale_fork_is_ignored(tmp_path, chain):
+    blocks, cb, segwit, legacy = chain
+    stale_spend = Tx([(segwit.txid, 1)], [(18 * 10**8, p2pkh("mallory"))])
+    stale = Block(blocks[1].hash, [coinbase("stale"), stale_spend], nonce=1)
+    write_blocks(tmp_path, "blk00000.dat", blocks[:2] + [stale])
+    write_blocks(tmp_path, "blk00001.dat", blocks[2:] + [Block(blocks[2].hash, [coinbase("miner3")])])
+    api = open_api(tmp_path)
+    assert api.get_spending_transactions(segwit.txid) == {0: None, 1: legacy.txid}
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert api.get_transaction_details(stale_spend.txid) is None
+    api.close()
+
+def test_tie_goes_to_the_tip_stored_first(tmp_path, chain):
+    blocks, cb, segwit, legacy = chain
+    rival_spend = Tx([(segwit.txid, 1)], [(18 * 10**8, p2pkh("carol"))])
+    rival = Block(blocks[1].hash, [coinbase("rival"), rival_spend], nonce=7)
+    write_blocks(tmp_path, "blk00000.dat", blocks[:2] + [rival])
+    write_blocks(tmp_path, "blk00001.dat", blocks[2:]) # Same height and work, stored later
+    for rebuild in range(2):
+        api = open_api(tmp_path, index_path=str(tmp_path / f"index{rebuild}.sqlite"))
+        assert api.get_spending_transactions(segwit.txid) == {0: None, 1: rival_spend.txid}
+        api.close()
+
+def test_more_work_beats_more_blocks(tmp_path, chain):
+    blocks, cb, segwit, legacy = chain
+    assert block_work(HARD_BITS) > 2 * block_work(blocks[0].bits)
+    heavy_spend = Tx([(segwit.txid, 1)], [(18 * 10**8, p2pkh("dave"))])
+    heavy = Block(blocks[1].hash, [coinbase("heavy"), heavy_spend], bits=HARD_BITS)
+    longer = Block(blocks[2].hash, [coinbase("miner3")])
+    write_blocks(tmp_path, "blk00000.dat", blocks + [longer, heavy])
+    api = open_api(tmp_path)
+    assert api.get_spending_transactions(segwit.txid) == {0: None, 1: heavy_spend.txid}
+    api.close()
+
+def test_query_before_the_index_is_built(tmp_path, chain):
+    blocks, cb, segwit, legacy = chain
+    write_blocks(tmp_path, "blk00000.dat", blocks[:2])
+    api = open_api(tmp_path, build_index=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert api.get_transaction_details(segwit.txid) is None
+    assert api.get_spending_transactions(cb.txid) == {}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        api.update_index()
+    assert api.get_spending_transactions(segwit.txid) == {0: None, 1: None}
+    write_blocks(tmp_path, "blk00001.dat", blocks[2:]) # Core wrote another file
+    with contextlib.redirect_stdout(io.StringIO()):
+        api.update_index()
+    assert api.get_spending_transactions(segwit.txid) == {0: None, 1: legacy.txid}
+    api.close()
+
+def test_coinbase_spends_nothing(tmp_path, chain):
+    blocks = chain[0]
+    write_blocks(tmp_path, "blk00000.dat", blocks)
+    api = open_api(tmp_path)
+    assert api.get_spending_transactions(NULL_TXID) == {}
+    api.close()
+
+def test_growing_file_keeps_old_maps_readable(tmp_path, chain, monkeypatch):
+    blocks, cb, segwit, legacy = chain
+    write_blocks(tmp_path, "blk00000.dat", blocks[:2], padding=0)
+    api = open_api(tmp_path)
+    old_map = api._map("blk00000.dat")
+    write_blocks(tmp_path, "tail.tmp", blocks[2:], padding=0) # Core appends to the file it is writing
+    with open(tmp_path / "blk00000.dat", "ab") as f:
+        f.write((tmp_path / "tail.tmp").read_bytes())
+    with contextlib.redirect_stdout(io.StringIO()):
+        api.update_index()
+    assert old_map[:4] == bytes.fromhex("f9beb4d9") # Another thread may still be reading it
+
+    def no_stat(path):
+        raise AssertionError(f"stat of {path} outside update_index()")
+    monkeypatch.setattr("os.path.getsize", no_stat)
+    assert api.get_transaction_details(legacy.txid)["txid"] == legacy.txid
+    assert api.get_spending_transactions(segwit.txid) == {0: None, 1: legacy.txid}
+    monkeypatch.undo()
+    api.close()
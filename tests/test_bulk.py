@@ -0,0 +1,45 @@
+from benchmarks.mock_mempool import MockMempoolServer
+from utxo_tracer.api import MempoolAPI
+
+def test_bulk_lookup_is_one_request(server, synthetic, make_api):
+    _, txs, _ = synthetic
+    txids = sorted(txs)[:10]
+    single = make_api(bulk_size=1)
+    expected = {txid: single.get_spending_transactions(txid) for txid in txids}
+
+    server.reset_stats()
+    assert make_api(bulk_size=25).get_spending_transactions_bulk(txids + txids[:2]) == expected
+    assert server.stats()["by_endpoint"] == {"outspends_bulk": 1}
+
+def unspent(graph):
+    return sorted((entry['txid'], entry['vout']) for entry in graph.unspent_utxos_found)
+
+def test_trace_batches_outspends(server, synthetic, make_api, trace_graph):
+    root = synthetic[0]
+    single = trace_graph(root, make_api(bulk_size=1), max_workers=8)
+    singles = server.stats()["by_endpoint"]
+    server.reset_stats()
+    batched = trace_graph(root, make_api(bulk_size=25, bulk_window=0.05), max_workers=8)
+    by_endpoint = server.stats()["by_endpoint"]
+
+    assert len(batched.store) == len(single.store) and unspent(batched) == unspent(single)
+    assert by_endpoint.get("outspends_bulk", 0) >= 1
+    assert by_endpoint.get("outspends_bulk", 0) + by_endpoint.get("outspends", 0) < singles["outspends"]
+
+def test_missing_bulk_route_falls_back_to_single_requests(synthetic, trace_graph, capsys):
+    root, txs, outspends = synthetic
+    server = MockMempoolServer(txs, outspends, bulk_outspends=False).start()
+    try:
+        api = MempoolAPI(base_url=server.url, requests_per_second=1000, bulk_size=25)
+        txids = sorted(txs)[:5]
+        result = api.get_spending_transactions_bulk(txids)
+        assert not api.bulk_outspends
+        assert "no bulk outspends route" in capsys.readouterr().out
+        assert all(result[txid] for txid in txids)
+        assert server.stats()["by_endpoint"] == {"outspends_bulk": 1, "outspends": 5}
+
+        graph = trace_graph(root, api, max_workers=8)
+        assert server.stats()["by_endpoint"]["outspends_bulk"] == 1 # Never asked again
+        assert graph.unspent_utxos_found and not graph.failed_utxos
+    finally:
+        server.stop()
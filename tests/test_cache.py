@@ -0,0 +1,80 @@
+import sqlite3
+import time
+
+from utxo_tracer.cache import TxCache
+
+def test_confirmed_txs_persist_across_instances(tmp_path, server, synthetic, make_api):
+    root = synthetic[0]
+    path = str(tmp_path / "cache.sqlite")
+    assert make_api(cache=path).get_transaction_details(root)["txid"] == root
+    server.reset_stats()
+    assert make_api(cache=path).get_transaction_details(root)["txid"] == root
+    assert server.stats()["requests"] == 0
+
+def test_unconfirmed_txs_are_not_cached(tmp_path):
+    cache = TxCache(str(tmp_path / "cache.sqlite"))
+    cache.put_transaction("a", {"txid": "a", "status": {"confirmed": False}})
+    assert cache.get_transaction("a") is None
+
+def test_outspends_ttl_and_finality(tmp_path):
+    cache = TxCache(str(tmp_path / "cache.sqlite"), unspent_ttl=60)
+    cache.put_outspends("open", {0: "b", 1: None})
+    cache.put_outspends("mempool", {0: "b", 1: "c"}, final=False)
+    cache.put_outspends("final", {0: "b", 1: "c"}, final=True)
+    cache.put_outspends("bogus", {0: "b", 1: None}, final=True) # An unspent output is never final
+    for txid in ("open", "mempool", "final", "bogus"):
+        assert cache.get_outspends(txid) is not None
+
+    cache._conn.execute("UPDATE outspends SET fetched_at = ?", (time.time() - 120,))
+    assert cache.get_outspends("open") is None
+    assert cache.get_outspends("mempool") is None
+    assert cache.get_outspends("bogus") is None
+    assert cache.get_outspends("final") == {0: "b", 1: "c"}
+
+    for txid in ("open", "mempool", "final"):
+        cache.invalidate_outspends(txid)
+    assert cache.get_outspends("final") is not None
+
+def test_old_all_spent_rows_are_dropped(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE outspends (txid TEXT PRIMARY KEY, data TEXT NOT NULL, "
+                 "all_spent INTEGER NOT NULL, fetched_at REAL NOT NULL)")
+    conn.execute("INSERT INTO outspends VALUES ('a', '{\"0\": \"stale\"}', 1, 0)")
+    conn.commit()
+    conn.close()
+    assert TxCache(path).get_outspends("a") is None
+
+def test_replaced_mempool_spender_is_refetched(tmp_path, server, synthetic, make_api):
+    """Every output spent, but in the mempool: an RBF replacement must still be found after invalidation."""
+    _, txs, outspends = synthetic
+    leaf_txid, leaf_vout = next((txid, vout) for txid, spends in outspends.items()
+                                for vout, spend in enumerate(spends) if spend is None)
+    middle = server.spend(leaf_txid, leaf_vout)
+    first = [server.spend(middle, 0), server.spend(middle, 1)]
+
+    api = make_api(cache=str(tmp_path / "cache.sqlite"))
+    outs = api.get_spending_transactions(middle)
+    assert outs == {0: first[0], 1: first[1]} and not outs.final
+
+    replacement = server.spend(middle, 0, replace=True)
+    api.invalidate_outspends(middle)
+    assert api.get_spending_transactions(middle)[0] == replacement
+
+    server.confirm(replacement)
+    server.confirm(first[1])
+    api.invalidate_outspends(middle)
+    assert api.get_spending_transactions(middle).final
+    server.reset_stats()
+    api.invalidate_outspends(middle) # Final now: kept in SQLite, only the memo is dropped
+    assert api.get_spending_transactions(middle)[0] == replacement
+    assert server.stats()["requests"] == 0
+
+def test_invalidate_outspends_many(tmp_path):
+    cache = TxCache(str(tmp_path / "cache.sqlite"))
+    for i in range(100):
+        cache.put_outspends(f"t{i}", {0: None})
+    cache.put_outspends("final", {0: "b"}, final=True)
+    cache.invalidate_outspends_many([f"t{i}" for i in range(50)] + ["final"])
+    assert [cache.get_outspends(f"t{i}") is None for i in (0, 49, 50, 99)] == [True, True, False, False]
+    assert cache.get_outspends("final") == {0: "b"}
@@ -0,0 +1,70 @@
+import contextlib
+import io
+import time
+
+import pytest
+
+from utxo_tracer.cancel import CancelToken, TraceCancelled
+
+def test_cancel_token():
+    token = CancelToken()
+    token.raise_if_cancelled()
+    assert not token.wait(0.01)
+    token.cancel("shutdown")
+    token.cancel("later reasons are ignored")
+    assert token.cancelled and token.wait(0) and token.reason == "shutdown"
+    with pytest.raises(TraceCancelled):
+        token.raise_if_cancelled()
+
+def test_cancelled_trace_drains_and_refresh_finishes_it(server, synthetic, make_api, make_graph, trace_graph):
+    root = synthetic[0]
+    expected = len(trace_graph(root).store)
+
+    server.latency = 0.05
+    graph = make_graph(make_api())
+    with contextlib.redirect_stdout(io.StringIO()):
+        graph.trace_utxo(root, 0)
+        deadline = time.monotonic() + 10
+        while len(graph.store) < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert graph.cancel_trace(wait=True, timeout=10)
+        assert len(graph.store) < expected
+        assert graph.queued_utxos or graph.failed_utxos # Everything cut short is kept for later
+
+        server.latency = 0
+        graph.refresh_frontier()
+        assert graph.wait_for_trace(60)
+    assert len(graph.store) == expected
+    assert not graph.failed_utxos and not graph.queued_utxos
+
+def test_bounded_queue_runs_children_in_the_caller(synthetic, trace_graph):
+    root = synthetic[0]
+    unbounded = trace_graph(root)
+    bounded = trace_graph(root, max_workers=2, max_queued=1)
+    assert bounded.stats.counter_total("caller_runs") > 0
+    assert len(bounded.store) == len(unbounded.store)
+    assert sorted(map(str, bounded.unspent_utxos_found)) == sorted(map(str, unbounded.unspent_utxos_found))
+
+def test_shutdown_keeps_queued_work_in_the_checkpoint(tmp_path, server, synthetic, make_api, make_graph, trace_graph):
+    root = synthetic[0]
+    expected = len(trace_graph(root).store)
+
+    path = str(tmp_path / "checkpoint.json")
+    server.latency = 0.05
+    graph = make_graph(make_api(), max_workers=2, checkpoint_path=path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        graph.trace_utxo(root, 0)
+        deadline = time.monotonic() + 10
+        while graph._queued_tasks < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        graph.shutdown()
+    assert graph.trace_done.is_set() # Every queued task released its count
+    assert graph.failed_utxos or graph.queued_utxos # Claimed children count as failed, unclaimed ones as queued
+
+    server.latency = 0
+    resumed = make_graph(make_api())
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert resumed.load_checkpoint(path, expected_seed=(root, 0))
+        resumed.resume_trace()
+        assert resumed.wait_for_trace(60)
+    assert len(resumed.store) == expected
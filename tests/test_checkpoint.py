@@ -0,0 +1,49 @@
+import contextlib
+import io
+
+from utxo_tracer.traversal import TraceBudget
+
+def quiet(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+def unspent(graph):
+    return sorted((entry['txid'], entry['vout'], entry['value']) for entry in graph.unspent_utxos_found)
+
+def test_round_trip_needs_no_requests(tmp_path, server, synthetic, make_api, make_graph, trace_graph):
+    root = synthetic[0]
+    path = str(tmp_path / "checkpoint.json")
+    traced = trace_graph(root)
+    assert traced.save_checkpoint(path) == len(traced.store)
+
+    loaded = make_graph(make_api())
+    assert quiet(loaded.load_checkpoint, path, expected_seed=(root, 0))
+    assert loaded.store.to_state() == traced.store.to_state()
+    assert unspent(loaded) == unspent(traced)
+    server.reset_stats()
+    assert quiet(loaded.resume_trace) == 0
+    assert server.stats()["requests"] == 0
+
+def test_resume_finishes_a_partial_trace(tmp_path, synthetic, make_api, make_graph, trace_graph):
+    root = synthetic[0]
+    path = str(tmp_path / "checkpoint.json")
+    full = trace_graph(root)
+    partial = trace_graph(root, priority="value", budget=TraceBudget(max_nodes=8))
+    assert len(partial.store) < len(full.store)
+    partial.save_checkpoint(path)
+
+    resumed = make_graph(make_api())
+    assert quiet(resumed.load_checkpoint, path)
+    assert quiet(resumed.resume_trace) > 0
+    assert resumed.wait_for_trace(60)
+    assert len(resumed.store) == len(full.store)
+    assert unspent(resumed) == unspent(full)
+
+def test_unusable_checkpoints_leave_the_graph_alone(tmp_path, synthetic, make_api, make_graph, trace_graph):
+    root = synthetic[0]
+    path = str(tmp_path / "checkpoint.json")
+    trace_graph(root).save_checkpoint(path)
+    graph = make_graph(make_api())
+    assert not quiet(graph.load_checkpoint, str(tmp_path / "missing.json"))
+    assert not quiet(graph.load_checkpoint, path, expected_seed=("00" * 32, 0))
+    assert len(graph.store) == 0
@@ -0,0 +1,37 @@
+import threading
+
+from benchmarks.mock_mempool import MockMempoolServer, generate_graph
+from utxo_tracer.api import MempoolAPI
+from utxo_tracer.metrics import TimedLock
+
+def test_timed_lock_counts_contention():
+    lock = TimedLock()
+    with lock: pass
+    assert lock.contended == 0 and lock.wait.to_dict()["count"] == 1
+
+    lock.acquire()
+    assert not lock.acquire(blocking=False)
+    waiter = threading.Thread(target=lambda: (lock.acquire(), lock.release()))
+    waiter.start()
+    waiter.join(0.05)
+    lock.release()
+    waiter.join(5)
+    assert lock.contended == 1 and not lock.locked()
+
+def test_many_workers_trace_a_merging_graph_like_one(trace_graph):
+    root, txs, outspends = generate_graph(fanout=3, depth=4, unspent_rate=0.1, merge_rate=0.3)
+    server = MockMempoolServer(txs, outspends).start()
+    results = []
+    try:
+        for workers in (1, 16):
+            graph = trace_graph(root, MempoolAPI(base_url=server.url, requests_per_second=1000), max_workers=workers)
+            store = graph.store
+            edges = sorted((store.outpoint(src), store.outpoint(dst)) for src, dst in store.edges())
+            unspent = sorted((entry['txid'], entry['vout']) for entry in graph.unspent_utxos_found)
+            results.append((edges, unspent, store.visited_count()))
+            # Claims, records and spends of one output share lock holds: about two acquisitions per node
+            assert graph.graph_lock.wait.to_dict()["count"] <= 3 * len(store)
+    finally:
+        server.stop()
+    assert results[0] == results[1]
+    assert len(set(results[1][0])) == len(results[1][0]) # Every spend linked once
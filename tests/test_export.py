@@ -0,0 +1,61 @@
+import contextlib
+import csv
+import io
+import json
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from utxo_tracer.export import open_exporter
+
+GRAPHML = "{http://graphml.graphdrawing.org/xmlns}"
+
+def test_exports_match_the_traced_graph(tmp_path, synthetic, make_api, make_graph):
+    graph = make_graph(make_api())
+    for name in ("trace.jsonl", "trace.graphml", "trace.csv"):
+        graph.add_exporter(open_exporter(str(tmp_path / name), flush_interval=0))
+    with contextlib.redirect_stdout(io.StringIO()):
+        graph.trace_utxo(synthetic[0], 0)
+        assert graph.wait_for_trace(60)
+    graph.shutdown() # Closes the exporters
+    store = graph.store
+    outpoints = {f"{txid}:{vout}" for txid, vout in map(store.outpoint, range(len(store)))}
+    edges = {(f"{store.txid(src)}:{store.outpoint(src)[1]}", f"{store.txid(dst)}:{store.outpoint(dst)[1]}")
+             for src, dst in store.edges()}
+    unspent = {f"{entry['txid']}:{entry['vout']}" for entry in graph.unspent_utxos_found}
+
+    lines = [json.loads(line) for line in (tmp_path / "trace.jsonl").read_text().splitlines()]
+    nodes = {f"{r['txid']}:{r['vout']}": r for r in lines if r["type"] == "node"} # Last record wins
+    assert set(nodes) == outpoints
+    assert {key for key, r in nodes.items() if r["status"] == "unspent"} == unspent
+    assert {(f"{r['src_txid']}:{r['src_vout']}", f"{r['dst_txid']}:{r['dst_vout']}")
+            for r in lines if r["type"] == "edge"} == edges
+
+    root = ET.parse(tmp_path / "trace.graphml").getroot()
+    assert {node.get("id") for node in root.iter(GRAPHML + "node")} == outpoints
+    assert {(edge.get("source"), edge.get("target")) for edge in root.iter(GRAPHML + "edge")} == edges
+
+    with open(tmp_path / "trace_nodes.csv", newline="") as f:
+        assert {f"{row['txid']}:{row['vout']}" for row in csv.DictReader(f)} == outpoints
+    with open(tmp_path / "trace_edges.csv", newline="") as f:
+        assert len(list(csv.DictReader(f))) == len(edges)
+
+def test_graphml_keeps_the_last_record_per_outpoint(tmp_path):
+    def record(txid, status):
+        return {"txid": txid, "vout": 0, "value_sats": 1000, "script_type": "p2wpkh", "depth": 1,
+                "spent_by": "cc" * 32 if status == "spent" else None, "status": status}
+
+    path = tmp_path / "trace.graphml"
+    with open_exporter(str(path)) as exporter:
+        exporter.write_node(0, record("aa" * 32, "unspent"))
+        exporter.write_node(0, record("bb" * 32, "unspent")) # Same store id after a reset, different output
+        exporter.write_node(0, record("aa" * 32, "spent")) # A refresh found the spend
+    nodes = {node.get("id"): {data.get("key"): data.text for data in node}
+             for node in ET.parse(path).getroot().iter(GRAPHML + "node")}
+    assert set(nodes) == {"aa" * 32 + ":0", "bb" * 32 + ":0"}
+    assert nodes["aa" * 32 + ":0"]["n_status"] == "spent"
+    assert nodes["bb" * 32 + ":0"]["n_status"] == "unspent"
+
+def test_unknown_extension_is_refused(tmp_path):
+    with pytest.raises(ValueError):
+        open_exporter(str(tmp_path / "trace.txt"))
@@ -0,0 +1,14 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_headless_modules_skip_plotting_and_analysis_imports():
+    code = ("import json, sys\n"
+            "import utxo_tracer.graph, utxo_tracer.batch, utxo_tracer.checkpoint, utxo_tracer.export\n"
+            "print(json.dumps(sorted(m for m in ('matplotlib', 'numpy', 'scipy', 'networkx', 'aiohttp') "
+            "if m in sys.modules)))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout) == []
@@ -0,0 +1,51 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utxo_tracer.memo import LRUMemo
+
+def test_concurrent_lookups_share_one_fetch():
+    memo = LRUMemo()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "tx"
+
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(memo.get_or_fetch, "a", fetch) for _ in range(8)]
+        assert started.wait(5)
+        release.set()
+        assert [f.result() for f in futures] == ["tx"] * 8
+    assert len(calls) == 1
+    assert memo.get_or_fetch("a", lambda: "refetched") == "tx"
+
+def test_failed_fetches_are_shared_but_not_kept():
+    memo = LRUMemo()
+    assert memo.get_or_fetch("a", lambda: None) is None
+    assert memo.get_or_fetch("a", lambda: "tx") == "tx"
+
+def test_least_recently_used_entry_is_evicted():
+    memo = LRUMemo(maxsize=2)
+    memo.put("a", 1)
+    memo.put("b", 2)
+    assert memo.get("a") == 1 # "b" is now the oldest
+    memo.put("c", 3)
+    assert memo.get("b") is None
+    assert (memo.get("a"), memo.get("c")) == (1, 3)
+
+def test_api_serves_repeated_lookups_from_the_memo(server, synthetic, make_api):
+    root = synthetic[0]
+    api = make_api()
+    api.get_transaction_details(root)
+    api.get_spending_transactions(root)
+    server.reset_stats()
+    api.get_transaction_details(root)
+    api.get_spending_transactions(root)
+    assert server.stats()["requests"] == 0
+
+    api.clear_memo()
+    api.get_transaction_details(root)
+    assert server.stats()["requests"] == 1
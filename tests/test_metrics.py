@@ -0,0 +1,72 @@
+import threading
+import urllib.request
+
+from utxo_tracer.metrics import TraceProfiler, TraceStats
+
+def after_inline_task():
+    return sum(range(10))
+
+def test_inline_task_does_not_stop_the_outer_profile(tmp_path):
+    profiler = TraceProfiler(str(tmp_path / "trace.prof"))
+    profiler._per_thread = True # The path Python < 3.12 takes; one profiler per worker thread
+
+    def outer():
+        profiler.run(lambda: None) # A task the caller ran inline because the pool was full
+        return after_inline_task()
+
+    profiler.start()
+    assert profiler.run(outer) == 45
+    stats = profiler.stop()
+    assert any(name == "after_inline_task" for _, _, name in stats.stats)
+    assert (tmp_path / "trace.prof").exists()
+
+class SlowFlushExporter:
+    def __init__(self):
+        self.flushing, self.release = threading.Event(), threading.Event()
+
+    def flush(self):
+        self.flushing.set()
+        self.release.wait(5)
+
+    def close(self):
+        pass
+
+def test_last_task_flushes_exporters_outside_the_task_lock(make_api, make_graph):
+    graph = make_graph(make_api())
+    exporter = graph.add_exporter(SlowFlushExporter())
+    graph._increment_active_tasks()
+    last_task = threading.Thread(target=graph._decrement_active_tasks)
+    last_task.start()
+    assert exporter.flushing.wait(5)
+    assert graph._active_tasks_lock.acquire(timeout=1) # Other workers aren't blocked by the flush
+    graph._active_tasks_lock.release()
+    assert not graph.trace_done.is_set() # Only once the files are flushed
+    exporter.release.set()
+    last_task.join(5)
+    assert graph.trace_done.is_set()
+
+def test_trace_metrics_match_the_server(server, synthetic, trace_graph):
+    server.reset_stats()
+    graph = trace_graph(synthetic[0])
+    snapshot = graph.stats.snapshot()
+    assert graph.stats.counter_total("http_requests") == server.stats()["requests"]
+    assert snapshot["gauges"]["nodes"] == len(graph.store)
+    assert snapshot["histograms"]["graph_lock_wait_seconds"]["count"] > 0
+    assert snapshot["trace_seconds"] > 0
+
+def test_prometheus_export():
+    stats = TraceStats()
+    stats.inc("http_requests", 3, endpoint="tx")
+    stats.observe("http_request_seconds", 0.02, endpoint="tx")
+    stats.register_gauge("nodes", lambda: 7)
+    text = stats.to_prometheus()
+    assert 'utxo_tracer_http_requests_total{endpoint="tx"} 3' in text
+    assert "utxo_tracer_nodes 7" in text
+    assert 'utxo_tracer_http_request_seconds_bucket{endpoint="tx",le="+Inf"} 1' in text
+
+    metrics = stats.serve_prometheus(port=0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{metrics.server_port}/metrics", timeout=5) as resp:
+            assert "utxo_tracer_nodes 7" in resp.read().decode()
+    finally:
+        metrics.shutdown()
@@ -0,0 +1,47 @@
+import contextlib
+import io
+import time
+
+from benchmarks.mock_mempool import MockMempoolServer
+from utxo_tracer.api import MempoolAPI
+from utxo_tracer.ratelimit import TokenBucket
+
+def test_burst_then_rate():
+    bucket = TokenBucket(rate=10, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    wait = bucket.reserve()
+    assert 0 < wait <= 0.1
+    time.sleep(wait + 0.01)
+    assert bucket.reserve() == 0.0
+
+def test_throttling_halves_the_rate_and_success_recovers_it():
+    bucket = TokenBucket(rate=8, min_rate=1)
+    bucket.on_throttled()
+    bucket.on_throttled()
+    assert bucket.rate == 2
+    for _ in range(4): bucket.on_throttled()
+    assert bucket.rate == 1 # Never below min_rate
+    for _ in range(20): bucket.on_success()
+    assert bucket.rate == 8 # Never above the configured rate
+
+def test_retry_after_pauses_every_caller():
+    bucket = TokenBucket(rate=100)
+    bucket.on_throttled(retry_after=0.3)
+    assert 0.25 < bucket.reserve() <= 0.3
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.25
+
+def test_api_backs_off_on_429(synthetic):
+    root, txs, outspends = synthetic
+    server = MockMempoolServer(txs, outspends, throttle_rate=1.0, retry_after=0.3).start()
+    try:
+        api = MempoolAPI(base_url=server.url, requests_per_second=100, max_retries=2)
+        started = time.monotonic()
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert api.get_transaction_details(root) is None
+        assert time.monotonic() - started >= 0.6 # Two Retry-After pauses between three attempts
+        assert server.stats()["throttles_injected"] == 3
+        assert api.rate_limiter.rate < 100
+    finally:
+        server.stop()
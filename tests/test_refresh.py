@@ -0,0 +1,37 @@
+import contextlib
+import io
+
+def run(graph, start):
+    with contextlib.redirect_stdout(io.StringIO()):
+        start()
+        assert graph.wait_for_trace(60)
+
+def frontier(graph):
+    with graph.graph_lock:
+        return sorted((entry['txid'], entry['vout']) for entry in graph.unspent_utxos_found)
+
+def test_refresh_only_rechecks_the_frontier(tmp_path, server, synthetic, make_api, trace_graph):
+    root = synthetic[0]
+    graph = trace_graph(root, make_api(cache=str(tmp_path / "cache.sqlite"), bulk_size=1))
+    before = frontier(graph)
+    nodes = len(graph.store)
+
+    spent_txid, spent_vout = before[0]
+    new_txid = server.spend(spent_txid, spent_vout)
+    server.reset_stats()
+    run(graph, graph.refresh_frontier)
+
+    by_endpoint = server.stats()["by_endpoint"]
+    assert by_endpoint["outspends"] == len({txid for txid, _ in before}) + 1 # Frontier txs, then the new tx
+    assert by_endpoint["tx"] == 1
+    assert len(graph.store) == nodes + 2
+    assert frontier(graph) == sorted(before[1:] + [(new_txid, 0), (new_txid, 1)])
+
+def test_recheck_outputs_expands_only_the_given_outputs(server, synthetic, trace_graph):
+    graph = trace_graph(synthetic[0])
+    before = frontier(graph)
+    first, second = before[0], before[-1]
+    new_txid = server.spend(*first)
+    server.spend(*second) # Spent too, but not rechecked
+    run(graph, lambda: graph.recheck_outputs([first]))
+    assert frontier(graph) == sorted(before[1:] + [(new_txid, 0), (new_txid, 1)])
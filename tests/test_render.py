@@ -0,0 +1,67 @@
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pytest
+from utxo_tracer.render import GraphRenderer
+from utxo_tracer.store import UTXOStore
+
+@pytest.fixture
+def renderer():
+    fig, ax = plt.subplots()
+    yield GraphRenderer(fig, ax, lod_depth=None)
+    plt.close(fig)
+
+def chain(store, txids, value=1000):
+    """seed -> txids[0]:0,1 -> txids[1]:0,1 -> ..., each output 0 spent by the next tx."""
+    parent = store.intern("seed", 0)
+    store.set_output(parent, value, "p2wpkh")
+    store.set_depth(parent, 0)
+    for depth, txid in enumerate(txids, start=1):
+        children = [store.intern(txid, vout) for vout in (0, 1)]
+        for child in children:
+            store.set_output(child, value, "p2wpkh")
+            store.set_depth(child, depth)
+        store.link_outputs(parent, children)
+        parent = children[0]
+
+def test_snapshot_only_copies_what_changed(renderer):
+    store = UTXOStore()
+    chain(store, ["a", "b"])
+    first = renderer.snapshot(store)
+    assert first[3] == list(range(len(store))) # Everything is new
+    renderer.draw(first, "")
+
+    unchanged = renderer.snapshot(store)
+    assert unchanged[3] == [] and unchanged[1] == []
+    renderer.draw(unchanged, "")
+
+    store.set_output(1, 1000, "p2wpkh") # Same value and type: not a change
+    store.set_output(2, 7, "p2tr")
+    store.set_depth(3, 5)
+    chain_tip = store.intern("c", 0)
+    store.set_output(chain_tip, 3, "p2pkh")
+    store.link_outputs(3, [chain_tip])
+    snapshot = renderer.snapshot(store)
+    assert sorted(snapshot[3]) == [2, 3, chain_tip]
+    renderer.draw(snapshot, "")
+    assert renderer._values[2] == 7 and renderer._labels[2].endswith("(p2tr)")
+    assert renderer._depths[3] == 5
+    assert renderer._values[chain_tip] == 3 and len(renderer._edges) == store.num_edges()
+
+def test_lod_uses_incremental_values(renderer):
+    renderer.lod_min_value = 500
+    store = UTXOStore()
+    chain(store, ["a"])
+    renderer.draw(renderer.snapshot(store), "")
+    assert len(renderer._shown) == 3 and not renderer._summary_parents
+
+    store.set_output(2, 100, "p2wpkh") # Now dust: folded into a summary under the seed
+    renderer.draw(renderer.snapshot(store), "")
+    assert 2 not in renderer._shown_set and renderer._summary_parents == [0]
+    assert renderer._summary_labels[0].startswith("1 output\n")
+
+def test_headless_store_tracks_nothing():
+    store = UTXOStore()
+    chain(store, ["a", "b", "c"])
+    store.set_depth(1, 9)
+    assert not store._dirty # No renderer has taken a snapshot yet
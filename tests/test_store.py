@@ -0,0 +1,50 @@
+from benchmarks.mock_mempool import MockMempoolServer, generate_graph
+from utxo_tracer.api import MempoolAPI
+from utxo_tracer.store import UTXOStore
+
+def test_interning():
+    store = UTXOStore()
+    a = store.intern("aa", 0)
+    assert store.intern("aa", 0) == a
+    b = store.intern("aa", 0xffffffff) # Largest vout doesn't collide with the next txid index
+    c = store.intern("bb", 0)
+    assert len({a, b, c}) == 3
+    assert store.find("aa", 0xffffffff) == b and store.find("bb", 1) is None and store.find("cc", 0) is None
+    assert store.outpoint(b) == ("aa", 0xffffffff)
+    assert ("bb", 0) in store
+
+def test_link_outputs_once_per_spend():
+    store = UTXOStore()
+    parents = [store.intern("in", 0), store.intern("in", 1)]
+    outputs = [store.intern("batch", vout) for vout in range(1000)]
+    for parent in parents: # Two traced inputs of the same tx: both get every output
+        assert store.link_outputs(parent, outputs)
+        assert not store.link_outputs(parent, outputs)
+    assert store.num_edges() == 2000
+    assert sorted(store.children(parents[1])) == outputs
+
+def test_state_round_trip():
+    store = UTXOStore()
+    root = store.intern("root", 0)
+    store.set_output(root, 1000, "v1_p2tr")
+    store.claim(root)
+    store.set_spent_by(root, "child")
+    store.set_input_position(root, "child", 0, 1000)
+    store.link_outputs(root, [store.intern("child", 0), store.intern("child", 1)])
+    copy = UTXOStore()
+    copy.load_state(store.to_state())
+    assert copy.to_state() == store.to_state()
+    assert copy.spent_by(root) == "child" and copy.script_type(root) == "v1_p2tr" and copy.is_visited(root)
+    assert list(copy.edges()) == list(store.edges())
+
+def test_merged_spends_trace_without_duplicate_edges(trace_graph):
+    root, txs, outspends = generate_graph(fanout=3, depth=4, merge_rate=0.3, seed=3)
+    server = MockMempoolServer(txs, outspends).start()
+    graph = trace_graph(root, MempoolAPI(base_url=server.url, requests_per_second=1000), max_workers=8)
+    edges = list(graph.store.edges())
+    expected = {((prev["txid"], prev["vout"]), (txid, vout)) for txid, tx in txs.items()
+                for prev in tx["vin"] for vout in range(len(tx["vout"]))}
+    labelled = {(graph.store.outpoint(src), graph.store.outpoint(dst)) for src, dst in edges}
+    assert len(edges) == len(labelled) == len(expected)
+    assert labelled == expected
+    server.stop()
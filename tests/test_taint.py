@@ -0,0 +1,71 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+
+from utxo_tracer.store import UTXOStore
+from utxo_tracer.taint import leaf_taint, propagate, taint_matrix
+
+def one_spend(seed_offset, input_total=200, outputs=(150, 50)):
+    """seed:0 (100 sats) is one input of tx "t", which pays `outputs`; the other inputs weren't traced."""
+    store = UTXOStore()
+    seed = store.intern("seed", 0)
+    store.set_output(seed, 100, "p2wpkh")
+    children = []
+    for vout, value in enumerate(outputs):
+        child = store.intern("t", vout)
+        store.set_output(child, value, "p2wpkh")
+        children.append(child)
+    store.link_outputs(seed, children)
+    store.set_input_position(seed, "t", seed_offset, input_total)
+    return store, children
+
+def test_proportional_shares_the_tx_by_value():
+    store, (a, b) = one_spend(seed_offset=0)
+    taint = propagate(store.columns(), rule="proportional")
+    assert taint[a] == pytest.approx(75) and taint[b] == pytest.approx(25)
+
+@pytest.mark.parametrize("offset, expected", [(0, (100, 0)), (100, (50, 50))])
+def test_fifo_follows_input_and_output_order(offset, expected):
+    store, children = one_spend(seed_offset=offset)
+    taint = propagate(store.columns(), rule="fifo")
+    assert [taint[child] for child in children] == pytest.approx(expected)
+
+def test_unknown_input_position_falls_back_to_the_outputs_total():
+    store, (a, b) = one_spend(seed_offset=-1, input_total=-1, outputs=(60, 20))
+    for rule in ("proportional", "fifo"):
+        taint = propagate(store.columns(), rule=rule)
+        assert taint[a] == pytest.approx(75) and taint[b] == pytest.approx(25)
+
+def test_unknown_rule_is_refused():
+    store, _ = one_spend(seed_offset=0)
+    with pytest.raises(ValueError):
+        propagate(store.columns(), rule="lifo")
+
+@pytest.fixture
+def traced(synthetic, trace_graph):
+    return trace_graph(synthetic[0])
+
+@pytest.mark.parametrize("rule", ["proportional", "fifo"])
+def test_level_walk_matches_the_dense_series(traced, rule):
+    columns = traced.store.columns()
+    w = taint_matrix(columns, rule).toarray()
+    seed = np.zeros(len(w))
+    seed[0] = columns["value"][0]
+    expected, level = seed.copy(), seed
+    while level.any(): # The graph is a DAG, so W is nilpotent
+        level = level @ w
+        expected += level
+    assert propagate(columns, 0, rule) == pytest.approx(expected)
+
+def test_leaves_never_hold_more_than_the_seed(traced):
+    seed_value = traced.store.records[0].value
+    totals = {}
+    for rule in ("proportional", "fifo"):
+        leaves = leaf_taint(traced, rule)
+        assert len(leaves) == len(traced.unspent_utxos_found)
+        assert all(0 <= leaf['taint_share'] <= 1 for leaf in leaves)
+        totals[rule] = sum(leaf['tainted_sats'] for leaf in leaves)
+        assert 0 < totals[rule] <= seed_value # Fees and depth-limited spends keep the rest
+    # Every synthetic tx has one input, so the rules only differ in which output gets what
+    assert totals["proportional"] == pytest.approx(totals["fifo"], abs=len(traced.unspent_utxos_found))
@@ -0,0 +1,55 @@
+import pytest
+
+from utxo_tracer.metrics import TraceStats
+from utxo_tracer.traversal import PriorityFrontier, TraceBudget, resolve_scorer
+
+def test_frontier_pops_best_first_and_caps_in_flight():
+    frontier = PriorityFrontier(resolve_scorer("value"), max_in_flight=2)
+    for vout, value in enumerate([10, 500, 30, 500]):
+        frontier.push("a", vout, 1, value)
+    ready, dropped = frontier.take()
+    assert [vout for _, vout, _, _ in ready] == [1, 3] and not dropped # Ties keep insertion order
+    assert frontier.take() == ([], [])
+    frontier.done()
+    assert [vout for _, vout, _, _ in frontier.take()[0]] == [2]
+
+def test_exhausted_budget_drops_the_rest():
+    frontier = PriorityFrontier(resolve_scorer("depth"), max_in_flight=10)
+    frontier.push("a", 0, 1, 5)
+    frontier.push("a", 1, 2, 5)
+    ready, dropped = frontier.take(lambda: "max_nodes=1 reached")
+    assert ready == [] and len(dropped) == 2
+    assert frontier.exhausted_reason == "max_nodes=1 reached"
+    frontier.push("a", 2, 3, 5)
+    assert frontier.take(lambda: None) == ([], [("a", 2, 3, 5)])
+
+def test_budget_limits():
+    stats = TraceStats()
+    budget = TraceBudget(max_requests=2, max_nodes=5, min_value=1000)
+    budget.start(stats)
+    assert budget.exhausted(stats, 4) is None
+    assert budget.exhausted(stats, 5) == "max_nodes=5 reached"
+    stats.inc("http_requests", 2, endpoint="tx")
+    assert budget.exhausted(stats, 0) == "max_requests=2 reached"
+    assert budget.below_min_value(999) and not budget.below_min_value(1000)
+    assert not budget.below_min_value(-1) # Unknown values are traced
+    with pytest.raises(ValueError):
+        resolve_scorer("random")
+
+def test_node_budget_stops_the_trace_and_keeps_the_rest_queued(synthetic, trace_graph):
+    full = trace_graph(synthetic[0], max_workers=2)
+    limited = trace_graph(synthetic[0], max_workers=2, priority="value", budget=TraceBudget(max_nodes=10))
+    assert 10 <= len(limited.store) < len(full.store)
+    assert limited.queued_utxos
+    for txid, vout, depth, value in limited.queued_utxos:
+        assert limited.store.find(txid, vout) is not None # Discovered, just never expanded
+
+def test_min_value_skips_dust(synthetic, trace_graph):
+    full = trace_graph(synthetic[0], max_workers=2)
+    values = sorted(record.value for record in full.store.records if record.value >= 0)
+    threshold = values[len(values) // 2]
+    limited = trace_graph(synthetic[0], max_workers=2, priority="value", budget=TraceBudget(min_value=threshold))
+    with limited.graph_lock:
+        expanded = [node for node in range(len(limited.store)) if limited.store.children(node)]
+    assert all(limited.store.records[node].value >= threshold for node in expanded if node != 0)
+    assert len(limited.store) < len(full.store)
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+from benchmarks.mock_mempool import MockMempoolServer
+from utxo_tracer.api import MempoolAPI
+from utxo_tracer.watch import SpendWatcher
+
+pytest.importorskip("websocket") # websocket-client; without it SpendWatcher only polls
+
+def wait_until(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+def bulk_requests(server):
+    return server.stats()["by_endpoint"].get("outspends_bulk", 0)
+
+@pytest.fixture
+def watched(synthetic, trace_graph):
+    """Trace the synthetic graph against a mock server, then watch its frontier.
+    Yields make(**server_and_watcher_options) -> (server, graph, watcher)."""
+    cleanups = []
+
+    def make(max_tracked_addresses=1000, **watcher_options):
+        _, txs, outspends = synthetic
+        server = MockMempoolServer(txs, outspends, max_tracked_addresses=max_tracked_addresses).start()
+        cleanups.append(server.stop)
+        graph = trace_graph(synthetic[0], MempoolAPI(base_url=server.url, requests_per_second=1000))
+        server.reset_stats() # Only count the watcher's requests
+        watcher = SpendWatcher(graph, **watcher_options).start()
+        cleanups.append(watcher.stop)
+        return server, graph, watcher
+    yield make
+    for cleanup in reversed(cleanups):
+        cleanup()
+
+def frontier(graph):
+    with graph.graph_lock:
+        return sorted((entry['txid'], entry['vout']) for entry in graph.unspent_utxos_found)
+
+def test_pushed_spend_is_reported_without_polling(watched):
+    server, graph, watcher = watched(poll_interval=60)
+    assert wait_until(lambda: watcher.mode() == "push")
+    assert wait_until(lambda: bulk_requests(server) >= 1) # The catch-up poll after subscribing
+    polls = bulk_requests(server)
+    txid, vout = frontier(graph)[0]
+
+    spending_txid = server.spend(txid, vout)
+    assert watcher.spend_event.wait(5)
+    assert watcher.pop_spends() == [(txid, vout, spending_txid)]
+    assert bulk_requests(server) == polls
+    assert not watcher.spend_event.is_set()
+
+def test_output_left_in_the_frontier_is_reported_again_after_sync(watched):
+    server, graph, watcher = watched(poll_interval=60)
+    assert wait_until(lambda: watcher.mode() == "push")
+    txid, vout = frontier(graph)[0]
+
+    first = server.spend(txid, vout)
+    assert watcher.spend_event.wait(5)
+    assert watcher.pop_spends() == [(txid, vout, first)]
+    watcher.sync() # Still unspent in the graph, e.g. the recheck ran before the spend propagated
+    replacement = server.spend(txid, vout, replace=True)
+    assert watcher.spend_event.wait(5)
+    assert watcher.pop_spends() == [(txid, vout, replacement)]
+
+def test_dropped_feed_reconnects_and_catches_up_by_polling(watched):
+    server, graph, watcher = watched(poll_interval=60, reconnect_delay=0.5)
+    assert wait_until(lambda: watcher.mode() == "push")
+    txid, vout = frontier(graph)[0]
+
+    server.drop_websockets()
+    assert wait_until(lambda: not watcher.connected)
+    spending_txid = server.spend(txid, vout) # Nobody tracks the address right now: never pushed
+    assert wait_until(lambda: watcher.mode() == "push" and server.stats()["websocket_clients"] == 1)
+    assert watcher.spend_event.wait(5)
+    assert watcher.pop_spends() == [(txid, vout, spending_txid)]
+
+def test_refused_subscription_falls_back_to_bulk_polling(watched):
+    server, graph, watcher = watched(max_tracked_addresses=1, poll_interval=0.2)
+    assert watcher.watched_count() > 1
+    assert wait_until(lambda: watcher.connected and watcher.mode() == "polling")
+    txid, vout = frontier(graph)[-1]
+
+    spending_txid = server.spend(txid, vout)
+    assert watcher.spend_event.wait(5)
+    assert watcher.pop_spends() == [(txid, vout, spending_txid)]
+    by_endpoint = server.stats()["by_endpoint"]
+    assert by_endpoint["outspends_bulk"] >= 1 and "outspends" not in by_endpoint
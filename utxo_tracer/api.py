@@ -1,41 +1,263 @@
 import requests
+from requests.adapters import HTTPAdapter
+import threading
 import time
+from email.utils import parsedate_to_datetime
+from .cache import TxCache
+from .memo import LRUMemo
+from .metrics import TraceStats
+from .ratelimit import TokenBucket
+
+THROTTLE_STATUS_CODES = (429, 503)
+ROUTE_MISSING_STATUS_CODES = (404, 405, 501) # What a backend without an optional route answers
+ROUTE_MISSING = object() # Returned by _get_json(optional_route=True) for those statuses
+
+def _parse_retry_after(value):
+    """Retry-After is either a number of seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class Outspends(dict):
+    """{vout: spending_txid or None}. `final` is set when every output is spent by a confirmed tx:
+    only then can the list never change, since mempool spends can still be replaced or dropped."""
+    __slots__ = ("final",)
+
+    def __init__(self, spenders=(), final=False):
+        super().__init__(spenders)
+        self.final = final
+
+def _parse_outspends(data):
+    """Turn an /outspends response into Outspends."""
+    return Outspends(
+        {idx: out.get("txid") if out.get("spent") else None for idx, out in enumerate(data)},
+        final=bool(data) and all(out.get("spent") and (out.get("status") or {}).get("confirmed") for out in data))
+
+def _parse_bulk_outspends(txids, data):
+    """Turn a /txs/outspends response (one outspends list per txid, in order) into
+    {txid: {vout: spending_txid or None}}. None if the response doesn't have that shape."""
+    if not isinstance(data, list) or len(data) != len(txids) or not all(isinstance(outs, list) for outs in data):
+        return None
+    return {txid: _parse_outspends(outs) for txid, outs in zip(txids, data)}
+
+class _OutspendsBatch:
+    """Outspends misses waiting to be sent as one bulk request; the thread that opened it sends it."""
+    __slots__ = ("txids", "full", "done", "results")
+
+    def __init__(self):
+        self.txids = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results = {}
 
 class MempoolAPI:
-    def __init__(self, base_url="https://mempool.space/api", sleep_time=0.2):
+    def __init__(self, base_url="https://mempool.space/api", sleep_time=0.2, cache=None, memo_size=4096,
+                 requests_per_second=None, max_connections=20, timeout=10, max_retries=3, stats=None,
+                 bulk_size=25, bulk_window=0.01):
         self.base_url = base_url
         self.sleep_time = sleep_time
+        self.timeout = timeout
+        self.max_retries = max_retries
+        # One pooled session for all workers so connections (and TLS handshakes) are reused
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Global rate limit; sleep_time is kept as the old "one request per sleep_time seconds" knob
+        if requests_per_second is None:
+            requests_per_second = 1.0 / sleep_time if sleep_time else 1000.0
+        self.rate_limiter = TokenBucket(rate=requests_per_second)
+        # Optional persistent cache; pass a TxCache or a path to an SQLite file
+        self.cache = TxCache(cache) if isinstance(cache, str) else cache
+        # In-memory memo shared by all worker threads; also coalesces identical in-flight requests
+        self.memo = LRUMemo(maxsize=memo_size)
+        # Request/cache counters and latencies; UTXOGraph shares this object with its own metrics
+        self.stats = stats or TraceStats()
+        # Bulk outspends (/txs/outspends?txids=...): misses from concurrent workers within bulk_window
+        # seconds share one request of up to bulk_size txids. bulk_size <= 1 disables it; it is also
+        # switched off for good the first time the backend turns out not to have the route.
+        self.bulk_size = bulk_size
+        self.bulk_window = bulk_window
+        self.bulk_outspends = bulk_size > 1
+        self._batch_lock = threading.Lock()
+        self._open_batch = None # _OutspendsBatch still accepting txids
+
+    def clear_memo(self):
+        """Forget memoized responses (e.g. before a refresh, so outspends are re-checked)."""
+        self.memo.clear()
+
+    def invalidate_outspends(self, txid):
+        """Force the next get_spending_transactions(txid) to ask the server again."""
+        self.invalidate_outspends_many([txid])
+
+    def invalidate_outspends_many(self, txids):
+        """invalidate_outspends() for many txids, with one SQLite commit."""
+        txids = list(dict.fromkeys(txids))
+        for txid in txids:
+            self.memo.invalidate(("outspends", txid))
+        if self.cache: self.cache.invalidate_outspends_many(txids)
 
     def get_transaction_details(self, txid):
         """Get full transaction details."""
-        url = f"{self.base_url}/tx/{txid}"
-        try:
-            resp = requests.get(url)
-            # Apply sleep after the request, regardless of success or failure, to rate limit
-            time.sleep(self.sleep_time)
-            if resp.status_code == 200:
-                return resp.json()
-            print(f"[ERROR] Status {resp.status_code} for {url} while fetching transaction details.")
-        except Exception as e:
-            print(f"[ERROR] Failed to fetch transaction details for {txid}: {e}")
-        return None
+        self.stats.inc("memo_lookups", endpoint="tx")
+        return self.memo.get_or_fetch(("tx", txid), lambda: self._fetch_transaction_details(txid))
 
     def get_spending_transactions(self, txid):
         """Get outspend info for all outputs of a transaction."""
-        url = f"{self.base_url}/tx/{txid}/outspends"
+        self.stats.inc("memo_lookups", endpoint="outspends")
+        return self.memo.get_or_fetch(("outspends", txid), lambda: self._fetch_spending_transactions(txid),
+                                      should_store=bool) # {} means the fetch failed
+
+    def get_spending_transactions_bulk(self, txids):
+        """Outspends of many transactions at once: {txid: {vout: spending_txid or None}}.
+        Memoized and cached entries are reused; the rest is fetched bulk_size txids per request,
+        or one request per tx if the backend has no bulk route."""
+        txids = list(dict.fromkeys(txids))
+        missing = [txid for txid in txids if self.memo.get(("outspends", txid)) is None
+                   and not (self.cache and self.cache.get_outspends(txid) is not None)]
+        for start in range(0, len(missing), max(self.bulk_size, 1)):
+            chunk = missing[start:start + self.bulk_size]
+            if len(chunk) < 2 or not self.bulk_outspends:
+                break # Singles go through get_spending_transactions below
+            for txid, outspends in (self._fetch_outspends_bulk(chunk) or {}).items():
+                if not outspends: continue
+                self.memo.put(("outspends", txid), outspends)
+                if self.cache: self.cache.put_outspends(txid, outspends, final=outspends.final)
+        return {txid: self.get_spending_transactions(txid) for txid in txids}
+
+    def _fetch_transaction_details(self, txid):
+        self.stats.inc("memo_misses", endpoint="tx")
+        if self.cache:
+            self.stats.inc("sqlite_lookups", endpoint="tx")
+            cached = self.cache.get_transaction(txid)
+            if cached is not None:
+                return cached
+            self.stats.inc("sqlite_misses", endpoint="tx")
+        tx_details = self._get_json(f"{self.base_url}/tx/{txid}", "transaction details", "tx")
+        if tx_details is not None and self.cache:
+            self.cache.put_transaction(txid, tx_details)
+        return tx_details
+
+    def _fetch_spending_transactions(self, txid):
+        self.stats.inc("memo_misses", endpoint="outspends")
+        if self.cache:
+            self.stats.inc("sqlite_lookups", endpoint="outspends")
+            cached = self.cache.get_outspends(txid)
+            if cached is not None:
+                return cached
+            self.stats.inc("sqlite_misses", endpoint="outspends")
+        outspends = self._fetch_outspends_batched(txid) if self.bulk_outspends else None
+        if outspends is None: # No bulk route, or the bulk request this txid was part of failed
+            data = self._get_json(f"{self.base_url}/tx/{txid}/outspends", "outspends", "outspends")
+            if data is None:
+                return {}
+            outspends = _parse_outspends(data)
+        if self.cache: self.cache.put_outspends(txid, outspends, final=outspends.final)
+        return outspends
+
+    def _fetch_outspends_batched(self, txid):
+        """Join the open bulk batch, or open one and send it as soon as a request token is available.
+        Returns this txid's outspends ({} if the fetch failed), or None to fall back to a single request."""
+        with self._batch_lock:
+            batch = self._open_batch
+            is_sender = batch is None
+            if is_sender:
+                batch = self._open_batch = _OutspendsBatch()
+            batch.txids.append(txid)
+            if len(batch.txids) >= self.bulk_size:
+                self._open_batch = None # Full; the next miss opens a new batch
+                batch.full.set()
+
+        if not is_sender:
+            batch.done.wait()
+            return batch.results.get(txid)
+
         try:
-            resp = requests.get(url)
-            time.sleep(self.sleep_time) # Original sleep call
+            # Other workers' misses join while we wait for a token, so the busier the rate limit, the bigger the batch
+            waited = self.rate_limiter.acquire()
+            if waited < self.bulk_window:
+                batch.full.wait(self.bulk_window - waited)
+            with self._batch_lock:
+                if self._open_batch is batch:
+                    self._open_batch = None
+            if len(batch.txids) > 1:
+                batch.results = self._fetch_outspends_bulk(batch.txids, prepaid_wait=waited) or {}
+            else: # Nobody joined; spend the token on the plain route
+                data = self._get_json(f"{self.base_url}/tx/{txid}/outspends", "outspends", "outspends",
+                                      prepaid_wait=waited)
+                return {} if data is None else _parse_outspends(data)
+        finally:
+            with self._batch_lock:
+                if self._open_batch is batch:
+                    self._open_batch = None
+            batch.done.set() # Waiters fall back to single requests for whatever is missing
+        return batch.results.get(txid)
+
+    def _fetch_outspends_bulk(self, txids, prepaid_wait=None):
+        """One /txs/outspends request for `txids`; None if it failed or the backend lacks the route."""
+        data = self._get_json(f"{self.base_url}/txs/outspends?txids={','.join(txids)}",
+                              f"outspends of {len(txids)} txs", "outspends_bulk", optional_route=True,
+                              prepaid_wait=prepaid_wait)
+        results = None if data is None or data is ROUTE_MISSING else _parse_bulk_outspends(txids, data)
+        if data is ROUTE_MISSING or (data is not None and results is None):
+            self._disable_bulk_outspends()
+        elif results:
+            self.stats.inc("bulk_outspends_txids", len(txids))
+        return results
+
+    def _disable_bulk_outspends(self):
+        if self.bulk_outspends:
+            self.bulk_outspends = False
+            print(f"[WARN] {self.base_url} has no bulk outspends route; using one request per transaction.")
+
+    def _get_json(self, url, what, endpoint, optional_route=False, prepaid_wait=None):
+        """GET `url` through the shared session and rate limiter, retrying throttles and transient errors.
+        `endpoint` ("tx", "outspends" or "outspends_bulk") labels the request metrics. With optional_route,
+        a status saying the route doesn't exist returns ROUTE_MISSING instead of printing an error.
+        prepaid_wait is set when the caller already took the first attempt's rate-limit token."""
+        for attempt in range(self.max_retries + 1):
+            waited = prepaid_wait if attempt == 0 and prepaid_wait is not None else self.rate_limiter.acquire()
+            self.stats.observe("rate_limit_wait_seconds", waited)
+            self.stats.inc("http_requests", endpoint=endpoint)
+            started = time.perf_counter()
+            try:
+                resp = self.session.get(url, timeout=self.timeout)
+            except requests.RequestException as e:
+                self.stats.inc("http_errors", endpoint=endpoint)
+                print(f"[ERROR] Failed to fetch {what} from {url} (attempt {attempt + 1}): {e}")
+                time.sleep(min(2 ** attempt, 30))
+                continue
+            self.stats.observe("http_request_seconds", time.perf_counter() - started, endpoint=endpoint)
+            self.stats.inc("http_responses", endpoint=endpoint, status=resp.status_code)
+
             if resp.status_code == 200:
-                data = resp.json()
-                return {
-                    idx: out.get("txid") if out.get("spent") else None
-                    for idx, out in enumerate(data)
-                }
-            print(f"[ERROR] Status {resp.status_code} for {url} while fetching outspends.")
-        except Exception as e:
-            print(f"[ERROR] Failed to fetch outspends for {txid}: {e}")
-        return {}
+                self.rate_limiter.on_success()
+                try:
+                    return resp.json()
+                except ValueError as e:
+                    print(f"[ERROR] Invalid JSON from {url} while fetching {what}: {e}")
+                    return None
+            if resp.status_code in THROTTLE_STATUS_CODES:
+                retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+                self.rate_limiter.on_throttled(retry_after if retry_after is not None else min(2 ** attempt, 30))
+                print(f"[WARN] Throttled ({resp.status_code}) on {url}; now at {self.rate_limiter.rate:.2f} req/s")
+                continue
+            if resp.status_code >= 500:
+                time.sleep(min(2 ** attempt, 30))
+                continue
+            if optional_route and resp.status_code in ROUTE_MISSING_STATUS_CODES:
+                return ROUTE_MISSING
+            print(f"[ERROR] Status {resp.status_code} for {url} while fetching {what}.")
+            return None
+        print(f"[ERROR] Giving up on {url} after {self.max_retries + 1} attempts.")
+        return None
 
     def get_outputs(self, txid, tx_details=None):
         """Get list of (vout_index, value) for a transaction.
@@ -47,6 +269,22 @@ class MempoolAPI:
             return [(i, out.get("value", 0)) for i, out in enumerate(tx_details.get("vout", []))]
         return []
 
+    def get_input_position(self, txid, prev_txid, prev_vout, tx_details=None):
+        """(sats of the inputs before prev_txid:prev_vout, sats of all inputs) for transaction txid,
+        from the prevouts of its inputs. (-1, -1) if a prevout value is missing or it isn't an input."""
+        if tx_details is None:
+            tx_details = self.get_transaction_details(txid)
+
+        offset, total = -1, 0
+        for vin in (tx_details or {}).get("vin", []):
+            value = (vin.get("prevout") or {}).get("value")
+            if value is None:
+                return -1, -1 # Coinbase, or a backend without prevouts
+            if vin.get("txid") == prev_txid and vin.get("vout") == prev_vout:
+                offset = total
+            total += value
+        return (offset, total) if offset >= 0 else (-1, -1)
+
     def get_scripttype(self, txid, vout_index, tx_details=None):
         """Get the scriptPubKey type of a specific output.
         Optionally uses pre-fetched tx_details."""
@@ -0,0 +1,402 @@
+import asyncio
+import time
+import aiohttp
+from .api import (ROUTE_MISSING, ROUTE_MISSING_STATUS_CODES, THROTTLE_STATUS_CODES,
+                  _parse_bulk_outspends, _parse_outspends, _parse_retry_after)
+from .cancel import TraceCancelled
+
+class _AsyncOutspendsBatch:
+    """asyncio version of api._OutspendsBatch."""
+
+    def __init__(self):
+        self.txids = []
+        self.full = asyncio.Event()
+        self.done = asyncio.Event()
+        self.results = {}
+
+class AsyncMempoolAPI:
+    """asyncio counterpart of MempoolAPI's two network calls.
+
+    It shares the persistent cache, the LRU memo and the token bucket of a
+    MempoolAPI, so both engines see the same rate limit and cached data.
+    Identical in-flight requests are coalesced onto one task, and outspends
+    misses are batched into bulk requests with the MempoolAPI's bulk settings.
+    SQLite never runs on the event loop: lookups go through asyncio.to_thread,
+    and writes are buffered and committed together every cache_flush_interval seconds.
+    """
+
+    def __init__(self, sync_api, max_concurrency=200, cache_flush_interval=0.5):
+        self.sync_api = sync_api # Owns bulk_outspends, so a missing bulk route is remembered across traces
+        self.base_url = sync_api.base_url
+        self.cache = sync_api.cache
+        self.memo = sync_api.memo
+        self.rate_limiter = sync_api.rate_limiter
+        self.stats = sync_api.stats
+        self.timeout = sync_api.timeout
+        self.max_retries = sync_api.max_retries
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = {}
+        self._open_batch = None
+        self._session = None
+        self.cache_flush_interval = cache_flush_interval
+        self._unflushed_txs = {} # txid -> tx details waiting for the next cache flush
+        self._unflushed_outspends = {} # txid -> Outspends
+        self._flush_task = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self._flush_task:
+            self._flush_task.cancel()
+        await self._flush_cache()
+        await self._session.close()
+
+    # --- Persistent cache, off the event loop ---
+
+    async def _cache_lookup(self, unflushed, lookup, txid):
+        if txid in unflushed:
+            return unflushed[txid]
+        return await asyncio.to_thread(lookup, txid)
+
+    def _cache_put(self, unflushed, txid, value):
+        unflushed[txid] = value
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_cache_later())
+
+    async def _flush_cache_later(self):
+        await asyncio.sleep(self.cache_flush_interval)
+        self._flush_task = None
+        await self._flush_cache()
+
+    async def _flush_cache(self):
+        txs, self._unflushed_txs = self._unflushed_txs, {}
+        outspends, self._unflushed_outspends = self._unflushed_outspends, {}
+        if txs or outspends:
+            await asyncio.to_thread(self.cache.put_many, txs.items(),
+                                    [(txid, outs, outs.final) for txid, outs in outspends.items()])
+
+    async def get_transaction_details(self, txid):
+        """Get full transaction details."""
+        self.stats.inc("memo_lookups", endpoint="tx")
+        return await self._memoized(("tx", txid), lambda: self._fetch_transaction_details(txid),
+                                    should_store=lambda result: result is not None)
+
+    async def get_spending_transactions(self, txid):
+        """Get outspend info for all outputs of a transaction."""
+        self.stats.inc("memo_lookups", endpoint="outspends")
+        return await self._memoized(("outspends", txid), lambda: self._fetch_spending_transactions(txid),
+                                    should_store=bool)
+
+    async def get_spending_transactions_bulk(self, txids):
+        """Outspends of many transactions: {txid: {vout: spending_txid or None}}. Misses are
+        requested concurrently, which the batching below turns into bulk requests."""
+        txids = list(dict.fromkeys(txids))
+        results = await asyncio.gather(*(self.get_spending_transactions(txid) for txid in txids))
+        return dict(zip(txids, results))
+
+    async def _memoized(self, key, fetch, should_store):
+        cached = self.memo.get(key)
+        if cached is not None:
+            return cached
+        task = self._in_flight.get(key)
+        if task is None:
+            task = self._in_flight[key] = asyncio.ensure_future(fetch())
+
+            def _on_done(done_task):
+                self._in_flight.pop(key, None)
+                if not done_task.cancelled() and done_task.exception() is None and should_store(done_task.result()):
+                    self.memo.put(key, done_task.result())
+            task.add_done_callback(_on_done)
+        return await asyncio.shield(task) # A cancelled waiter must not cancel the fetch others are waiting on
+
+    async def _fetch_transaction_details(self, txid):
+        self.stats.inc("memo_misses", endpoint="tx")
+        if self.cache:
+            self.stats.inc("sqlite_lookups", endpoint="tx")
+            cached = await self._cache_lookup(self._unflushed_txs, self.cache.get_transaction, txid)
+            if cached is not None:
+                return cached
+            self.stats.inc("sqlite_misses", endpoint="tx")
+        tx_details = await self._get_json(f"{self.base_url}/tx/{txid}", "transaction details", "tx")
+        if tx_details is not None and self.cache:
+            self._cache_put(self._unflushed_txs, txid, tx_details)
+        return tx_details
+
+    async def _fetch_spending_transactions(self, txid):
+        self.stats.inc("memo_misses", endpoint="outspends")
+        if self.cache:
+            self.stats.inc("sqlite_lookups", endpoint="outspends")
+            cached = await self._cache_lookup(self._unflushed_outspends, self.cache.get_outspends, txid)
+            if cached is not None:
+                return cached
+            self.stats.inc("sqlite_misses", endpoint="outspends")
+        outspends = await self._fetch_outspends_batched(txid) if self.sync_api.bulk_outspends else None
+        if outspends is None:
+            data = await self._get_json(f"{self.base_url}/tx/{txid}/outspends", "outspends", "outspends")
+            if data is None:
+                return {}
+            outspends = _parse_outspends(data)
+        if self.cache: self._cache_put(self._unflushed_outspends, txid, outspends)
+        return outspends
+
+    async def _fetch_outspends_batched(self, txid):
+        """Same protocol as MempoolAPI._fetch_outspends_batched; no lock needed on one event loop."""
+        batch = self._open_batch
+        is_sender = batch is None
+        if is_sender:
+            batch = self._open_batch = _AsyncOutspendsBatch()
+        batch.txids.append(txid)
+        if len(batch.txids) >= self.sync_api.bulk_size:
+            self._open_batch = None
+            batch.full.set()
+
+        if not is_sender:
+            await batch.done.wait()
+            return batch.results.get(txid)
+
+        try:
+            waited = await self.rate_limiter.acquire_async()
+            if waited < self.sync_api.bulk_window:
+                try:
+                    await asyncio.wait_for(batch.full.wait(), self.sync_api.bulk_window - waited)
+                except asyncio.TimeoutError:
+                    pass
+            if self._open_batch is batch:
+                self._open_batch = None
+            if len(batch.txids) > 1:
+                batch.results = await self._fetch_outspends_bulk(batch.txids, prepaid_wait=waited) or {}
+            else:
+                data = await self._get_json(f"{self.base_url}/tx/{txid}/outspends", "outspends", "outspends",
+                                            prepaid_wait=waited)
+                return {} if data is None else _parse_outspends(data)
+        finally:
+            if self._open_batch is batch:
+                self._open_batch = None # Cancelled while still open
+            batch.done.set()
+        return batch.results.get(txid)
+
+    async def _fetch_outspends_bulk(self, txids, prepaid_wait=None):
+        data = await self._get_json(f"{self.base_url}/txs/outspends?txids={','.join(txids)}",
+                                    f"outspends of {len(txids)} txs", "outspends_bulk", optional_route=True,
+                                    prepaid_wait=prepaid_wait)
+        results = None if data is None or data is ROUTE_MISSING else _parse_bulk_outspends(txids, data)
+        if data is ROUTE_MISSING or (data is not None and results is None):
+            self.sync_api._disable_bulk_outspends()
+        elif results:
+            self.stats.inc("bulk_outspends_txids", len(txids))
+        return results
+
+    async def _get_json(self, url, what, endpoint, optional_route=False, prepaid_wait=None):
+        """Same retry/throttle policy and metrics as MempoolAPI._get_json."""
+        for attempt in range(self.max_retries + 1):
+            if attempt == 0 and prepaid_wait is not None:
+                waited = prepaid_wait
+            else:
+                waited = await self.rate_limiter.acquire_async()
+            self.stats.observe("rate_limit_wait_seconds", waited)
+            try:
+                async with self._semaphore:
+                    self.stats.inc("http_requests", endpoint=endpoint)
+                    started = time.perf_counter() # Timed inside the semaphore so queueing isn't counted as latency
+                    async with self._session.get(url) as resp:
+                        status = resp.status
+                        retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+                        data = await resp.json(content_type=None) if status == 200 else None
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                self.stats.inc("http_errors", endpoint=endpoint)
+                print(f"[ERROR] Failed to fetch {what} from {url} (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(min(2 ** attempt, 30))
+                continue
+            self.stats.observe("http_request_seconds", time.perf_counter() - started, endpoint=endpoint)
+            self.stats.inc("http_responses", endpoint=endpoint, status=status)
+
+            if status == 200:
+                self.rate_limiter.on_success()
+                return data
+            if status in THROTTLE_STATUS_CODES:
+                self.rate_limiter.on_throttled(retry_after if retry_after is not None else min(2 ** attempt, 30))
+                print(f"[WARN] Throttled ({status}) on {url}; now at {self.rate_limiter.rate:.2f} req/s")
+                continue
+            if status >= 500:
+                await asyncio.sleep(min(2 ** attempt, 30))
+                continue
+            if optional_route and status in ROUTE_MISSING_STATUS_CODES:
+                return ROUTE_MISSING
+            print(f"[ERROR] Status {status} for {url} while fetching {what}.")
+            return None
+        print(f"[ERROR] Giving up on {url} after {self.max_retries + 1} attempts.")
+        return None
+
+class AsyncTracer:
+    """Runs UTXOGraph's spend-chain traversal on one asyncio event loop.
+
+    Every (txid, vout) becomes a task in a single TaskGroup, so the trace is
+    complete exactly when the group exits; concurrency is bounded by the
+    request semaphore rather than by a thread count. Graph bookkeeping goes
+    through the same UTXOGraph helpers the thread engine uses, and
+    graph.cancel_token is checked before every fetch and spawn.
+    """
+
+    def __init__(self, graph, max_concurrency=200):
+        self.graph = graph
+        self.max_concurrency = max_concurrency
+        self.api = None
+        self._task_group = None
+        self._live_tasks = 0 # Spawned and not finished; capped by graph.max_queued
+
+    async def trace(self, initial_txid, initial_vout):
+        await self._run([self._process_utxo(initial_txid, initial_vout, 0)])
+
+    async def refresh(self, unspent, leaves, failed, pending):
+        """Async side of UTXOGraph.refresh_frontier (same arguments it collects)."""
+        await self._run([self._recheck_unspent(entry) for entry in unspent]
+                        + [self._expand_spent_utxo(node, spending_txid) for node, spending_txid in leaves]
+                        + [self._process_utxo(txid, vout, depth) for txid, vout, depth in failed]
+                        + [self._resume_pending(pending)])
+
+    async def _run(self, coroutines):
+        async with AsyncMempoolAPI(self.graph.api, max_concurrency=self.max_concurrency) as api:
+            self.api = api
+            async with asyncio.TaskGroup() as task_group:
+                self._task_group = task_group
+                for coroutine in coroutines:
+                    self._spawn(coroutine)
+
+    def run_sync(self, initial_txid, initial_vout):
+        """Blocking wrapper: runs the whole trace, then sets graph.trace_done."""
+        self._run_sync(self.trace(initial_txid, initial_vout))
+
+    def run_refresh_sync(self, unspent, leaves, failed, pending):
+        self._run_sync(self.refresh(unspent, leaves, failed, pending))
+
+    def _run_sync(self, coroutine):
+        try:
+            asyncio.run(coroutine)
+        except Exception as e:
+            print(f"[ERROR] Async trace failed: {e}")
+        finally:
+            self.graph._finish_trace()
+
+    def _spawn(self, coroutine):
+        self._live_tasks += 1
+        self._task_group.create_task(self._guarded(coroutine))
+
+    async def _spawn_or_run(self, coroutine):
+        """Spawn coroutine as its own task, or run it right here once max_queued tasks are alive
+        (caller-runs backpressure, so the number of pending tasks stays bounded)."""
+        if self._live_tasks >= self.graph.max_queued:
+            self.graph.stats.inc("caller_runs")
+            self._live_tasks += 1
+            await self._guarded(coroutine)
+        else:
+            self._spawn(coroutine)
+
+    async def _guarded(self, coroutine):
+        try:
+            await coroutine
+        except TraceCancelled:
+            pass
+        except Exception as e: # One bad branch must not cancel the whole task group
+            print(f"[ERROR] in async worker: {e}")
+        finally:
+            self._live_tasks -= 1
+
+    def _stop_if_cancelled(self, node=None):
+        """Raise TraceCancelled if the trace was cancelled, leaving `node` in failed_utxos for a later refresh."""
+        if self.graph.cancel_token.cancelled:
+            if node is not None: self.graph._record_failed(node)
+            raise TraceCancelled(self.graph.cancel_token.reason)
+
+    async def _process_utxo(self, txid, vout, depth, node=None):
+        # node is set when the parent already claimed this output in graph._record_children
+        graph = self.graph
+        if graph.cancel_token.cancelled:
+            if node is None: graph._record_unstarted(txid, vout, depth)
+            else: graph._record_failed(node)
+            return
+        if node is None:
+            node = graph._claim_utxo(txid, vout, depth)
+            if node is None:
+                return
+
+        graph.queue_ui_update('status_message', {'message': f"Fetching {txid[:8]}:{vout} (D:{depth})"})
+        self._stop_if_cancelled(node)
+        tx_details = await self.api.get_transaction_details(txid)
+        if not tx_details:
+            graph._record_failed(node)
+            graph.queue_ui_update('status_message', {'message': f"Error fetching {txid[:8]}"})
+            return
+
+        graph._record_utxo(node, tx_details)
+
+        self._stop_if_cancelled(node)
+        all_outspends_info = await self.api.get_spending_transactions(txid)
+        spending_txid = all_outspends_info.get(vout) if isinstance(all_outspends_info, dict) else None
+        if not spending_txid:
+            graph._record_unspent(node)
+            return
+
+        await self._expand_spent_utxo(node, spending_txid)
+
+    async def _expand_spent_utxo(self, node, spending_txid):
+        graph = self.graph
+        next_depth = graph.store.records[node].depth + 1
+        if next_depth > graph.max_depth:
+            graph._record_depth_limited(node, spending_txid)
+            return
+
+        graph.queue_ui_update('status_message', {'message': f"{graph.store.label(node)[:10]} spent by {spending_txid[:8]}..."})
+        self._stop_if_cancelled(node)
+        spender_tx_details = await self.api.get_transaction_details(spending_txid)
+        if not spender_tx_details:
+            graph._record_failed(node, spending_txid)
+            graph.queue_ui_update('status_message', {'message': f"Error spender {spending_txid[:8]}"})
+            return
+
+        if graph.frontier is None:
+            self._stop_if_cancelled(node)
+            children = graph._record_children(node, spending_txid, spender_tx_details, claim_depth=next_depth)
+            for new_vout, _, child in children:
+                await self._spawn_or_run(self._process_utxo(spending_txid, new_vout, next_depth, child))
+            return
+        children = graph._record_children(node, spending_txid, spender_tx_details)
+        graph._queue_children(spending_txid, children, next_depth)
+        self._dispatch_frontier()
+
+    def _dispatch_frontier(self):
+        """Best-first mode: start whatever the frontier allows. A running entry dispatches again when
+        it finishes, so queued entries never outlive the task group."""
+        ready, _ = self.graph._take_from_frontier()
+        for txid, vout, depth, _ in ready:
+            self._spawn(self._frontier_task(txid, vout, depth))
+
+    async def _frontier_task(self, txid, vout, depth):
+        try:
+            await self._process_utxo(txid, vout, depth)
+        finally:
+            self.graph.frontier.done()
+            self._dispatch_frontier()
+
+    async def _resume_pending(self, pending):
+        """Refresh: trace outputs a previous budget left queued."""
+        if self.graph.frontier is None:
+            for txid, vout, depth, _ in pending:
+                self._spawn(self._process_utxo(txid, vout, depth))
+            return
+        for entry in pending:
+            self.graph.frontier.push(*entry)
+        self._dispatch_frontier()
+
+    async def _recheck_unspent(self, entry):
+        self._stop_if_cancelled()
+        all_outspends_info = await self.api.get_spending_transactions(entry['txid'])
+        spending_txid = all_outspends_info.get(entry['vout']) if isinstance(all_outspends_info, dict) else None
+        if not spending_txid:
+            return # Still unspent
+        node = self.graph._mark_newly_spent(entry, spending_txid)
+        await self._expand_spent_utxo(node, spending_txid)
@@ -0,0 +1,142 @@
+"""Headless batch tracing of many seed UTXOs across a process pool.
+
+Usage:
+    python -m utxo_tracer.batch seeds.txt -o results.jsonl --processes 8
+
+The seeds file holds one `txid:vout` per line (blank lines and `#` comments
+are ignored). Each seed is traced in a worker process and its result is
+written as one JSON line as soon as it finishes. Workers share the SQLite
+tx/outspend cache, so a transaction fetched by one process is a local read
+for all the others.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from .api import MempoolAPI
+from .graph import UTXOGraph
+from .traversal import SCORERS, TraceBudget
+
+_graph = None # One UTXOGraph per worker process, created by _init_worker
+
+def read_seeds(path):
+    """Yield (txid, vout) pairs from a seeds file."""
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            txid, sep, vout = line.partition(":")
+            if not sep or len(txid) != 64 or not vout.isdigit():
+                print(f"[WARN] Skipping malformed seed on line {line_no}: {line!r}", file=sys.stderr)
+                continue
+            yield txid.lower(), int(vout)
+
+def _init_worker(config):
+    global _graph
+    sys.stdout = sys.stderr # Tracer progress prints must not end up in a JSONL stream on stdout
+    if config["blocks_dir"]:
+        from .blockfile import BlockFileAPI
+        api = BlockFileAPI(config["blocks_dir"], build_index=False) # Index is built once by the parent
+    else:
+        api = MempoolAPI(base_url=config["api_url"], cache=config["cache_path"],
+                         requests_per_second=config["requests_per_second"], max_connections=max(config["workers"], 10))
+    budget = TraceBudget(**config["budget"]) if any(v is not None for v in config["budget"].values()) else None
+    _graph = UTXOGraph(max_depth=config["max_depth"], max_workers=config["workers"], engine=config["engine"], api=api,
+                       priority=config["priority"], budget=budget)
+
+def _node_json(store, node):
+    txid, vout = store.outpoint(node)
+    record = store.records[node]
+    return {"txid": txid, "vout": vout, "value": record.value, "script_type": store.script_type(node),
+            "depth": record.depth, "spent_by": store.spent_by(node)}
+
+def _trace_seed(seed):
+    txid, vout = seed
+    started = time.time()
+    _graph.reset(clear_memo=False) # Memoized txs stay useful for the next seed in this process
+    _graph.trace_utxo(txid, vout)
+    _graph.wait_for_trace()
+    store = _graph.store
+    with _graph.graph_lock:
+        return {
+            "seed": f"{txid}:{vout}",
+            "nodes": [_node_json(store, node) for node in range(len(store))],
+            "edges": list(store.edges()), # Pairs of indexes into "nodes"
+            "unspent": list(_graph.unspent_utxos_found),
+            "stats": {
+                "utxos_visited": store.visited_count(),
+                "nodes": len(store),
+                "edges": store.num_edges(),
+                "unspent": len(_graph.unspent_utxos_found),
+                "depth_limited": len(_graph.depth_limited_utxos),
+                "failed": len(_graph.failed_utxos),
+                "queued": len(_graph.queued_utxos),
+                "seconds": round(time.time() - started, 3),
+                "pid": os.getpid(),
+            },
+        }
+
+def run_batch(seeds, output, processes=None, max_depth=10, workers=5, cache_path="utxo_cache.sqlite",
+              requests_per_second=5.0, engine="threads", blocks_dir=None, api_url="https://mempool.space/api",
+              priority=None, max_requests=None, max_nodes=None, max_seconds=None, min_value=None):
+    """Trace every seed and write one JSON line per seed to the `output` file object.
+    requests_per_second is the total budget, split evenly across processes; the
+    max_*/min_value trace budget applies to each seed on its own."""
+    processes = processes or os.cpu_count() or 1
+    if blocks_dir:
+        from .blockfile import BlockFileAPI
+        BlockFileAPI(blocks_dir).close() # Build or update the index before forking
+    config = {
+        "max_depth": max_depth, "workers": workers, "cache_path": cache_path, "engine": engine,
+        "requests_per_second": requests_per_second / processes, "blocks_dir": blocks_dir, "api_url": api_url,
+        "priority": priority, "budget": {"max_requests": max_requests, "max_nodes": max_nodes,
+                                         "max_wall_time": max_seconds, "min_value": min_value},
+    }
+    done = 0
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(config,)) as pool:
+        for result in pool.imap_unordered(_trace_seed, seeds):
+            output.write(json.dumps(result) + "\n")
+            output.flush() # Consumers can read results while the batch is still running
+            done += 1
+            stats = result["stats"]
+            print(f"[{done}] {result['seed']}: {stats['nodes']} nodes, {stats['unspent']} unspent "
+                  f"in {stats['seconds']}s", file=sys.stderr)
+    return done
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trace many seed UTXOs headlessly and stream results to JSONL.")
+    parser.add_argument("seeds", help="file with one txid:vout per line")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("-p", "--processes", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--max-depth", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=5, help="tracing threads per process")
+    parser.add_argument("--cache", default="utxo_cache.sqlite", help="SQLite cache shared by all processes")
+    parser.add_argument("--requests-per-second", type=float, default=5.0, help="total API request budget")
+    parser.add_argument("--engine", choices=("threads", "async"), default="threads")
+    parser.add_argument("--api-url", default="https://mempool.space/api", help="mempool.space-compatible API")
+    parser.add_argument("--blocks-dir", default=None, help="trace offline from Bitcoin Core blk*.dat files")
+    parser.add_argument("--priority", choices=tuple(SCORERS), default=None, help="trace best-first in this order")
+    parser.add_argument("--max-requests", type=int, default=None, help="per-seed budget: HTTP requests")
+    parser.add_argument("--max-nodes", type=int, default=None, help="per-seed budget: graph nodes")
+    parser.add_argument("--max-seconds", type=float, default=None, help="per-seed budget: wall time")
+    parser.add_argument("--min-value", type=int, default=None, help="don't trace outputs below this many sats")
+    args = parser.parse_args(argv)
+
+    seeds = list(read_seeds(args.seeds))
+    print(f"Tracing {len(seeds)} seed(s)...", file=sys.stderr)
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        run_batch(seeds, output, processes=args.processes, max_depth=args.max_depth, workers=args.workers,
+                  cache_path=args.cache, requests_per_second=args.requests_per_second, engine=args.engine,
+                  blocks_dir=args.blocks_dir, api_url=args.api_url, priority=args.priority,
+                  max_requests=args.max_requests, max_nodes=args.max_nodes, max_seconds=args.max_seconds,
+                  min_value=args.min_value)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+import glob
+import hashlib
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+from .api import MempoolAPI
+
+MAINNET_MAGIC = bytes.fromhex("f9beb4d9")
+NULL_TXID = "00" * 32
+
+def _dsha256(data):
+    return hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+def block_work(bits):
+    """Expected number of hashes for a block with compact target `bits`, as Core's GetBlockProof."""
+    exponent, mantissa = bits >> 24, bits & 0x007fffff
+    target = mantissa << 8 * (exponent - 3) if exponent > 3 else mantissa >> 8 * (3 - exponent)
+    return (1 << 256) // (target + 1) if target > 0 else 0
+
+def read_varint(buf, pos):
+    """Read a Bitcoin CompactSize integer; returns (value, new_pos)."""
+    first = buf[pos]
+    if first < 0xfd:
+        return first, pos + 1
+    if first == 0xfd:
+        return struct.unpack_from("<H", buf, pos + 1)[0], pos + 3
+    if first == 0xfe:
+        return struct.unpack_from("<I", buf, pos + 1)[0], pos + 5
+    return struct.unpack_from("<Q", buf, pos + 1)[0], pos + 9
+
+def script_type(script):
+    """Classify a scriptPubKey using the same names as the mempool.space API."""
+    n = len(script)
+    if n == 25 and script[:3] == b"\x76\xa9\x14" and script[23:] == b"\x88\xac":
+        return "p2pkh"
+    if n == 23 and script[:2] == b"\xa9\x14" and script[22] == 0x87:
+        return "p2sh"
+    if n == 22 and script[:2] == b"\x00\x14":
+        return "v0_p2wpkh"
+    if n == 34 and script[:2] == b"\x00\x20":
+        return "v0_p2wsh"
+    if n == 34 and script[:2] == b"\x51\x20":
+        return "v1_p2tr"
+    if (n == 35 and script[0] == 0x21 or n == 67 and script[0] == 0x41) and script[-1] == 0xac:
+        return "p2pk"
+    if n and script[0] == 0x6a:
+        return "op_return"
+    if n and script[-1] == 0xae and 0x51 <= script[0] <= 0x60:
+        return "multisig"
+    return "unknown"
+
+def parse_tx(buf, pos):
+    """Parse one serialized transaction starting at `pos`.
+
+    Returns (txid, inputs, outputs, end_pos) where inputs are (prev_txid, prev_vout, sequence)
+    and outputs are (value_sats, script_bytes). Handles segwit serialization.
+    """
+    start = pos
+    pos += 4 # version
+    segwit = buf[pos] == 0 and buf[pos + 1] != 0
+    if segwit:
+        pos += 2 # marker + flag
+    body_start = pos
+
+    n_in, pos = read_varint(buf, pos)
+    inputs = []
+    for _ in range(n_in):
+        prev_txid = bytes(buf[pos:pos + 32])[::-1].hex()
+        prev_vout = struct.unpack_from("<I", buf, pos + 32)[0]
+        script_len, pos = read_varint(buf, pos + 36)
+        pos += script_len
+        sequence = struct.unpack_from("<I", buf, pos)[0]
+        pos += 4
+        inputs.append((prev_txid, prev_vout, sequence))
+
+    n_out, pos = read_varint(buf, pos)
+    outputs = []
+    for _ in range(n_out):
+        value = struct.unpack_from("<q", buf, pos)[0]
+        script_len, pos = read_varint(buf, pos + 8)
+        outputs.append((value, bytes(buf[pos:pos + script_len])))
+        pos += script_len
+    body_end = pos
+
+    if segwit:
+        for _ in range(n_in):
+            n_items, pos = read_varint(buf, pos)
+            for _ in range(n_items):
+                item_len, pos = read_varint(buf, pos)
+                pos += item_len
+    locktime_pos = pos
+    pos += 4
+
+    if segwit: # txid commits to the serialization without marker, flag and witnesses
+        stripped = bytes(buf[start:start + 4]) + bytes(buf[body_start:body_end]) + bytes(buf[locktime_pos:pos])
+    else:
+        stripped = bytes(buf[start:pos])
+    return _dsha256(stripped)[::-1].hex(), inputs, outputs, pos
+
+class BlockFileAPI:
+    """Offline backend with the same interface as MempoolAPI, reading Bitcoin Core blk*.dat files.
+
+    Blocks are parsed from memory-mapped files and indexed once into SQLite:
+    txid -> (file, offset) and outpoint -> spending txid. Only blocks on the
+    best chain found in the files count (most cumulative work from nBits, ties
+    going to the tip stored first, like Core); stale blocks are indexed but
+    ignored. Call update_index() again after Core has written more blocks.
+    """
+
+    def __init__(self, blocks_dir, index_path=None, magic=MAINNET_MAGIC, build_index=True):
+        self.blocks_dir = blocks_dir
+        self.magic = magic
+        self.index_path = index_path or os.path.join(blocks_dir, "utxo_tracer_index.sqlite")
+        self._xor_key = self._load_xor_key()
+        self._maps = {} # file name -> (file object, mmap)
+        self._retired_maps = [] # (file object, mmap) of files that grew; closed in close()
+        self._maps_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, indexed_size INTEGER NOT NULL);
+                CREATE TABLE IF NOT EXISTS blocks (hash TEXT PRIMARY KEY, prev_hash TEXT NOT NULL,
+                    height INTEGER, main_chain INTEGER NOT NULL DEFAULT 0, bits INTEGER, file TEXT, offset INTEGER);
+                CREATE TABLE IF NOT EXISTS txs (txid TEXT NOT NULL, block_hash TEXT NOT NULL, file TEXT NOT NULL,
+                    offset INTEGER NOT NULL, n_out INTEGER NOT NULL, PRIMARY KEY (txid, block_hash));
+                CREATE TABLE IF NOT EXISTS spends (prev_txid TEXT NOT NULL, prev_vout INTEGER NOT NULL,
+                    spending_txid TEXT NOT NULL, block_hash TEXT NOT NULL, PRIMARY KEY (prev_txid, prev_vout, block_hash));
+            """)
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(blocks)")]
+            if "bits" not in columns: # Index from before chainwork: re-read the files once to fill it in
+                for column in ("bits INTEGER", "file TEXT", "offset INTEGER"):
+                    self._conn.execute(f"ALTER TABLE blocks ADD COLUMN {column}")
+                self._conn.execute("DELETE FROM files")
+            self._conn.commit()
+        if build_index:
+            self.update_index()
+
+    # --- File access ---
+
+    def _load_xor_key(self):
+        """Bitcoin Core 28+ obfuscates block files with the 8-byte key in blocks/xor.dat."""
+        path = os.path.join(self.blocks_dir, "xor.dat")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                key = f.read()
+            if any(key):
+                return key
+        return None
+
+    def _map(self, name, min_size=0):
+        """The mmap of `name`, remapped if it is shorter than min_size. Only update_index() passes
+        min_size, so reads never stat the file. A superseded map stays open until close(): other
+        threads may still be slicing it."""
+        with self._maps_lock:
+            entry = self._maps.get(name)
+            if entry is None or len(entry[1]) < min_size:
+                if entry: self._retired_maps.append(entry)
+                f = open(os.path.join(self.blocks_dir, name), "rb")
+                entry = self._maps[name] = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            return entry[1]
+
+    def _read(self, name, offset, length):
+        data = self._map(name)[offset:offset + length]
+        if self._xor_key is None:
+            return data
+        key = self._xor_key
+        shift = offset % len(key)
+        stream = (key[shift:] + key[:shift]) * (len(data) // len(key) + 1)
+        return (int.from_bytes(data, "big") ^ int.from_bytes(stream[:len(data)], "big")).to_bytes(len(data), "big")
+
+    # --- Indexing ---
+
+    def update_index(self):
+        """Index every blk*.dat file that is new or has grown since the last call."""
+        with self._lock:
+            indexed = dict(self._conn.execute("SELECT name, indexed_size FROM files").fetchall())
+        for path in sorted(glob.glob(os.path.join(self.blocks_dir, "blk*.dat"))):
+            name = os.path.basename(path)
+            size = os.path.getsize(path)
+            if indexed.get(name, 0) < size:
+                self._map(name, min_size=size)
+                self._index_file(name, indexed.get(name, 0), size)
+        self._update_main_chain()
+
+    def _index_file(self, name, start, size):
+        print(f"[INFO] Indexing {name} from offset {start}...")
+        pos = start
+        blocks, txs, spends = [], [], []
+        while pos + 8 <= size:
+            header = self._read(name, pos, 8)
+            if header[:4] != self.magic:
+                break # Zero padding at the end of a preallocated file
+            block_size = struct.unpack_from("<I", header, 4)[0]
+            block_start = pos + 8
+            if block_start + block_size > size:
+                break # Block still being written; pick it up next time
+            block = self._read(name, block_start, block_size)
+            block_hash = _dsha256(block[:80])[::-1].hex()
+            prev_hash = bytes(block[4:36])[::-1].hex()
+            bits = struct.unpack_from("<I", block, 72)[0]
+            blocks.append((block_hash, prev_hash, bits, name, pos))
+
+            n_tx, tx_pos = read_varint(block, 80)
+            for _ in range(n_tx):
+                txid, inputs, outputs, tx_end = parse_tx(block, tx_pos)
+                txs.append((txid, block_hash, name, block_start + tx_pos, len(outputs)))
+                for prev_txid, prev_vout, _sequence in inputs:
+                    if prev_txid != NULL_TXID: # Coinbase inputs spend nothing
+                        spends.append((prev_txid, prev_vout, txid, block_hash))
+                tx_pos = tx_end
+            pos = block_start + block_size
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO blocks (hash, prev_hash, bits, file, offset) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (hash) DO UPDATE SET bits = excluded.bits, file = excluded.file, offset = excluded.offset "
+                "WHERE blocks.bits IS NULL", blocks) # The first copy of a block counts as when it was seen
+            self._conn.executemany("INSERT OR IGNORE INTO txs VALUES (?, ?, ?, ?, ?)", txs)
+            self._conn.executemany("INSERT OR IGNORE INTO spends VALUES (?, ?, ?, ?)", spends)
+            self._conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?)", (name, pos))
+            self._conn.commit()
+
+    def _update_main_chain(self):
+        """Assign heights by following prev_hash links and mark the chain with the most work as main.
+        Equal work goes to the tip stored first in the files, so the choice is the same on every rebuild."""
+        with self._lock:
+            rows = self._conn.execute("SELECT hash, prev_hash, bits, file, offset FROM blocks").fetchall()
+            prev_of = {block_hash: prev_hash for block_hash, prev_hash, *_ in rows}
+            work_of = {block_hash: block_work(bits or 0) for block_hash, _, bits, _, _ in rows}
+            seen = {block_hash: (name or "", offset or 0) for block_hash, _, _, name, offset in rows}
+            heights, chainwork = {}, {}
+            for block_hash in prev_of:
+                chain = []
+                cursor = block_hash
+                while cursor in prev_of and cursor not in heights:
+                    chain.append(cursor)
+                    cursor = prev_of[cursor]
+                height = heights.get(cursor, -1) # Unknown parent: genesis (or the first block we have)
+                work = chainwork.get(cursor, 0)
+                for h in reversed(chain):
+                    height += 1
+                    work += work_of[h]
+                    heights[h], chainwork[h] = height, work
+            main_chain = set()
+            cursor = min(heights, key=lambda h: (-chainwork[h], seen[h])) if heights else None
+            while cursor in prev_of:
+                main_chain.add(cursor)
+                cursor = prev_of[cursor]
+            self._conn.executemany("UPDATE blocks SET height = ?, main_chain = ? WHERE hash = ?",
+                                   [(heights[h], int(h in main_chain), h) for h in prev_of])
+            self._conn.commit()
+
+    # --- MempoolAPI interface ---
+
+    def get_transaction_details(self, txid):
+        """Get full transaction details in the mempool.space/Esplora JSON shape."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT t.file, t.offset, t.block_hash, b.height FROM txs t JOIN blocks b ON b.hash = t.block_hash "
+                "WHERE t.txid = ? AND b.main_chain = 1", (txid,)).fetchone()
+        if not row:
+            print(f"[ERROR] Transaction {txid} not found in block index.")
+            return None
+        name, offset, block_hash, height = row
+        # Read a generous window; a standard tx is far smaller than this, retry larger otherwise
+        window = 1 << 16
+        while True:
+            buf = self._read(name, offset, window)
+            try:
+                _txid, inputs, outputs, _end = parse_tx(buf, 0)
+                break
+            except (IndexError, struct.error):
+                if len(buf) < window:
+                    raise
+                window *= 4
+        return {
+            "txid": txid,
+            "vin": [{"txid": prev_txid, "vout": prev_vout, "sequence": sequence,
+                     "is_coinbase": prev_txid == NULL_TXID} for prev_txid, prev_vout, sequence in inputs],
+            "vout": [{"value": value, "scriptpubkey": script.hex(), "scriptpubkey_type": script_type(script)}
+                     for value, script in outputs],
+            "status": {"confirmed": True, "block_hash": block_hash, "block_height": height},
+        }
+
+    def get_spending_transactions(self, txid):
+        """Get outspend info for all outputs of a transaction."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT t.n_out FROM txs t JOIN blocks b ON b.hash = t.block_hash "
+                "WHERE t.txid = ? AND b.main_chain = 1", (txid,)).fetchone()
+            if not row:
+                return {}
+            spent = dict(self._conn.execute(
+                "SELECT s.prev_vout, s.spending_txid FROM spends s JOIN blocks b ON b.hash = s.block_hash "
+                "WHERE s.prev_txid = ? AND b.main_chain = 1", (txid,)).fetchall())
+        return {idx: spent.get(idx) for idx in range(row[0])}
+
+    def get_spending_transactions_bulk(self, txids):
+        """Same interface as MempoolAPI; local lookups gain nothing from batching."""
+        return {txid: self.get_spending_transactions(txid) for txid in dict.fromkeys(txids)}
+
+    # Output helpers only use get_transaction_details, so they are shared with MempoolAPI
+    get_outputs = MempoolAPI.get_outputs
+    get_scripttype = MempoolAPI.get_scripttype
+    get_input_position = MempoolAPI.get_input_position # Block files have no prevouts, so always (-1, -1)
+
+    def clear_memo(self):
+        pass # Nothing is memoized; the index is the source of truth
+
+    def invalidate_outspends(self, txid):
+        pass # Spends only change when new blocks are indexed with update_index()
+
+    def invalidate_outspends_many(self, txids):
+        pass
+
+    def close(self):
+        with self._maps_lock:
+            for f, mapped in [*self._maps.values(), *self._retired_maps]:
+                mapped.close(); f.close()
+            self._maps.clear()
+            self._retired_maps.clear()
+        with self._lock:
+            self._conn.close()
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 2:
+        print("Usage: python -m utxo_tracer.blockfile <bitcoin blocks dir>")
+        sys.exit(1)
+    BlockFileAPI(sys.argv[1]).close()
+    print("Index up to date.")
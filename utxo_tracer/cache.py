@@ -0,0 +1,87 @@
+import json
+import sqlite3
+import threading
+import time
+
+class TxCache:
+    """Persistent SQLite cache for transaction details and outspends.
+
+    Confirmed transactions never change, so they are kept forever. Outspend
+    lists are kept forever once they are final (every output spent by a
+    confirmed tx); lists with unspent outputs or mempool spenders, which can
+    still be replaced or dropped, are only trusted for `unspent_ttl` seconds.
+    """
+
+    def __init__(self, path="utxo_cache.sqlite", unspent_ttl=300):
+        self.path = path
+        self.unspent_ttl = unspent_ttl
+        self._lock = threading.Lock() # One connection shared by all worker threads
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL") # Lets other processes read while we write
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS transactions (txid TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(outspends)")]
+            if "all_spent" in columns: # Older caches kept mempool spenders forever; outspends are cheap to refetch
+                self._conn.execute("DROP TABLE outspends")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS outspends ("
+                "txid TEXT PRIMARY KEY, data TEXT NOT NULL, final INTEGER NOT NULL, fetched_at REAL NOT NULL)")
+            self._conn.commit()
+
+    def get_transaction(self, txid):
+        """Return cached tx details, or None if not cached."""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM transactions WHERE txid = ?", (txid,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_transaction(self, txid, tx_details):
+        """Store tx details, but only once the transaction is confirmed."""
+        self.put_many(transactions=[(txid, tx_details)])
+
+    def get_outspends(self, txid):
+        """Return cached {vout: spending_txid or None}, or None if missing or stale."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, final, fetched_at FROM outspends WHERE txid = ?", (txid,)).fetchone()
+        if not row:
+            return None
+        data, final, fetched_at = row
+        if not final and time.time() - fetched_at > self.unspent_ttl:
+            return None # Some output was unspent or spent in the mempool when fetched; it may have changed since
+        return {int(idx): spender for idx, spender in json.loads(data).items()}
+
+    def put_outspends(self, txid, outspends, final=False):
+        """Store an outspends mapping as returned by MempoolAPI.get_spending_transactions.
+        final=True (every spender confirmed) keeps it forever; see api.Outspends."""
+        self.put_many(outspends=[(txid, outspends, final)])
+
+    def put_many(self, transactions=(), outspends=()):
+        """put_transaction() for every (txid, tx_details) and put_outspends() for every
+        (txid, outspends, final), in one SQLite transaction: one commit instead of one per row."""
+        tx_rows = [(txid, json.dumps(tx_details)) for txid, tx_details in transactions
+                   if tx_details and tx_details.get("status", {}).get("confirmed")] # Unconfirmed txs can still be replaced or dropped
+        now = time.time()
+        outspend_rows = [(txid, json.dumps(spenders), int(final and all(spenders.values())), now)
+                         for txid, spenders, final in outspends if spenders]
+        if not tx_rows and not outspend_rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO transactions (txid, data) VALUES (?, ?)", tx_rows)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO outspends (txid, data, final, fetched_at) VALUES (?, ?, ?, ?)", outspend_rows)
+            self._conn.commit()
+
+    def invalidate_outspends(self, txid):
+        """Drop a cached outspends list unless it is final (every output spent by a confirmed tx)."""
+        self.invalidate_outspends_many([txid])
+
+    def invalidate_outspends_many(self, txids):
+        """invalidate_outspends() for every txid, with one commit."""
+        with self._lock:
+            self._conn.executemany("DELETE FROM outspends WHERE txid = ? AND final = 0", ((txid,) for txid in txids))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,32 @@
+import threading
+
+class TraceCancelled(Exception):
+    """Raised inside a worker when the trace it belongs to has been cancelled."""
+
+class CancelToken:
+    """One-shot cancellation flag shared by every task of a trace.
+
+    Workers call raise_if_cancelled() before each fetch and before submitting
+    children, so a cancelled trace drains in at most one in-flight request per worker.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason="cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise TraceCancelled(self.reason)
+
+    def wait(self, timeout=None):
+        """Sleep up to `timeout` seconds, waking early on cancel. Returns True if cancelled."""
+        return self._event.wait(timeout)
@@ -0,0 +1,100 @@
+"""Checkpoint and resume for long-running traces.
+
+A checkpoint is one JSON file with the whole UTXOStore plus the frontier lists
+of a UTXOGraph (unspent, depth-limited, failed and queued outputs). It is
+written atomically (temp file + rename), so a crash mid-write leaves the
+previous checkpoint intact. Resuming restores the graph and only traces what
+was not finished: outputs that were in flight or failed, children that were
+discovered but never traced, and queued best-first entries.
+"""
+import json
+import os
+import time
+from .store import UNKNOWN
+
+CHECKPOINT_VERSION = 1
+
+def save_checkpoint(graph, path):
+    """Write the state of `graph` to `path`. Returns the number of nodes saved."""
+    with graph.graph_lock:
+        state = graph.store.to_state()
+        node_of = {(entry['txid'], entry['vout']): graph.store.find(entry['txid'], entry['vout'])
+                   for entry in graph.unspent_utxos_found}
+        state.update({
+            "version": CHECKPOINT_VERSION,
+            "created": time.time(),
+            "seed": list(graph.seed) if graph.seed else None,
+            "max_depth": graph.max_depth,
+            "unspent": [node for node in node_of.values() if node is not None],
+            "depth_limited": [[node, spending_txid] for node, spending_txid in graph.depth_limited_utxos.items()],
+            "failed": sorted(graph.failed_utxos),
+            "queued": [list(entry) for entry in graph.queued_utxos],
+        })
+    state["stats"] = graph.stats.snapshot() # For the record; counters start fresh after a resume
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno()) # The rename below must never expose a half-written file
+    os.replace(tmp_path, path)
+    return len(state["nodes"])
+
+def load_checkpoint(graph, path, expected_seed=None):
+    """Replace the state of `graph` with the checkpoint at `path` and queue the unfinished work
+    for graph.resume_trace(). Returns False (leaving the graph untouched) if the file is missing,
+    unreadable or for a different seed."""
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[WARN] Could not read checkpoint {path}: {e}")
+        return False
+    if state.get("version") != CHECKPOINT_VERSION:
+        print(f"[WARN] Checkpoint {path} has version {state.get('version')}, expected {CHECKPOINT_VERSION}.")
+        return False
+    seed = tuple(state["seed"]) if state.get("seed") else None
+    if expected_seed is not None and seed != tuple(expected_seed):
+        print(f"[WARN] Checkpoint {path} is for {seed}, not {tuple(expected_seed)}; ignoring it.")
+        return False
+
+    graph.reset(clear_memo=False)
+    with graph.graph_lock:
+        store = graph.store
+        store.load_state(state)
+        graph.seed = seed
+        for node in state["unspent"]:
+            txid, vout = store.outpoint(node)
+            record = store.records[node]
+            graph.unspent_utxos_found.append({'txid': txid, 'vout': vout, 'script_type': store.script_type(node),
+                                              'value': record.value, 'depth': record.depth})
+        graph.depth_limited_utxos.update({node: spending_txid for node, spending_txid in state["depth_limited"]})
+        graph.failed_utxos.update(state["failed"])
+        graph.queued_utxos.extend(tuple(entry) for entry in state["queued"])
+
+        # Claimed but never settled: the worker was mid-fetch when the checkpoint was written
+        for node, record in enumerate(store.records):
+            if store.is_visited(node) and record.spent_by == UNKNOWN:
+                graph.failed_utxos.add(node)
+            elif record.spent_by >= 0 and node not in graph.depth_limited_utxos and not store.children(node):
+                # Spent, but fetching the spending tx failed: expand it like a depth-limited leaf,
+                # which refetches only the spender instead of the whole output
+                graph.failed_utxos.discard(node)
+                graph.depth_limited_utxos[node] = store.spent_by(node)
+        # Discovered but never traced: these were still waiting in the executor queue
+        queued = {(txid, vout) for txid, vout, _, _ in graph.queued_utxos}
+        for src, dst in store.edges():
+            if store.is_visited(dst) or store.outpoint(dst) in queued:
+                continue
+            record = store.records[dst]
+            if graph.budget and graph.budget.below_min_value(record.value):
+                continue
+            queued.add(store.outpoint(dst))
+            graph.queued_utxos.append((*store.outpoint(dst), store.records[src].depth + 1, record.value))
+        if seed and (store.find(*seed) is None or not store.is_visited(store.find(*seed))):
+            graph.queued_utxos.append((seed[0], seed[1], 0, -1)) # Died before the seed itself was traced
+        resumable = len(graph.failed_utxos) + len(graph.queued_utxos)
+
+    print(f"[INFO] Loaded checkpoint {path}: {len(store)} outputs, {store.num_edges()} edges, "
+          f"{resumable} to resume.")
+    return True
@@ -0,0 +1,215 @@
+"""Streaming exporters for traced graphs.
+
+Attach one or more exporters with UTXOGraph.add_exporter() and every output is
+written as soon as its state is settled (spent, unspent or failed), and every
+edge as soon as it is discovered, so memory stays flat and consumers can read
+the files while the trace is still running. Node records carry the full
+outpoint; an output can be written again by a later refresh (e.g. unspent ->
+spent), in which case the last record wins. GraphML holds its node elements
+until close(), since the format allows only one per output.
+
+Node record: txid, vout, value_sats, script_type, depth, spent_by, status
+Edge record: src_txid, src_vout, dst_txid, dst_vout, value_sats
+"""
+import csv
+import json
+import threading
+import time
+from xml.sax.saxutils import quoteattr, escape
+
+NODE_FIELDS = ("txid", "vout", "value_sats", "script_type", "depth", "spent_by", "status")
+EDGE_FIELDS = ("src_txid", "src_vout", "dst_txid", "dst_vout", "value_sats")
+
+class GraphExporter:
+    """Base class: thread-safe write_node/write_edge with periodic flushing.
+    Subclasses implement _write_node, _write_edge, _flush and _close."""
+
+    def __init__(self, flush_interval=1.0):
+        self.flush_interval = flush_interval # Seconds between flushes, so readers see progress
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.closed = False
+
+    def write_node(self, node, record):
+        """`node` is the store's node id, `record` a dict with NODE_FIELDS."""
+        with self._lock:
+            if self.closed: return
+            self._write_node(node, record)
+            self._maybe_flush()
+
+    def write_edge(self, record):
+        with self._lock:
+            if self.closed: return
+            self._write_edge(record)
+            self._maybe_flush()
+
+    def flush(self):
+        with self._lock:
+            if not self.closed:
+                self._flush()
+                self._last_flush = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if not self.closed:
+                self._close()
+                self.closed = True
+
+    def _maybe_flush(self):
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self._flush()
+            self._last_flush = now
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class JSONLinesExporter(GraphExporter):
+    """One JSON object per line, tagged "type": "node" or "edge"."""
+
+    def __init__(self, path, flush_interval=1.0):
+        super().__init__(flush_interval)
+        self._file = open(path, "w")
+
+    def _write_node(self, node, record):
+        self._file.write(json.dumps({"type": "node", **record}) + "\n")
+
+    def _write_edge(self, record):
+        self._file.write(json.dumps({"type": "edge", **record}) + "\n")
+
+    def _flush(self):
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+class GraphMLExporter(GraphExporter):
+    """Streams <edge> elements and writes the <node> elements and closing tags on close().
+
+    GraphML allows one element per node id, and an output's status can still change
+    (unspent -> spent on a refresh), so the last element of each output is kept in a
+    dict keyed by its id, "txid:vout", until close(). Store node ids aren't used as
+    keys: reset() hands them out again for other outputs.
+    """
+
+    def __init__(self, path, flush_interval=1.0):
+        super().__init__(flush_interval)
+        self._file = open(path, "w", encoding="utf-8")
+        self._nodes = {} # "txid:vout" -> latest <node> element
+        keys = [("value_sats", "node", "long"), ("script_type", "node", "string"), ("depth", "node", "int"),
+                ("spent_by", "node", "string"), ("status", "node", "string"), ("value_sats", "edge", "long")]
+        self._file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                         '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        for name, domain, kind in keys:
+            self._file.write(f'  <key id="{domain[0]}_{name}" for="{domain}" attr.name="{name}" attr.type="{kind}"/>\n')
+        self._file.write('  <graph id="utxo" edgedefault="directed">\n')
+
+    def _write_node(self, node, record):
+        data = "".join(f'<data key="n_{name}">{escape(str(record[name]))}</data>'
+                       for name in ("value_sats", "script_type", "depth", "spent_by", "status")
+                       if record[name] is not None)
+        node_id = f"{record['txid']}:{record['vout']}"
+        self._nodes[node_id] = f'    <node id={quoteattr(node_id)}>{data}</node>\n'
+
+    def _write_edge(self, record):
+        src = quoteattr(f"{record['src_txid']}:{record['src_vout']}")
+        dst = quoteattr(f"{record['dst_txid']}:{record['dst_vout']}")
+        self._file.write(f'    <edge source={src} target={dst}><data key="e_value_sats">{record["value_sats"]}</data></edge>\n')
+
+    def _flush(self):
+        self._file.flush()
+
+    def _close(self):
+        self._file.writelines(self._nodes.values())
+        self._nodes = {}
+        self._file.write("  </graph>\n</graphml>\n")
+        self._file.close()
+
+class ColumnarExporter(GraphExporter):
+    """Flat node and edge tables: `<prefix>_nodes.<fmt>` and `<prefix>_edges.<fmt>`.
+
+    fmt is "csv" or "parquet" (needs pyarrow). Parquet rows are buffered and written
+    as one row group every `batch_size` rows.
+    """
+
+    def __init__(self, prefix, fmt="csv", batch_size=10000, flush_interval=1.0):
+        super().__init__(flush_interval)
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.node_path = f"{prefix}_nodes.{fmt}"
+        self.edge_path = f"{prefix}_edges.{fmt}"
+        if fmt == "csv":
+            self._files = [open(self.node_path, "w", newline=""), open(self.edge_path, "w", newline="")]
+            self._node_writer = csv.writer(self._files[0])
+            self._edge_writer = csv.writer(self._files[1])
+            self._node_writer.writerow(NODE_FIELDS)
+            self._edge_writer.writerow(EDGE_FIELDS)
+        elif fmt == "parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as e:
+                raise ImportError(f"Parquet export needs pyarrow (pip install pyarrow): {e}") from e
+            self._pa = pa
+            node_schema = pa.schema([("txid", pa.string()), ("vout", pa.int32()), ("value_sats", pa.int64()),
+                                     ("script_type", pa.string()), ("depth", pa.int32()),
+                                     ("spent_by", pa.string()), ("status", pa.string())])
+            edge_schema = pa.schema([("src_txid", pa.string()), ("src_vout", pa.int32()), ("dst_txid", pa.string()),
+                                     ("dst_vout", pa.int32()), ("value_sats", pa.int64())])
+            self._writers = [pq.ParquetWriter(self.node_path, node_schema), pq.ParquetWriter(self.edge_path, edge_schema)]
+            self._buffers = [[], []] # Pending node rows, pending edge rows
+        else:
+            raise ValueError(f"Unknown columnar format {fmt!r}; use 'csv' or 'parquet'")
+
+    def _write_node(self, node, record):
+        if self.fmt == "csv":
+            self._node_writer.writerow([record[name] for name in NODE_FIELDS])
+        else:
+            self._buffer_row(0, record)
+
+    def _write_edge(self, record):
+        if self.fmt == "csv":
+            self._edge_writer.writerow([record[name] for name in EDGE_FIELDS])
+        else:
+            self._buffer_row(1, record)
+
+    def _buffer_row(self, table, record):
+        self._buffers[table].append(record)
+        if len(self._buffers[table]) >= self.batch_size:
+            self._write_batch(table)
+
+    def _write_batch(self, table):
+        rows = self._buffers[table]
+        if rows:
+            writer = self._writers[table]
+            writer.write_table(self._pa.Table.from_pylist(rows, schema=writer.schema))
+            self._buffers[table] = []
+
+    def _flush(self):
+        if self.fmt == "csv":
+            for f in self._files: f.flush()
+        # Parquet only becomes readable on close; row groups are written every batch_size rows
+
+    def _close(self):
+        if self.fmt == "csv":
+            for f in self._files: f.close()
+        else:
+            for table, writer in enumerate(self._writers):
+                self._write_batch(table)
+                writer.close()
+
+def open_exporter(path, **kwargs):
+    """Pick an exporter from the file extension: .jsonl, .graphml, .csv or .parquet.
+    For the columnar formats the extension is replaced by _nodes/_edges files."""
+    lower = path.lower()
+    if lower.endswith((".jsonl", ".ndjson")):
+        return JSONLinesExporter(path, **kwargs)
+    if lower.endswith(".graphml"):
+        return GraphMLExporter(path, **kwargs)
+    for fmt in ("csv", "parquet"):
+        if lower.endswith("." + fmt):
+            return ColumnarExporter(path[:-len(fmt) - 1], fmt=fmt, **kwargs)
+    raise ValueError(f"Can't tell the export format of {path!r}; use .jsonl, .graphml, .csv or .parquet")
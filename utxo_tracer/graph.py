@@ -1,63 +1,217 @@
-import networkx as nx
-import matplotlib.pyplot as plt
-import matplotlib.cm as cm
-import random
-from collections import deque # Still useful for the UI update queue
+import queue
 import threading # Import threading
+import time
 from concurrent.futures import ThreadPoolExecutor # Import ThreadPoolExecutor
 from .api import MempoolAPI
+from .cancel import CancelToken, TraceCancelled
+from . import checkpoint
+from .metrics import TimedLock, TraceProfiler, TraceStats
+from .traversal import PriorityFrontier, resolve_scorer
+from .store import UTXOStore
 
 class UTXOGraph:
-    def __init__(self, max_depth=10, sleep_time=0.2, max_workers=5): # Added max_workers
-        self.api = MempoolAPI(sleep_time=sleep_time)
-        self.graph = nx.DiGraph()
-        self.visited = set()
-        self.depths = {}
+    def __init__(self, max_depth=10, sleep_time=0.2, max_workers=5, cache_path=None,
+                 requests_per_second=None, engine="threads", max_concurrency=200, api=None,
+                 max_fps=4, priority=None, budget=None, max_queued=10000,
+                 checkpoint_path=None, checkpoint_interval=60):
+        # cache_path enables the persistent tx/outspend cache shared across refreshes and runs
+        # requests_per_second caps the total request rate of all workers (defaults to 1/sleep_time)
+        # api lets callers plug in another backend with the MempoolAPI interface (e.g. blockfile.BlockFileAPI)
+        # priority ("value", "depth", "value_per_hop" or a callable(value_sats, depth)) and/or budget
+        # (traversal.TraceBudget) switch to best-first tracing with at most max_workers outputs in flight
+        # max_queued bounds the tasks waiting for a worker; past it, workers run new children themselves
+        # checkpoint_path: save the graph there every checkpoint_interval seconds while tracing (see checkpoint.py)
+        self.api = api or MempoolAPI(sleep_time=sleep_time, cache=cache_path, requests_per_second=requests_per_second,
+                                     max_connections=max(max_workers, 10))
+        self.store = UTXOStore() # Traced outputs and spend edges, keyed by interned outpoint
         self.max_depth = max_depth
 
-        self.active_fig = None
-        self.active_ax = None
-        self._current_pos_cache = {}
-
-        self._dragged_node = None
-        self.node_artist_collection = None
-        self._node_list_for_drawing = []
+        # Plotting lives in view.GraphView, imported only when a drawing surface is attached
+        self.view = None
+        self.max_fps = max_fps # Upper bound on redraws per second; updates in between are merged
 
         self.is_tracing = False # Overall tracing state (set by main.py)
         self.status_message = "Ready"
+        self.seed = None # (txid, vout) of the last trace_utxo()
         self.unspent_utxos_found = []
+        # Frontier kept between refreshes so refresh_frontier() only re-checks what can change
+        self.depth_limited_utxos = {} # node id -> spending txid, for outputs spent but not expanded
+        self.failed_utxos = set() # node ids of outputs whose fetch failed
+        self.queued_utxos = [] # (txid, vout, depth, value) queued but never traced: budget ran out or trace cancelled
+
+        # --- Best-first traversal ---
+        self.priority = priority
+        self.budget = budget
+        if priority is not None: resolve_scorer(priority) # Fail early on a typo
+        self.frontier = None # PriorityFrontier of the running trace; None traces every output right away
 
         # --- Threading specific attributes ---
-        self.graph_lock = threading.Lock()
+        self.graph_lock = TimedLock() # A threading.Lock that also records how long workers wait for it
+        self.max_workers = max_workers
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
         self._active_tasks_count = 0
         self._active_tasks_lock = threading.Lock()
-        self.ui_update_queue = deque() # For worker threads to request UI updates
+        self.max_queued = max_queued
+        self._queued_tasks = 0 # Submitted but not yet picked up by a worker thread
+        self._worker_state = threading.local() # .inside is True on executor threads while they run a task
+        self.cancel_token = CancelToken() # Replaced at the start of every trace
+        self.ui_update_queue = queue.SimpleQueue() # Worker threads -> main thread UI updates; needs no graph_lock
+
+        # --- Engine selection ---
+        self.engine = engine # "threads" or "async"
+        self.max_concurrency = max_concurrency # Concurrent requests for the async engine
+        self.trace_done = threading.Event() # Set whenever no trace is running
+        self.trace_done.set()
+
+        # --- Metrics ---
+        # Shared with the API backend when it has its own stats, so one object covers requests and graph work
+        self.stats = getattr(self.api, "stats", None) or TraceStats()
+        self.stats.register_lock("graph_lock", self.graph_lock)
+        self.stats.register_gauge("nodes", lambda: len(self.store))
+        self.stats.register_gauge("edges", lambda: self.store.num_edges())
+        self.stats.register_gauge("active_tasks", self.get_active_tasks_count)
+        self.stats.register_gauge("executor_queue_depth", lambda: self._queued_tasks)
+        self._profile_path = None # Set by profile_next_trace()
+        self._profiler = None
+
+        # --- Streaming export ---
+        self.exporters = [] # export.GraphExporter instances fed as outputs settle and edges appear
+
+        # --- Checkpointing ---
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self._checkpoint_lock = threading.Lock() # One writer at a time: the periodic loop, shutdown() and callers
 
     def _increment_active_tasks(self):
         with self._active_tasks_lock:
             self._active_tasks_count += 1
+            self.trace_done.clear()
 
     def _decrement_active_tasks(self):
         with self._active_tasks_lock:
             self._active_tasks_count -= 1
+            if self._active_tasks_count != 0:
+                return
+        self._finish_trace() # Outside the lock: every finishing worker takes it, and this does disk I/O
+
+    def _begin_trace(self):
+        self.trace_done.clear()
+        self.cancel_token = CancelToken()
+        self.stats.start_trace()
+        if self.priority is not None or self.budget is not None:
+            # Few entries in flight keeps the order meaningful and budget overshoot small, for both engines
+            self.frontier = PriorityFrontier(resolve_scorer(self.priority or "depth"), self.max_workers)
+            if self.budget: self.budget.start(self.stats)
+        else:
+            self.frontier = None
+        if self._profile_path:
+            self._profiler = TraceProfiler(self._profile_path)
+            self._profile_path = None
+            self._profiler.start()
+        if self.checkpoint_path:
+            threading.Thread(target=self._checkpoint_loop, args=(self.cancel_token,), daemon=True).start()
+
+    def _finish_trace(self):
+        self.stats.finish_trace()
+        for exporter in self.exporters:
+            exporter.flush() # Whatever this trace found is on disk by the time trace_done is set
+        with self._active_tasks_lock:
+            if self._active_tasks_count == 0: # Unless a new trace started while we were flushing
+                self.trace_done.set()
+
+    def profile_next_trace(self, path="trace.prof"):
+        """Run the next trace_utxo()/refresh_frontier() under cProfile and write the stats to `path`."""
+        self._profile_path = path
+
+    def _stop_profiler(self):
+        with self._active_tasks_lock:
+            profiler, self._profiler = self._profiler, None
+        if profiler: profiler.stop()
+
+    def save_checkpoint(self, path=None):
+        """Write the graph and frontier to `path` (default checkpoint_path). Safe while a trace runs."""
+        path = path or self.checkpoint_path
+        start = time.perf_counter()
+        with self._checkpoint_lock:
+            saved = checkpoint.save_checkpoint(self, path)
+        self.stats.observe("checkpoint_seconds", time.perf_counter() - start)
+        return saved
+
+    def load_checkpoint(self, path=None, expected_seed=None):
+        """Replace the graph with a saved checkpoint; call resume_trace() to finish the work it left.
+        Only call this while no trace is running. Returns False if there was nothing usable to load."""
+        return checkpoint.load_checkpoint(self, path or self.checkpoint_path, expected_seed)
+
+    def resume_trace(self, engine=None):
+        """Continue a loaded checkpoint: trace what was in flight, failed or queued, without
+        re-checking outputs that were already settled. Returns the number of entries resumed."""
+        return self.refresh_frontier(engine, recheck_unspent=False)
+
+    def _checkpoint_loop(self, token):
+        # One loop per trace; it stops once a newer trace (with a new token) has its own
+        while not self.trace_done.wait(self.checkpoint_interval):
+            if token is not self.cancel_token: return
+            self._try_checkpoint()
+        if token is self.cancel_token:
+            self._try_checkpoint() # Final state, including whatever a cancel left queued
+
+    def _try_checkpoint(self):
+        if not self.checkpoint_path: return # Checkpointing was switched off mid-trace
+        try:
+            self.save_checkpoint()
+        except (OSError, TypeError, ValueError) as e:
+            print(f"[WARN] Could not write checkpoint {self.checkpoint_path}: {e}")
+
+    def cancel_trace(self, wait=False, timeout=None, reason="cancelled"):
+        """Stop the running trace. Workers give up before their next fetch or submit and queued
+        tasks exit as soon as they start. Interrupted outputs end up in failed_utxos and outputs
+        that never started in queued_utxos, so refresh_frontier() can pick them up later.
+        With wait=True, blocks until the trace has drained; returns whether it has."""
+        self.cancel_token.cancel(reason)
+        if wait:
+            return self.wait_for_trace(timeout)
+        return self.is_trace_done()
+
+    def restart_trace(self, initial_txid, initial_vout, timeout=30):
+        """Cancel whatever is running, clear the graph and trace initial_txid:initial_vout instead."""
+        if not self.cancel_trace(wait=True, timeout=timeout):
+            print(f"[WARN] Previous trace still running after {timeout}s; not restarting.")
+            return False
+        self.reset()
+        self.trace_utxo(initial_txid, initial_vout)
+        return True
+
+    def shutdown(self, wait=True):
+        """Cancel any trace, stop the worker threads and close the exporters; the graph can't trace afterwards."""
+        self.cancel_trace(reason="shutdown")
+        # Queued tasks aren't dropped: each one still starts, sees the cancelled trace and records its output
+        # in queued_utxos/failed_utxos, releasing its task count, so trace_done is set and the checkpoint keeps them
+        self.executor.shutdown(wait=wait)
+        self.close_exporters()
+        if self.checkpoint_path: self._try_checkpoint() # Tasks cancelled above are saved as still to do
+
+    def add_exporter(self, exporter):
+        """Stream settled outputs and new edges to `exporter` (see export.py) from now on."""
+        self.exporters.append(exporter)
+        return exporter
+
+    def close_exporters(self):
+        for exporter in self.exporters:
+            exporter.close()
+        self.exporters = []
 
     def get_active_tasks_count(self):
         with self._active_tasks_lock:
             return self._active_tasks_count
 
-    def set_active_drawing_surface(self, fig, ax):
-        self.active_fig = fig
-        self.active_ax = ax
-        self.connect_interactive_events()
-
-    def connect_interactive_events(self):
-        # (remains the same)
-        if self.active_fig:
-            self.active_fig.canvas.mpl_connect('button_press_event', self.on_button_press)
-            # ... (other event connections)
+    def set_active_drawing_surface(self, fig, ax, **render_options):
+        """Attach a matplotlib figure/axes. render_options go to render.GraphRenderer
+        (lod_depth, lod_min_value, max_labels, edge_label_span)."""
+        from .view import GraphView # Loads matplotlib/numpy; headless runs never get here
+        self.view = GraphView(self, fig, ax, max_fps=self.max_fps, **render_options)
 
-    def reset(self):
+    def reset(self, clear_memo=True):
+        # clear_memo=False keeps memoized API responses, e.g. between seeds of one batch run
         # Wait for any ongoing tasks to complete before reset, or shutdown executor
         # For simplicity, we assume reset is called when no tasks are active.
         # If executor needs to be reset:
@@ -65,320 +219,476 @@ class UTXOGraph:
         # self.executor = ThreadPoolExecutor(max_workers=self.executor._max_workers)
 
         with self.graph_lock:
-            self.graph.clear()
-            self.visited.clear()
-            self.depths.clear()
+            self.store.clear()
+            self.seed = None
             self.unspent_utxos_found.clear()
-            self._current_pos_cache = {}
-            self.ui_update_queue.clear()
-
-        self._dragged_node = None
-        self.node_artist_collection = None
-        self._node_list_for_drawing = []
+            self.depth_limited_utxos.clear()
+            self.failed_utxos.clear()
+            self.queued_utxos.clear()
+        self._drain_ui_updates()
+        if clear_memo:
+            self.api.clear_memo() # Outspends may have changed since the last trace
+
+        if self.view: self.view.reset()
         self.status_message = "Ready"
         # self._active_tasks_count should be 0 if reset is called correctly
 
     def queue_ui_update(self, update_type, data=None):
         """Safely queues a request for the main thread to update the UI."""
-        with self.graph_lock: # ui_update_queue is a shared resource
-            self.ui_update_queue.append({'type': update_type, 'data': data or {}})
-
-    def process_ui_updates(self):
-        """Called by the main thread to process UI updates and visualize."""
-        if not self.active_ax: return False
-
-        processed_updates_count = 0
-        temp_unspent_notification_node = None
-        # Use a copy of status_message to avoid race if it's updated by main thread elsewhere
-        # For now, messages from queue will override.
-        # Let visualize handle the most current message from queue if available
-        last_message_from_queue = None
+        if self.view is None: return # Headless: nobody would ever drain the queue
+        self.ui_update_queue.put({'type': update_type, 'data': data or {}})
 
+    def _drain_ui_updates(self):
+        """Pop every queued UI update (oldest first) without blocking."""
+        updates = []
         while True:
             try:
-                with self.graph_lock: # Protect queue access
-                    update = self.ui_update_queue.popleft()
-            except IndexError: # Queue is empty
-                break
-
-            processed_updates_count += 1
-            data = update.get('data', {})
-            update_type = update.get('type')
-
-            if update_type == 'unspent_notification':
-                temp_unspent_notification_node = data.get('label')
-                last_message_from_queue = data.get('message', self.status_message)
-            elif update_type == 'status_message':
-                last_message_from_queue = data.get('message', self.status_message)
-            # Add more handlers here if specific actions are needed beyond just redrawing
-            # For example, if a node was added, ensure its position is considered.
-            # For now, any queued update triggers a full visualize call.
-
-        # If any updates were processed, or if a redraw was explicitly requested (not implemented yet)
-        if processed_updates_count > 0:
-            current_msg_for_visualize = last_message_from_queue if last_message_from_queue else self.status_message
-            self.visualize(ax=self.active_ax, is_incremental_update=True,
-                           current_process_message=current_msg_for_visualize,
-                           unspent_notification_node=temp_unspent_notification_node)
-            return True # Indicates UI was updated
-        return False
-
-
-    def on_button_press(self, event): # (remains largely the same)
-        if event.inaxes != self.active_ax: return
-        if self.is_tracing: # Check overall tracing state
-            self.queue_ui_update('status_message', {'message': "Wait till trace is completed to move nodes."})
-            self._dragged_node = None; return
-        # ... (rest of drag logic) ...
-        if not self.node_artist_collection: self._dragged_node = None; return
-        contains, info = self.node_artist_collection.contains(event)
-        if contains:
-            idx = info['ind'][0]
-            if idx < len(self._node_list_for_drawing): self._dragged_node = self._node_list_for_drawing[idx]; return
-        self._dragged_node = None
-
-
-    def on_motion_notify(self, event): # (remains largely the same)
-        if self.is_tracing or not self._dragged_node: return
-        if event.inaxes == self.active_ax and self._current_pos_cache:
-            x,y = event.xdata, event.ydata
-            if x is not None and y is not None:
-                self._current_pos_cache[self._dragged_node] = (x,y)
-                # Instead of direct visualize, queue an update
-                self.queue_ui_update('status_message', {'message': f"Dragging {self._dragged_node[:15]}..."})
-
-    def on_button_release(self, event): # (remains largely the same)
-        if self.is_tracing or not self._dragged_node: self._dragged_node = None; return # Clear if tracing
-        if self._dragged_node:
-             # Queue a final status update for the move
-            self.queue_ui_update('status_message', {'message': f"Node {self._dragged_node[:15]} moved"})
-        self._dragged_node = None
+                updates.append(self.ui_update_queue.get_nowait())
+            except queue.Empty:
+                return updates
+
+    def process_ui_updates(self):
+        """Called by the main thread: merge queued UI updates and draw a frame if max_fps allows.
+        Returns True if a frame was drawn (always False without a drawing surface)."""
+        return self.view.process_ui_updates() if self.view else False
 
     # Main orchestrator method, called by main.py
-    def trace_utxo(self, initial_txid, initial_vout):
-        if not self.active_ax:
-            print("[ERROR] Active drawing surface not set.")
-            if hasattr(self, 'is_tracing'): self.is_tracing = False
-            return
+    def trace_utxo(self, initial_txid, initial_vout, engine=None):
+        """Start tracing in the background and return immediately.
 
-        # self.is_tracing is set by main.py before this call
-        # self.status_message is also set by main.py
+        engine is "threads" (ThreadPoolExecutor) or "async" (asyncio on a single background thread);
+        defaults to the engine given to the constructor. Completion is signalled through trace_done.
+        """
+        # self.is_tracing / self.status_message are set by main.py before this call.
         # self.reset() should have been called by main.py before setting is_tracing=True for a new cycle.
+        engine = engine or self.engine
+        self.seed = (initial_txid, initial_vout)
+        self._begin_trace()
+        if engine == "async":
+            self._start_async_tracer("run_sync", initial_txid, initial_vout)
+            return
 
-        self._increment_active_tasks() # Increment for the initial task
-        self.executor.submit(self._process_utxo_worker, initial_txid, initial_vout, 0)
-        # This method now just kicks off the first task.
-        # The completion (active_tasks_count == 0) is monitored by main.py.
+        self._submit(self._process_utxo_worker, initial_txid, initial_vout, 0) # The initial task
 
-    def _process_utxo_worker(self, txid, vout, depth):
+    def refresh_frontier(self, engine=None, recheck_unspent=True):
+        """Incremental refresh: keep the graph and only re-check what can have changed since the last trace.
+
+        Re-polls outspends of every unspent UTXO found so far and expands the ones that got spent,
+        expands depth-limited leaves if max_depth was raised, retries outputs whose fetch failed
+        and resumes outputs a previous budget left queued.
+        recheck_unspent=False skips the re-poll of unspent UTXOs (used by resume_trace()).
+        Like trace_utxo, this runs in the background and signals completion through trace_done.
+        Returns the number of frontier entries being re-checked.
+        """
+        engine = engine or self.engine
+        with self.graph_lock:
+            unspent = list(self.unspent_utxos_found) if recheck_unspent else []
+            leaves = [(node, spending_txid) for node, spending_txid in self.depth_limited_utxos.items()
+                      if self.store.records[node].depth + 1 <= self.max_depth]
+            for node, _ in leaves:
+                del self.depth_limited_utxos[node]
+            failed = [(*self.store.outpoint(node), self.store.records[node].depth) for node in self.failed_utxos]
+            for node in self.failed_utxos:
+                self.store.unclaim(node) # Let the worker claim it again
+            self.failed_utxos.clear()
+            pending = list(self.queued_utxos)
+            self.queued_utxos.clear()
+
+        self.api.invalidate_outspends_many(entry['txid'] for entry in unspent)
+
+        self._begin_trace()
+        if engine == "async":
+            self._start_async_tracer("run_refresh_sync", unspent, leaves, failed, pending)
+        else:
+            self._increment_active_tasks() # Held while submitting so trace_done can't fire early
+            if unspent:
+                self._submit(self._recheck_unspent_level_worker, unspent)
+            for node, spending_txid in leaves:
+                self._submit(self._expand_leaf_worker, node, spending_txid)
+            for txid, vout, depth in failed:
+                self._submit(self._process_utxo_worker, txid, vout, depth)
+            if self.frontier is None:
+                for txid, vout, depth, _ in pending:
+                    self._submit(self._process_utxo_worker, txid, vout, depth)
+            else:
+                for _ in pending: self._increment_active_tasks() # Each queued entry counts as a task until it has run
+                for entry in pending: self.frontier.push(*entry)
+                self._dispatch_frontier()
+            self._decrement_active_tasks()
+        return len(unspent) + len(leaves) + len(failed) + len(pending)
+
+    def recheck_outputs(self, outpoints, engine=None):
+        """Re-poll only the given (txid, vout) entries of unspent_utxos_found and expand the ones that got spent,
+        e.g. the spends a watch.SpendWatcher reported. Runs in the background like refresh_frontier();
+        call it when no trace is running. Returns the number of outputs being re-checked."""
+        engine = engine or self.engine
+        wanted = set(outpoints)
+        with self.graph_lock:
+            unspent = [entry for entry in self.unspent_utxos_found if (entry['txid'], entry['vout']) in wanted]
+        if not unspent:
+            return 0
+        self.api.invalidate_outspends_many(entry['txid'] for entry in unspent)
+
+        self._begin_trace()
+        if engine == "async":
+            self._start_async_tracer("run_refresh_sync", unspent, [], [], [])
+        else:
+            self._submit(self._recheck_unspent_level_worker, unspent)
+        return len(unspent)
+
+    def _start_async_tracer(self, run_method, *args):
+        """Run an AsyncTracer method on a background thread with its own event loop."""
+        if not isinstance(self.api, MempoolAPI):
+            print("[ERROR] The async engine only works with the mempool.space HTTP backend; use engine='threads'.")
+            self._finish_trace()
+            return
         try:
-            # 1. Check depth and visited status (thread-safe)
-            utxo_id_tuple = (txid, vout)
+            from .async_engine import AsyncTracer
+        except ImportError as e:
+            print(f"[ERROR] The async engine needs aiohttp (pip install aiohttp): {e}")
+            self._finish_trace()
+            return
+        tracer = AsyncTracer(self, max_concurrency=self.max_concurrency)
+        threading.Thread(target=self._run_profiled, args=(getattr(tracer, run_method), *args), daemon=True).start()
+
+    def wait_for_trace(self, timeout=None):
+        """Block until the running trace finishes. Returns False if `timeout` expired first."""
+        return self.trace_done.wait(timeout)
+
+    def is_trace_done(self):
+        return self.trace_done.is_set()
+
+    # --- Engine-independent steps, shared by the thread worker below and async_engine.AsyncTracer ---
+
+    def _claim_utxo(self, txid, vout, depth):
+        """Mark (txid, vout) as visited and return its node id.
+        None if it is too deep or was already claimed by another task."""
+        if depth > self.max_depth:
+            return None
+        node = self.store.find(txid, vout) # Lock-free fast path for outputs reached by several parents
+        if node is not None and self.store.is_visited(node):
+            return None
+        with self.graph_lock:
+            node = self.store.intern(txid, vout)
+            if not self.store.claim(node):
+                return None
+            current = self.store.records[node].depth
+            if current < 0 or depth < current:
+                self.store.set_depth(node, depth)
+            return node
+
+    def _record_utxo(self, node, tx_details):
+        """Fill in value and script type of a claimed node from its tx details."""
+        txid, vout = self.store.outpoint(node)
+        script_type = self.api.get_scripttype(txid, vout, tx_details=tx_details)
+        vouts = tx_details.get("vout", [])
+        value = vouts[vout].get("value", 0) if 0 <= vout < len(vouts) else -1
+        with self.graph_lock:
+            self.store.set_output(node, value, script_type)
+            depth = self.store.records[node].depth
+        self.queue_ui_update('status_message', {'message': f"Added {self.store.label(node)[:20]} (D:{depth})"})
+
+    def _record_unspent(self, node):
+        with self.graph_lock:
+            self.store.set_spent_by(node, None)
+            txid, vout = self.store.outpoint(node)
+            record = self.store.records[node]
+            self.unspent_utxos_found.append({
+                'txid': txid, 'vout': vout, 'script_type': self.store.script_type(node),
+                'value': record.value, 'depth': record.depth
+            })
+            label = self.store.label(node)
+            export_record = self._node_record(node, "unspent") if self.exporters else None
+        self._export_node(node, export_record)
+        cli_alert_message = f"[!!!] UNSPENT UTXO FOUND: {label} (TxID: {txid}, vout: {vout})"
+        print("\n" + "="*len(cli_alert_message)); print(cli_alert_message); print("="*len(cli_alert_message) + "\n")
+        self.queue_ui_update('unspent_notification', {
+            'node': node,
+            'message': f"Unspent: {label[:20]}"
+        })
+
+    def _mark_newly_spent(self, entry, spending_txid):
+        """Drop a previously unspent UTXO from unspent_utxos_found now that it has been spent.
+        Returns its node id."""
+        with self.graph_lock:
+            if entry in self.unspent_utxos_found:
+                self.unspent_utxos_found.remove(entry)
+            node = self.store.find(entry['txid'], entry['vout'])
+        print(f"[INFO] TxID: {entry['txid']}, vout: {entry['vout']} is now spent by {spending_txid}")
+        self.queue_ui_update('status_message', {'message': f"{entry['txid'][:8]}:{entry['vout']} newly spent by {spending_txid[:8]}..."})
+        return node
+
+    def _record_depth_limited(self, node, spending_txid):
+        """Spent, but its children are past max_depth: record the spend and the leaf in one go."""
+        with self.graph_lock:
+            self.store.set_spent_by(node, spending_txid)
+            self.depth_limited_utxos[node] = spending_txid
+            export_record = self._node_record(node, "spent") if self.exporters else None
+        self._export_node(node, export_record)
+        self.queue_ui_update('status_message', {'message': f"Max depth for children of {self.store.label(node)[:15]}"})
+
+    def _record_failed(self, node, spending_txid=None):
+        """spending_txid: the node is known to be spent, only fetching its spending tx failed."""
+        with self.graph_lock:
+            if spending_txid: self.store.set_spent_by(node, spending_txid)
+            self.failed_utxos.add(node)
+            export_record = self._node_record(node, "failed") if self.exporters else None
+        self._export_node(node, export_record)
+
+    def _node_record(self, node, status):
+        """Export record for a node; call with graph_lock held."""
+        txid, vout = self.store.outpoint(node)
+        record = self.store.records[node]
+        return {"txid": txid, "vout": vout, "value_sats": record.value, "script_type": self.store.script_type(node),
+                "depth": record.depth, "spent_by": self.store.spent_by(node), "status": status}
+
+    def _export_node(self, node, export_record):
+        """Write outside graph_lock so slow disks never block other workers."""
+        if export_record is None: return
+        for exporter in self.exporters:
+            exporter.write_node(node, export_record)
+
+    def _record_unstarted(self, txid, vout, depth):
+        """A queued output whose task only started after the trace was cancelled."""
+        with self.graph_lock:
+            node = self.store.find(txid, vout)
+            value = self.store.records[node].value if node is not None else -1
+            self.queued_utxos.append((txid, vout, depth, value))
+
+    def _record_children(self, parent_node, spending_txid, spender_tx_details, claim_depth=None):
+        """Link the parent node to every output of its spending tx, all under one graph_lock hold.
+        With claim_depth, children nobody has claimed yet are claimed at that depth in the same hold,
+        so their tasks skip _claim_utxo. Returns (vout, value, node) for the outputs of spending_txid
+        that still have to be traced; node is the claimed child, or None without claim_depth."""
+        outputs_of_spender = [(new_vout, value, self.api.get_scripttype(spending_txid, new_vout, tx_details=spender_tx_details))
+                              for new_vout, value in self.api.get_outputs(spending_txid, tx_details=spender_tx_details)]
+        if not outputs_of_spender:
+            self.queue_ui_update('status_message', {'message': f"{spending_txid[:8]} has no outputs"})
+            return []
+
+        parent_txid, parent_vout = self.store.outpoint(parent_node)
+        in_offset, input_total = self.api.get_input_position(spending_txid, parent_txid, parent_vout,
+                                                             tx_details=spender_tx_details)
+        to_trace = []
+        new_edges = []
+        with self.graph_lock:
+            self.store.set_spent_by(parent_node, spending_txid)
+            self.store.set_input_position(parent_node, spending_txid, in_offset, input_total)
+            children = []
+            for new_vout, value, child_script_type in outputs_of_spender:
+                child = self.store.intern(spending_txid, new_vout)
+                self.store.set_output(child, value, child_script_type)
+                children.append(child)
+            if self.store.link_outputs(parent_node, children) and self.exporters:
+                new_edges = [{"src_txid": parent_txid, "src_vout": parent_vout, "dst_txid": spending_txid,
+                              "dst_vout": new_vout, "value_sats": value} for new_vout, value, _ in outputs_of_spender]
+            for (new_vout, value, _), child in zip(outputs_of_spender, children):
+                if claim_depth is None:
+                    if not self.store.is_visited(child):
+                        to_trace.append((new_vout, value, None)) # Depth is set when the child itself is claimed
+                elif self.store.claim(child):
+                    self.store.set_depth(child, claim_depth)
+                    to_trace.append((new_vout, value, child))
+            export_record = self._node_record(parent_node, "spent") if self.exporters else None
+        self._export_node(parent_node, export_record)
+        for edge in new_edges:
+            for exporter in self.exporters:
+                exporter.write_edge(edge)
+        self.queue_ui_update('status_message', {'message': f"Discovered {len(outputs_of_spender)} outputs of {spending_txid[:8]}"})
+        return to_trace
+
+    def _queue_children(self, spending_txid, children, depth):
+        """Best-first mode: push (vout, value) children onto the frontier, skipping dust below the
+        budget's min_value. Returns how many were queued."""
+        queued = 0
+        for vout, value, _ in children:
+            if self.budget and self.budget.below_min_value(value):
+                self.stats.inc("skipped_below_min_value")
+                continue
+            self.frontier.push(spending_txid, vout, depth, value)
+            queued += 1
+        return queued
+
+    def _take_from_frontier(self):
+        """Entries that may start now. Entries dropped because the budget ran out (or the trace was
+        cancelled) are kept in queued_utxos so a later refresh_frontier() can resume them."""
+        frontier = self.frontier
+        ready, dropped = frontier.take(self._frontier_stop_reason)
+        if dropped:
             with self.graph_lock:
-                if depth > self.max_depth or utxo_id_tuple in self.visited:
+                first = not self.queued_utxos
+                self.queued_utxos.extend(dropped)
+            self.stats.inc("budget_dropped", len(dropped))
+            if first: print(f"[INFO] Stopped expanding the frontier ({frontier.exhausted_reason}); queued UTXOs are left unexpanded.")
+        return ready, len(dropped)
+
+    def _frontier_stop_reason(self):
+        if self.cancel_token.cancelled:
+            return self.cancel_token.reason
+        return self.budget.exhausted(self.stats, len(self.store)) if self.budget else None
+
+    def _dispatch_frontier(self, released=0):
+        """Threads engine: submit whatever the frontier allows to start, then release `released`
+        task counts plus one per dropped entry."""
+        ready, dropped = self._take_from_frontier()
+        for txid, vout, depth, _ in ready:
+            with self._active_tasks_lock: self._queued_tasks += 1
+            self.executor.submit(self._run_task, self._frontier_worker, txid, vout, depth)
+        for _ in range(released + dropped):
+            self._decrement_active_tasks()
+
+    def _frontier_worker(self, txid, vout, depth):
+        self._increment_active_tasks() # Balanced by _process_utxo_worker's finally
+        try:
+            self._process_utxo_worker(txid, vout, depth)
+        finally:
+            self.frontier.done()
+            self._dispatch_frontier(released=1) # This entry's own count, released after its successors are queued
+
+    def _submit(self, fn, *args):
+        self._increment_active_tasks() # Increment *before* submitting new task
+        if self._queued_tasks >= self.max_queued and getattr(self._worker_state, "inside", False):
+            # Backpressure: a worker that outruns the pool runs its child itself instead of growing the
+            # queue. Recursion is bounded by max_depth since every child is one level deeper.
+            self.stats.inc("caller_runs")
+            fn(*args)
+            return
+        with self._active_tasks_lock: self._queued_tasks += 1
+        try:
+            self.executor.submit(self._run_task, fn, *args)
+        except RuntimeError: # Pool shut down: the task runs here, sees the cancelled trace and records itself
+            with self._active_tasks_lock: self._queued_tasks -= 1
+            fn(*args)
+
+    def _run_task(self, fn, *args):
+        with self._active_tasks_lock: self._queued_tasks -= 1 # Picked up by a worker thread
+        self._worker_state.inside = True
+        try:
+            self._run_profiled(fn, *args)
+        finally:
+            self._worker_state.inside = False
+
+    def _run_profiled(self, fn, *args):
+        """Run fn, under the trace profiler if profile_next_trace() asked for one."""
+        profiler = self._profiler
+        if profiler is None:
+            return fn(*args)
+        try:
+            return profiler.run(fn, *args)
+        finally:
+            if self.trace_done.is_set(): self._stop_profiler() # This was the trace's last task
+
+    def _process_utxo_worker(self, txid, vout, depth, node=None):
+        # node is set when the parent already claimed this output in _record_children
+        try:
+            self.cancel_token.raise_if_cancelled() # Queued tasks of a cancelled trace exit right away
+            # 1. Check depth and visited status (thread-safe)
+            if node is None:
+                node = self._claim_utxo(txid, vout, depth)
+                if node is None:
                     return # Task ends, will be decremented in finally
-                self.visited.add(utxo_id_tuple)
 
             self.queue_ui_update('status_message', {'message': f"Fetching {txid[:8]}:{vout} (D:{depth})"})
             tx_details = self.api.get_transaction_details(txid) # I/O bound, GIL released
             if not tx_details:
+                self._record_failed(node)
                 self.queue_ui_update('status_message', {'message': f"Error fetching {txid[:8]}"})
                 return
 
-            script_type = self.api.get_scripttype(txid, vout, tx_details=tx_details)
-            current_graph_label = f"{txid[:8]}... ({script_type})"
-
             # 2. Update graph structure (thread-safe)
-            with self.graph_lock:
-                if current_graph_label not in self.graph:
-                    self.graph.add_node(current_graph_label)
-                self.depths[current_graph_label] = depth
-            self.queue_ui_update('status_message', {'message': f"Added {current_graph_label[:20]} (D:{depth})"})
+            self._record_utxo(node, tx_details)
 
             # 3. Check if spent (API call)
+            self.cancel_token.raise_if_cancelled()
             all_outspends_info = self.api.get_spending_transactions(txid) # I/O bound
             spending_txid = all_outspends_info.get(vout) if isinstance(all_outspends_info, dict) else None
 
             if not spending_txid: # Unspent
-                with self.graph_lock:
-                    self.unspent_utxos_found.append({
-                        'txid': txid, 'vout': vout, 'label': current_graph_label, 'script_type': script_type
-                    })
-                cli_alert_message = f"[!!!] UNSPENT UTXO FOUND: {current_graph_label} (TxID: {txid}, vout: {vout})"
-                print("\n" + "="*len(cli_alert_message)); print(cli_alert_message); print("="*len(cli_alert_message) + "\n")
-                self.queue_ui_update('unspent_notification', {
-                    'label': current_graph_label,
-                    'message': f"Unspent: {current_graph_label[:20]}"
-                })
+                self._record_unspent(node)
                 return
 
             # 4. Spent: Process children if within depth
-            next_depth = depth + 1
-            if next_depth > self.max_depth:
-                self.queue_ui_update('status_message', {'message': f"Max depth for children of {current_graph_label[:15]}"})
-                return
+            self._expand_spent_utxo(node, spending_txid)
+        except TraceCancelled: # Either way the next refresh_frontier() picks it up again
+            if node is None: self._record_unstarted(txid, vout, depth)
+            else: self._record_failed(node)
+        except Exception as e:
+            print(f"[ERROR] in worker {txid}:{vout}: {e}")
+        finally:
+            self._decrement_active_tasks() # Decrement when task finishes or returns early
 
-            self.queue_ui_update('status_message', {'message': f"{current_graph_label[:10]} spent by {spending_txid[:8]}..."})
-            spender_tx_details = self.api.get_transaction_details(spending_txid) # I/O bound
-            if not spender_tx_details:
-                self.queue_ui_update('status_message', {'message': f"Error spender {spending_txid[:8]}"})
-                return
+    def _expand_spent_utxo(self, node, spending_txid):
+        """Fetch the spending tx of a node and submit a task for each of its outputs."""
+        next_depth = self.store.records[node].depth + 1
+        if next_depth > self.max_depth:
+            self._record_depth_limited(node, spending_txid)
+            return
 
-            outputs_of_spender = self.api.get_outputs(spending_txid, tx_details=spender_tx_details)
-            if not outputs_of_spender:
-                self.queue_ui_update('status_message', {'message': f"{spending_txid[:8]} has no outputs"})
-                return
+        self.queue_ui_update('status_message', {'message': f"{self.store.label(node)[:10]} spent by {spending_txid[:8]}..."})
+        self.cancel_token.raise_if_cancelled()
+        spender_tx_details = self.api.get_transaction_details(spending_txid) # I/O bound
+        if not spender_tx_details:
+            self._record_failed(node, spending_txid)
+            self.queue_ui_update('status_message', {'message': f"Error spender {spending_txid[:8]}"})
+            return
 
-            for new_vout, value in outputs_of_spender:
-                child_txid_val=spending_txid
-                child_vout_val=new_vout
-                child_depth_val = next_depth
-                child_utxo_id_tuple_for_visit_check = (spending_txid, new_vout)
-                # Check visited for child *before* submitting new task (optimisation)
-                with self.graph_lock: # Quick check, must be fast
-                    if child_utxo_id_tuple_for_visit_check in self.visited or next_depth > self.max_depth:
-                        # If already visited, or would exceed depth, maybe still add edge if not present
-                        # Edge adding logic needs to be robust if children are processed independently
-                        # For now, if child visited, this branch of work stops for that child here.
-                        # Edge to an already existing node should be added by its first discoverer.
-                        # This logic can be complex if graph can be cyclic or nodes reached by multiple paths.
-                        # Let's ensure edges are added if the child exists but this path to it is new.
-                        _child_s_type = self.api.get_scripttype(spending_txid, new_vout, tx_details=spender_tx_details)
-                        _child_g_label = f"{spending_txid[:8]}... ({_child_s_type})"
-                        if _child_g_label in self.graph and not self.graph.has_edge(current_graph_label, _child_g_label):
-                            _edge_val = f"{value / 1e8:.8f} BTC"
-                            self.graph.add_edge(current_graph_label, _child_g_label, value=_edge_val)
-                            self.queue_ui_update('status_message', {'message': f"Linked to existing {child_graph_label[:15]}"})
-                        continue # Don't submit task for already visited/max_depth child
-
-                # If not visited and within depth, submit task for this child branch
-                self._increment_active_tasks() # Increment *before* submitting new task
-                self.executor.submit(self._process_utxo_worker_child,
-                                     spending_txid, new_vout, next_depth,
-                                     current_graph_label, value, spender_tx_details)
-        finally:
-            self._decrement_active_tasks() # Decrement when task finishes or returns early
+        if self.frontier is None:
+            self.cancel_token.raise_if_cancelled() # The parent is retried as a whole, so nothing is lost
+            # Children are claimed while they are recorded; a cancelled child task records itself as failed
+            children = self._record_children(node, spending_txid, spender_tx_details, claim_depth=next_depth)
+            for new_vout, _, child in children:
+                self._submit(self._process_utxo_worker, spending_txid, new_vout, next_depth, child)
+            return
+        children = self._record_children(node, spending_txid, spender_tx_details)
+        for _ in children: self._increment_active_tasks() # Each queued child counts as a task until it has run
+        skipped = len(children) - self._queue_children(spending_txid, children, next_depth)
+        self._dispatch_frontier(released=skipped)
 
-    # Helper for submitting child tasks to manage parameters, could be merged back if preferred
-    def _process_utxo_worker_child(self, child_txid, child_vout, child_depth,
-                                   parent_graph_label_for_edge, edge_value, child_tx_full_details):
-        # This function is just to make the edge addition cleaner before calling the main worker logic.
-        # The main worker logic starts by checking visited status.
+    def _recheck_unspent_level_worker(self, unspent):
+        """Refresh task: fetch the outspends of every previously unspent UTXO in bulk, then re-check each."""
         try:
-            child_script_type = self.api.get_scripttype(child_txid, child_vout, tx_details=child_tx_full_details)
-            child_graph_label = f"{child_txid[:8]}... ({child_script_type})"
-            edge_value_str = f"{edge_value / 1e8:.8f} BTC"
+            try:
+                self.cancel_token.raise_if_cancelled() # Still listed as unspent, so the next refresh re-checks them
+                self.api.get_spending_transactions_bulk([entry['txid'] for entry in unspent])
+            except TraceCancelled:
+                return
+            except Exception as e: # Each re-check below fetches what is missing on its own
+                print(f"[ERROR] in bulk outspends prefetch: {e}")
+            for entry in unspent:
+                self._submit(self._recheck_unspent_worker, entry)
+        finally:
+            self._decrement_active_tasks()
 
-            with self.graph_lock:
-                if child_graph_label not in self.graph:
-                    self.graph.add_node(child_graph_label)
-                    # Depth will be set by the child's own _process_utxo_worker task
-                if not self.graph.has_edge(parent_graph_label_for_edge, child_graph_label):
-                    self.graph.add_edge(parent_graph_label_for_edge, child_graph_label, value=edge_value_str)
-
-            self.queue_ui_update('status_message', {'message': f"Discovered {child_graph_label[:15]}"})
-
-            # Now call the main worker logic for this child.
-            # The increment for this task was done by the parent *before* submitting.
-            self._process_utxo_worker(child_txid, child_vout, child_depth)
-        except Exception as e: # Catch exceptions in child processing to ensure decrement
-            print(f"[ERROR] in child worker {child_txid}:{child_vout}: {e}")
-            # Decrement was already handled by the _process_utxo_worker's finally block.
-            # If _process_utxo_worker is not called due to an error here, then decrement is missed.
-            # The current structure: parent increments, submits _process_utxo_worker_child,
-            # which calls _process_utxo_worker. The finally in _process_utxo_worker handles decrement.
-            # This specific _process_utxo_worker_child does not decrement itself, as it's a wrapper.
-            # This design is a bit complex. Simpler is to do all in one worker.
-
-    # Reverting to single worker for children too:
-    # (The above _process_utxo_worker_child can be removed if all logic is in _process_utxo_worker)
-    # The _process_utxo_worker's "Submit new task for this child" section would be:
-    # self.executor.submit(self._process_utxo_worker, spending_txid, new_vout, next_depth)
-    # And edge/node adding for child would happen when child task runs. This causes visual delay.
-
-    # Let's stick to the _process_utxo_worker adding its own node & connecting to parent.
-    # The parent_graph_label needs to be passed to _process_utxo_worker.
-    # The initial call to _process_utxo_worker will have parent_graph_label=None.
-    # Revised _process_utxo_worker and trace_utxo (orchestrator):
-    # (This is getting very complex for one step, let's ensure the previous single worker logic is robust first)
-    # The previous _process_utxo_worker correctly handles its own node and then spawns children.
-    # The edge from parent to child needs to be added by the PARENT when it discovers the child.
-    # This was in the previous version of _process_utxo_worker's loop. That was better.
-
-    # Let's simplify and use the single _process_utxo_worker as designed before the child_worker split idea.
-    # The key is that `_process_utxo_worker` calls `self.executor.submit(self._process_utxo_worker, ...)` for children.
+    def _recheck_unspent_worker(self, entry):
+        """Refresh task: re-poll one previously unspent UTXO and expand it if it has been spent since."""
+        node = None
+        try:
+            self.cancel_token.raise_if_cancelled() # Still listed as unspent, so the next refresh re-checks it
+            all_outspends_info = self.api.get_spending_transactions(entry['txid'])
+            spending_txid = all_outspends_info.get(entry['vout']) if isinstance(all_outspends_info, dict) else None
+            if not spending_txid:
+                return # Still unspent
+            node = self._mark_newly_spent(entry, spending_txid)
+            self._expand_spent_utxo(node, spending_txid)
+        except TraceCancelled:
+            if node is not None: self._record_failed(node)
+        except Exception as e:
+            print(f"[ERROR] in refresh worker {entry['txid']}:{entry['vout']}: {e}")
+        finally:
+            self._decrement_active_tasks()
 
+    def _expand_leaf_worker(self, node, spending_txid):
+        """Refresh task: expand a spent UTXO that was cut off by a smaller max_depth."""
+        try:
+            self._expand_spent_utxo(node, spending_txid)
+        except TraceCancelled:
+            self._record_failed(node)
+        except Exception as e:
+            print(f"[ERROR] in refresh worker for node {node}: {e}")
+        finally:
+            self._decrement_active_tasks()
 
     def visualize(self, ax=None, is_incremental_update=False, current_process_message="", unspent_notification_node=None):
-        # (Visualize method remains mostly the same, using self.ui_update_queue outputs)
-        # (Ensure it uses pos cache correctly even with concurrent modifications)
-        # ... (visualization code from before, ensure thread safety if it reads shared state not covered by queue)
-        # Position calculation should be fine if it uses _current_pos_cache which is updated under lock
-        # (The existing visualize method is mostly fine, main thing is it's called from main thread)
-        if ax is None: ax = self.active_ax
-        if ax is None: print("[ERROR] Visualize called without an active Axes object."); return
-
-        with self.graph_lock: # Acquire lock before accessing graph data for visualization
-            ax.clear()
-            if not self.graph.nodes:
-                ax.text(0.5, 0.5, "Graph is empty.", ha='center', va='center')
-            else:
-                # Position calculation (ensure _current_pos_cache is correctly managed)
-                pos = None
-                if self._current_pos_cache and all(node in self._current_pos_cache for node in self.graph.nodes()):
-                    pos = self._current_pos_cache.copy() # Use a copy
-                else:
-                    try:
-                        pos = nx.nx_pydot.graphviz_layout(self.graph, prog='dot')
-                    except Exception:
-                        pos = nx.spring_layout(self.graph, pos=self._current_pos_cache if self._current_pos_cache else None, k=0.9, iterations=50, fixed=None)
-                    self._current_pos_cache = pos.copy() if pos else {}
-
-                if not pos and self.graph.nodes(): pos = nx.spring_layout(self.graph, k=0.9, iterations=10)
-                if pos:
-                    for node_label_iter in list(self.graph.nodes()):
-                        if node_label_iter not in pos: pos[node_label_iter] = (random.random(), random.random())
-                    self._current_pos_cache.update(pos)
-                elif self.graph.nodes(): print("[ERROR] Could not determine node positions!"); return
-
-                self._node_list_for_drawing = list(self.graph.nodes())
-                node_final_colors = []
-                max_depth_val = max(self.depths.values(), default=0) if self.depths else 0
-                cmap = cm.get_cmap('plasma' if 'plasma' in plt.colormaps() else 'viridis')
-
-                for node_label in self._node_list_for_drawing:
-                    depth_val = self.depths.get(node_label, 0)
-                    normalized_depth = depth_val / max_depth_val if max_depth_val > 0 else 0.0
-                    node_final_colors.append(cmap(normalized_depth))
-
-                self.node_artist_collection = nx.draw_networkx_nodes(
-                    self.graph, pos, ax=ax, nodelist=self._node_list_for_drawing,
-                    node_color=node_final_colors, node_size=2000)
-                nx.draw_networkx_edges(
-                    self.graph, pos, ax=ax, edge_color='gray',
-                    arrows=True, arrowstyle='-|>', arrowsize=15, width=1.5)
-                nx.draw_networkx_labels(
-                    self.graph, pos, ax=ax, labels={n: n for n in self._node_list_for_drawing},
-                    font_size=8, font_weight='normal')
-                edge_labels = nx.get_edge_attributes(self.graph, 'value')
-                nx.draw_networkx_edge_labels(self.graph, pos, edge_labels=edge_labels, font_size=7, ax=ax)
-
-                if unspent_notification_node and pos and unspent_notification_node in pos:
-                    node_pos_x, node_pos_y = pos[unspent_notification_node]
-                    ax.text(node_pos_x, node_pos_y + 0.05, "unspendddd!!", ha='center', va='bottom',
-                            fontsize=10, color='darkred', weight='bold',
-                            bbox=dict(boxstyle="round,pad=0.4", fc="lightyellow", ec="orange", alpha=0.85, lw=1.5))
-        # End of `with self.graph_lock` for visualization data gathering
-
-        title_base = f"UTXO Graph (Max Depth: {self.max_depth})"
-        display_info = current_process_message
-        if not display_info:
-            if self.is_tracing: display_info = self.status_message
-            elif self.status_message: display_info = self.status_message
-            else: display_info = "Ready"
-        final_title_message = f"{title_base} - {display_info}"
-        ax.set_title(final_title_message, fontsize=10)
-        ax.axis("off")
-
-        if self.active_fig: self.active_fig.canvas.draw_idle()
-        if is_incremental_update: plt.pause(0.05)
+        """Draw a frame now, regardless of max_fps (see view.GraphView.visualize)."""
+        if self.view is None: print("[ERROR] Visualize called without an active Axes object."); return
+        self.view.visualize(current_process_message, unspent_notification_node)
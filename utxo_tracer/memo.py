@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+
+class _InFlight:
+    """A fetch currently being performed by one thread that others can wait on."""
+    __slots__ = ("event", "result")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+class LRUMemo:
+    """Size-bounded in-memory memo with in-flight request coalescing.
+
+    If several threads ask for the same key at once, only the first one calls
+    `fetch`; the others block until that call finishes and share its result.
+    Results for which `should_store(result)` is false (e.g. failed fetches) are
+    handed to the waiters but not memoized.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get_or_fetch(self, key, fetch, should_store=lambda result: result is not None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+            pending = self._in_flight.get(key)
+            is_owner = pending is None
+            if is_owner:
+                pending = self._in_flight[key] = _InFlight()
+
+        if not is_owner:
+            pending.event.wait()
+            return pending.result
+
+        try:
+            pending.result = fetch()
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if should_store(pending.result):
+                    self._data[key] = pending.result
+                    self._data.move_to_end(key)
+                    while len(self._data) > self.maxsize:
+                        self._data.popitem(last=False)
+            pending.event.set()
+        return pending.result
+
+    def get(self, key):
+        """Return the memoized value for `key`, or None. Never waits on in-flight fetches."""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                return self._data[key]
+        return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
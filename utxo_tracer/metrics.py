@@ -0,0 +1,363 @@
+import bisect
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # seconds
+
+def _metric_key(name, labels):
+    """Prometheus-style series name, e.g. http_requests{endpoint="tx"}."""
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+class Histogram:
+    """Fixed-bucket histogram; the last count is the +Inf bucket."""
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max: self.max = value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (max for the +Inf bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {"count": self.count, "sum": round(self.sum, 6), "max": round(self.max, 6),
+                "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95), "p99": self.quantile(0.99)}
+
+class TimedLock:
+    """Drop-in for threading.Lock that records how long callers waited to acquire it.
+
+    The counters are only updated while the lock is held, so they need no lock of their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.wait = Histogram()
+        self.contended = 0 # Acquisitions that had to wait
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False): # Uncontended fast path: no clock reads
+            self.wait.observe(0.0)
+            return True
+        if not blocking:
+            return False
+        started = time.perf_counter()
+        if not self._lock.acquire(True, timeout):
+            return False
+        self.wait.observe(time.perf_counter() - started)
+        self.contended += 1
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+class TraceStats:
+    """Counters, gauges and latency histograms for one UTXOGraph and its API backend.
+
+    Hot paths call inc()/observe()/add_gauge(); gauges that are cheap to read on demand
+    (node counts, lock stats) are registered as callables and only evaluated on export.
+    Export with snapshot() (dict), to_prometheus() (text format), serve_prometheus()
+    or start_json_dump().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._gauge_fns = {} # name -> callable returning the current value
+        self._locks = {} # name -> TimedLock
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = {} # (name, labels) -> int
+            self._gauges = {} # (name, labels) -> number
+            self._histograms = {} # (name, labels) -> Histogram
+            self._trace_started = None
+            self._trace_finished = None
+            self._nodes_at_start = 0
+
+    # --- Recording ---
+
+    def inc(self, name, n=1, **labels):
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def add_gauge(self, name, delta, **labels):
+        key = (name, tuple(labels.items()))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + delta
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(labels.items()))] = value
+
+    def register_gauge(self, name, fn):
+        """Report fn() as gauge `name` whenever stats are exported."""
+        self._gauge_fns[name] = fn
+
+    def register_lock(self, name, timed_lock):
+        """Export a TimedLock's wait histogram as `<name>_wait_seconds`."""
+        self._locks[name] = timed_lock
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def start_trace(self):
+        with self._lock:
+            self._trace_started = time.monotonic()
+            self._trace_finished = None
+            self._nodes_at_start = self._read_gauge_fn("nodes") or 0
+
+    def finish_trace(self):
+        with self._lock:
+            if self._trace_started is not None:
+                self._trace_finished = time.monotonic()
+
+    def _read_gauge_fn(self, name):
+        fn = self._gauge_fns.get(name)
+        try:
+            return fn() if fn else None
+        except Exception as e: # A broken gauge must never take down an export
+            print(f"[WARN] Gauge {name} failed: {e}")
+            return None
+
+    # --- Export ---
+
+    def counter_total(self, name):
+        """Sum of counter `name` over all its labels."""
+        with self._lock:
+            return sum(v for (counter, _), v in self._counters.items() if counter == name)
+
+    def trace_seconds(self):
+        if self._trace_started is None:
+            return 0.0
+        return (self._trace_finished or time.monotonic()) - self._trace_started
+
+    def nodes_per_second(self):
+        elapsed = self.trace_seconds()
+        nodes = self._read_gauge_fn("nodes")
+        if not elapsed or nodes is None:
+            return 0.0
+        return (nodes - self._nodes_at_start) / elapsed
+
+    def _copy(self):
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: h.to_dict() for key, h in self._histograms.items()}
+        for name in self._gauge_fns:
+            value = self._read_gauge_fn(name)
+            if value is not None:
+                gauges[(name, ())] = value
+        for name, timed_lock in self._locks.items():
+            histograms[(f"{name}_wait_seconds", ())] = timed_lock.wait.to_dict()
+            counters[(f"{name}_contended", ())] = timed_lock.contended
+        return counters, gauges, histograms
+
+    def _hit_rates(self, counters):
+        """Hit rate per (cache layer, endpoint) from the *_lookups / *_misses counter pairs."""
+        rates = {}
+        for (name, labels), lookups in counters.items():
+            if name.endswith("_lookups") and lookups:
+                misses = counters.get((name[:-len("_lookups")] + "_misses", labels), 0)
+                rates[_metric_key(name[:-len("_lookups")] + "_hit_rate", labels)] = round(1 - misses / lookups, 4)
+        return rates
+
+    def snapshot(self):
+        """Plain-dict view of every metric, suitable for json.dumps."""
+        counters, gauges, histograms = self._copy()
+        return {
+            "timestamp": time.time(),
+            "trace_seconds": round(self.trace_seconds(), 3),
+            "nodes_per_second": round(self.nodes_per_second(), 2),
+            "counters": {_metric_key(name, labels): v for (name, labels), v in sorted(counters.items())},
+            "gauges": {_metric_key(name, labels): v for (name, labels), v in sorted(gauges.items())},
+            "histograms": {_metric_key(name, labels): v for (name, labels), v in sorted(histograms.items())},
+            "hit_rates": self._hit_rates(counters),
+        }
+
+    def to_prometheus(self, prefix="utxo_tracer"):
+        """Metrics in the Prometheus text exposition format."""
+        counters, gauges, histograms = self._copy()
+        gauges[("trace_seconds", ())] = round(self.trace_seconds(), 3)
+        gauges[("nodes_per_second", ())] = round(self.nodes_per_second(), 2)
+        lines = []
+        for (name, labels), value in sorted(counters.items()):
+            lines.append(f"{_metric_key(f'{prefix}_{name}_total', labels)} {value}")
+        for (name, labels), value in sorted(gauges.items()):
+            lines.append(f"{_metric_key(f'{prefix}_{name}', labels)} {value}")
+        with self._lock:
+            raw = dict(self._histograms)
+        for name, timed_lock in self._locks.items():
+            raw[(f"{name}_wait_seconds", ())] = timed_lock.wait
+        for (name, labels), histogram in sorted(raw.items()):
+            cumulative = 0
+            for bound, n in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                cumulative += n
+                lines.append(f"{_metric_key(f'{prefix}_{name}_bucket', labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{_metric_key(f'{prefix}_{name}_sum', labels)} {histogram.sum}")
+            lines.append(f"{_metric_key(f'{prefix}_{name}_count', labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """One line for the console after a trace."""
+        counters, gauges, histograms = self._copy()
+        requests = sum(v for (name, _), v in counters.items() if name == "http_requests")
+        latency = [h for (name, _), h in histograms.items() if name == "http_request_seconds"]
+        p95 = max((h["p95"] for h in latency), default=0.0)
+        lock = histograms.get(("graph_lock_wait_seconds", ()), {})
+        return (f"{requests} requests (p95 {p95 * 1000:.0f} ms), "
+                f"{self.nodes_per_second():.1f} nodes/s over {self.trace_seconds():.1f}s, "
+                f"graph_lock waits {lock.get('sum', 0.0):.3f}s total, "
+                f"hit rates {self._hit_rates(counters) or 'n/a'}")
+
+    def serve_prometheus(self, port=9464, host="127.0.0.1"):
+        """Serve to_prometheus() at http://host:port/metrics from a daemon thread. Returns the server."""
+        stats = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = stats.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"[INFO] Metrics at http://{host}:{server.server_port}/metrics")
+        return server
+
+    def dump_json(self, path):
+        """Write snapshot() to `path` atomically."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def start_json_dump(self, path, interval=10.0):
+        """Rewrite `path` every `interval` seconds from a daemon thread. Set the returned Event to stop."""
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    self.dump_json(path)
+                except OSError as e:
+                    print(f"[WARN] Could not write metrics to {path}: {e}")
+            self.dump_json(path) # Final numbers on stop
+
+        threading.Thread(target=loop, daemon=True).start()
+        return stop
+
+class TraceProfiler:
+    """cProfile across all threads of one trace.
+
+    From Python 3.12 a single profiler sees every thread. Before that each thread
+    needs its own, so tasks are run through run() which keeps one profiler per
+    worker thread; stop() merges them all.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._per_thread = sys.version_info < (3, 12)
+        self._profiles = []
+        self._profiles_lock = threading.Lock()
+        self._local = threading.local()
+
+    def start(self):
+        if not self._per_thread:
+            profile = cProfile.Profile()
+            profile.enable()
+            self._profiles.append(profile)
+
+    def run(self, fn, *args):
+        if not self._per_thread:
+            return fn(*args)
+        profile = getattr(self._local, "profile", None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            self._local.depth = 0
+            with self._profiles_lock:
+                self._profiles.append(profile)
+        # Tasks run inline by the caller nest; only the outermost one may switch this thread's profile
+        # on and off, or an inner disable() would stop profiling the rest of the outer task
+        if self._local.depth == 0:
+            profile.enable()
+        self._local.depth += 1
+        try:
+            return fn(*args)
+        finally:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                profile.disable()
+
+    def stop(self):
+        """Merge the profiles, write them to `path` (for pstats/snakeviz) and return the pstats.Stats."""
+        with self._profiles_lock:
+            profiles = list(self._profiles)
+        for profile in profiles:
+            profile.disable()
+        if not profiles:
+            print("[WARN] Profiler recorded nothing.")
+            return None
+        stats = pstats.Stats(*profiles)
+        stats.dump_stats(self.path)
+        print(f"[INFO] Trace profile written to {self.path} (python -m pstats {self.path})")
+        return stats
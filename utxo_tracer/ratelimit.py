@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every worker that talks to the API.
+
+    `rate` tokens are added per second up to `burst`. The rate adapts: it is
+    halved (down to `min_rate`) whenever the server throttles us and creeps
+    back up towards `max_rate` on every successful request.
+    """
+
+    def __init__(self, rate=5.0, burst=None, min_rate=0.5, max_rate=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.min_rate = min(min_rate, self.rate)
+        self.max_rate = float(max_rate if max_rate is not None else rate)
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def reserve(self):
+        """Consume a token if one is available; otherwise return how long to wait before retrying."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Block until a token is available, then consume it. Returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            wait = self.reserve()
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self):
+        """Like acquire(), but waits with asyncio.sleep so the event loop keeps running."""
+        waited = 0.0
+        while True:
+            wait = self.reserve()
+            if wait <= 0:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + 0.1 * self.max_rate)
+
+    def on_throttled(self, retry_after=None):
+        """Slow down after a 429/503; `retry_after` (seconds) pauses every worker."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
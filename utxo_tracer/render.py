@@ -0,0 +1,386 @@
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+
+class _TextPool:
+    """Text artists of one style, reused from frame to frame.
+    Only as many exist as were ever on screen at once."""
+
+    def __init__(self, ax, **style):
+        self.ax = ax
+        self.style = style
+        self._artists = []
+        self._n_shown = 0
+
+    def show(self, items):
+        """Show one text per (x, y, text) item and hide the rest."""
+        for i, (x, y, text) in enumerate(items):
+            if i == len(self._artists):
+                self._artists.append(self.ax.text(x, y, text, **self.style))
+            artist = self._artists[i]
+            artist.set_position((x, y))
+            artist.set_text(text)
+            artist.set_visible(True)
+        for artist in self._artists[len(items):self._n_shown]:
+            artist.set_visible(False)
+        self._n_shown = len(items)
+
+class GraphRenderer:
+    """Incremental matplotlib renderer for a UTXOStore.
+
+    Rendering is split in two so the graph lock is only held briefly:
+    snapshot() copies what changed since the previous frame (called with the
+    lock held) and draw() updates the existing artists from that copy. Nodes
+    keep the position they were given when first seen; new nodes are placed
+    in their layer next to their parent. Frames are capped at `max_fps`.
+
+    Level of detail: children deeper than `lod_depth` layers or worth less
+    than `lod_min_value` sats are folded into one summary node per parent
+    (number of outputs in the folded subtrees and the BTC that went into them).
+    Clicking a summary unfolds that parent (expand()). Labels are only drawn
+    for what is inside the current view and only while no more than
+    `max_labels` of them would be (summaries keep theirs longest); edge
+    labels need the view zoomed in to `edge_label_span` layout slots across.
+    lod_depth=None and lod_min_value=0 draw every node.
+    """
+
+    def __init__(self, fig, ax, max_fps=4, node_size=2000, x_spacing=1.0, layer_gap=1.0,
+                 lod_depth=4, lod_min_value=0, max_labels=100, edge_label_span=12):
+        self.fig = fig
+        self.ax = ax
+        self.max_fps = max_fps
+        self.node_size = node_size
+        self.x_spacing = x_spacing
+        self.layer_gap = layer_gap
+        self.lod_depth = lod_depth
+        self.lod_min_value = lod_min_value
+        self.max_labels = max_labels
+        self.edge_label_span = edge_label_span
+        self.cmap = plt.get_cmap('plasma' if 'plasma' in plt.colormaps() else 'viridis')
+        self.reset()
+
+    def reset(self):
+        self.positions = np.zeros((0, 2))
+        self._layers = [] # node -> layout layer
+        self._next_free_x = {} # layer -> leftmost free x in that layer
+        self._depths = np.zeros(0)
+        self._values = np.zeros(0, dtype=np.int64)
+        self._edges = np.zeros((0, 2), dtype=int)
+        self._edge_labels = [] # edge -> label text
+        self._labels = [] # node -> label text
+        self._label_script = [] # node -> script type index its label was built with
+        self._parent = [] # node -> layout parent (source of its first edge), -1 for roots
+        self._roots = []
+        self._tree_children = [] # node -> nodes it is the layout parent of
+        self._out_edges = [] # node -> ids of its outgoing edges
+        self._subtree_size = [] # node -> outputs in its layout subtree, itself included
+        self.expanded = set() # Parents whose children are never folded
+        # What is on screen, rebuilt by _build_frame()
+        self._shown = np.zeros(0, dtype=int)
+        self._shown_set = set()
+        self._shown_edges = np.zeros(0, dtype=int)
+        self._summary_parents = []
+        self._summary_index = {} # parent -> index into _summary_parents
+        self._summary_positions = np.zeros((0, 2))
+        self._summary_labels = []
+        self._node_artist = None
+        self._summary_artist = None
+        self._edge_artist = None
+        self._summary_edge_artist = None
+        self._texts = None
+        self._notification = None
+        self._notification_node = None
+        self._fitting = False
+        self._user_view = False # Set once the user zooms or pans; new nodes then stop refitting the view
+        self._last_frame = 0.0
+
+    # --- Frame pacing ---
+
+    def frame_due(self):
+        return time.monotonic() - self._last_frame >= 1.0 / self.max_fps
+
+    # --- Snapshot (graph lock held) ---
+
+    def snapshot(self, store):
+        """Copy the parts of `store` that changed since the last snapshot: new nodes and edges, and the
+        older nodes whose value, script type or depth changed (UTXOStore.take_dirty()), so the time spent
+        here follows what changed, not the graph size. Call with the graph lock held."""
+        n_known = len(self._label_script)
+        n_nodes = len(store)
+        new_edges = store.edges_since(len(self._edges))
+        changed = store.take_dirty(n_known)
+        changed.extend(range(n_known, n_nodes))
+        records = [store.records[node] for node in changed]
+        depths = [record.depth for record in records]
+        values = [record.value for record in records]
+        label_changes = {
+            node: (store.label(node), record.script_type)
+            for node, record in zip(changed, records)
+            if node >= n_known or self._label_script[node] != record.script_type
+        }
+        edge_labels = [store.edge_label(dst) for _, dst in new_edges]
+        return n_nodes, new_edges, edge_labels, changed, depths, values, label_changes
+
+    # --- Drawing (no lock needed) ---
+
+    def draw(self, snapshot, title, notification_node=None):
+        n_nodes, new_edges, edge_labels, changed, depths, values, label_changes = snapshot
+        n_old = len(self.positions)
+
+        if n_nodes > len(self._depths):
+            self._depths = np.concatenate([self._depths, np.zeros(n_nodes - len(self._depths))])
+            self._values = np.concatenate([self._values, np.full(n_nodes - len(self._values), -1, dtype=np.int64)])
+        if changed:
+            self._depths[changed] = np.maximum(np.asarray(depths, dtype=float), 0)
+            self._values[changed] = values
+        self._place_new_nodes(n_old, n_nodes, new_edges)
+        self._add_edges(new_edges, edge_labels)
+        for node, (label, script_type) in label_changes.items():
+            self._labels[node] = label
+            self._label_script[node] = script_type
+        if notification_node is not None and notification_node < n_nodes:
+            self._notification_node = notification_node
+
+        self._create_artists()
+        self._build_frame()
+        if not self._user_view:
+            self._fit_view()
+        self._update_artists()
+        self.ax.set_title(title, fontsize=10)
+        self.fig.canvas.draw_idle()
+        self._last_frame = time.monotonic()
+
+    def _create_artists(self):
+        if self._node_artist is not None:
+            return
+        ax = self.ax
+        ax.clear()
+        ax.axis("off")
+        ax.set_autoscale_on(False) # Limits only change through _fit_view() or the user
+        self._edge_artist = LineCollection([], colors='gray', linewidths=1.5, zorder=1)
+        self._summary_edge_artist = LineCollection([], colors='gray', linewidths=1.0, linestyles='dashed', zorder=1)
+        ax.add_collection(self._edge_artist)
+        ax.add_collection(self._summary_edge_artist)
+        self._node_artist = ax.scatter([], [], s=self.node_size, zorder=2)
+        self._summary_artist = ax.scatter([], [], s=self.node_size, marker='s', facecolors='lightgray',
+                                          edgecolors='dimgray', zorder=2)
+        self._texts = {
+            'node': _TextPool(ax, ha='center', va='center', fontsize=8, zorder=3, clip_on=True),
+            'summary': _TextPool(ax, ha='center', va='center', fontsize=8, weight='bold', zorder=3, clip_on=True),
+            'edge': _TextPool(ax, ha='center', va='center', fontsize=7, zorder=3, clip_on=True,
+                              bbox=dict(boxstyle="round,pad=0.1", fc="white", ec="none")),
+        }
+        self._notification = ax.text(0, 0, "unspendddd!!", ha='center', va='bottom', fontsize=10,
+                                     color='darkred', weight='bold', visible=False, zorder=4,
+                                     bbox=dict(boxstyle="round,pad=0.4", fc="lightyellow", ec="orange",
+                                               alpha=0.85, lw=1.5))
+        # ax.clear() drops callbacks, so (re)connect after it
+        ax.callbacks.connect('xlim_changed', self._on_limits_changed)
+        ax.callbacks.connect('ylim_changed', self._on_limits_changed)
+
+    def _place_new_nodes(self, n_old, n_nodes, new_edges):
+        """Give positions to nodes n_old..n_nodes-1 without moving any existing node."""
+        if n_nodes <= n_old:
+            return
+        parent_of = {}
+        for src, dst in new_edges:
+            if dst >= n_old and dst not in parent_of:
+                parent_of[dst] = src
+        siblings = {} # parent -> number of new children
+        sibling_index = {} # new child -> its position among them
+        for dst, src in parent_of.items():
+            sibling_index[dst] = siblings.get(src, 0)
+            siblings[src] = sibling_index[dst] + 1
+
+        new_positions = np.zeros((n_nodes - n_old, 2))
+        self.positions = np.vstack([self.positions, new_positions])
+        for node in range(n_old, n_nodes): # Parents always have lower ids than their children
+            parent = parent_of.get(node)
+            if parent is None:
+                layer = int(self._depths[node])
+                target_x = 0.0
+                self._roots.append(node)
+            else:
+                layer = self._layers[parent] + 1
+                offset = sibling_index[node] - (siblings[parent] - 1) / 2
+                target_x = self.positions[parent][0] + offset * self.x_spacing
+                self._tree_children[parent].append(node)
+            x = max(target_x, self._next_free_x.get(layer, target_x))
+            self._next_free_x[layer] = x + self.x_spacing
+            self._layers.append(layer)
+            self.positions[node] = (x, -layer * self.layer_gap)
+            self._parent.append(-1 if parent is None else parent)
+            self._tree_children.append([])
+            self._out_edges.append([])
+            self._subtree_size.append(1)
+            self._labels.append("")
+            self._label_script.append(None)
+            while parent is not None and parent != -1: # O(depth) per new node
+                self._subtree_size[parent] += 1
+                parent = self._parent[parent]
+
+    def _add_edges(self, new_edges, edge_labels):
+        if not new_edges:
+            return
+        first = len(self._edges)
+        self._edges = np.vstack([self._edges, np.asarray(new_edges, dtype=int)])
+        for edge, (src, _) in enumerate(new_edges, start=first):
+            self._out_edges[src].append(edge)
+        self._edge_labels.extend(edge_labels)
+
+    # --- Level of detail ---
+
+    def _folds(self, parent, child):
+        if parent in self.expanded:
+            return False
+        if self.lod_depth is not None and self._layers[child] > self.lod_depth:
+            return True
+        return 0 <= self._values[child] < self.lod_min_value # Unknown values (-1) are never folded
+
+    def _build_frame(self):
+        """Pick the nodes, edges and summaries to draw by walking down from the roots.
+        Folded subtrees are never entered, so the cost follows what is shown, not the graph size."""
+        shown = []
+        summaries = [] # (parent, its folded children)
+        stack = list(reversed(self._roots))
+        while stack:
+            node = stack.pop()
+            shown.append(node)
+            kept, folded = [], []
+            for child in self._tree_children[node]:
+                (folded if self._folds(node, child) else kept).append(child)
+            if folded:
+                summaries.append((node, folded))
+            stack.extend(reversed(kept))
+
+        self._shown = np.asarray(shown, dtype=int)
+        self._shown_set = set(shown)
+        self._shown_edges = np.asarray([edge for node in shown for edge in self._out_edges[node]
+                                        if self._edges[edge, 1] in self._shown_set], dtype=int)
+        self._summary_parents = [parent for parent, _ in summaries]
+        self._summary_index = {parent: i for i, parent in enumerate(self._summary_parents)}
+        self._summary_positions = np.zeros((len(summaries), 2))
+        self._summary_labels = []
+        for i, (parent, folded) in enumerate(summaries):
+            count = sum(self._subtree_size[child] for child in folded)
+            total = sum(int(self._values[child]) for child in folded if self._values[child] >= 0)
+            self._summary_positions[i] = self.positions[folded].mean(axis=0)
+            self._summary_labels.append(f"{count} output{'s' if count != 1 else ''}\n{total / 1e8:.8f} BTC")
+
+    def expand(self, parent):
+        """Unfold the children of `parent`. Returns True if that changed anything (call draw() again)."""
+        if parent in self.expanded:
+            return False
+        self.expanded.add(parent)
+        return True
+
+    def collapse(self, parent):
+        """Fold the children of a previously expanded `parent` back into a summary."""
+        if parent not in self.expanded:
+            return False
+        self.expanded.discard(parent)
+        return True
+
+    def _anchor(self, node):
+        """Where `node` is drawn: its own position, or the summary it is folded into."""
+        child = None
+        while node != -1 and node not in self._shown_set:
+            child, node = node, self._parent[node]
+        if node == -1:
+            return None
+        if child is None:
+            return self.positions[node]
+        return self._summary_positions[self._summary_index[node]]
+
+    # --- Artists ---
+
+    def _update_artists(self):
+        """Push positions of the current frame into the artists."""
+        shown_positions = self.positions[self._shown]
+        max_depth = self._depths.max() if len(self._depths) else 0
+        depths = self._depths[self._shown]
+        self._node_artist.set_offsets(shown_positions)
+        self._node_artist.set_facecolors(self.cmap(depths / max_depth if max_depth > 0 else depths))
+        self._summary_artist.set_offsets(self._summary_positions)
+
+        edges = self._edges[self._shown_edges]
+        self._edge_artist.set_segments(np.stack([self.positions[edges[:, 0]], self.positions[edges[:, 1]]], axis=1)
+                                       if len(edges) else [])
+        self._summary_edge_artist.set_segments(
+            np.stack([self.positions[self._summary_parents], self._summary_positions], axis=1)
+            if self._summary_parents else [])
+
+        anchor = self._anchor(self._notification_node) if self._notification_node is not None else None
+        if anchor is not None:
+            self._notification.set_position((anchor[0], anchor[1] + 0.3 * self.layer_gap))
+        self._notification.set_visible(anchor is not None)
+        self._update_texts()
+
+    def _update_texts(self):
+        """Label only what is inside the current view (the only part of the text cost that grows with the graph)."""
+        (x0, x1), (y0, y1) = sorted(self.ax.get_xlim()), sorted(self.ax.get_ylim())
+
+        def in_view(points):
+            return (points[:, 0] >= x0) & (points[:, 0] <= x1) & (points[:, 1] >= y0) & (points[:, 1] <= y1)
+
+        nodes = self._shown[in_view(self.positions[self._shown])]
+        summaries = np.flatnonzero(in_view(self._summary_positions))
+        # Too crowded to read anyway: drop node labels first, then summary labels
+        if len(nodes) + len(summaries) > self.max_labels:
+            nodes = nodes[:0]
+        if len(summaries) > self.max_labels:
+            summaries = summaries[:0]
+        self._texts['summary'].show([(*self._summary_positions[i], self._summary_labels[i]) for i in summaries])
+        self._texts['node'].show([(*self.positions[node], self._labels[node]) for node in nodes])
+
+        edge_items = []
+        if x1 - x0 <= self.edge_label_span * self.x_spacing and len(self._shown_edges):
+            edges = self._edges[self._shown_edges]
+            midpoints = (self.positions[edges[:, 0]] + self.positions[edges[:, 1]]) / 2
+            in_view_edges = np.flatnonzero(in_view(midpoints))
+            if len(in_view_edges) <= self.max_labels:
+                edge_items = [(*midpoints[i], self._edge_labels[self._shown_edges[i]]) for i in in_view_edges]
+        self._texts['edge'].show(edge_items)
+
+    def _on_limits_changed(self, ax):
+        if self._fitting:
+            return
+        self._user_view = True # Zoomed or panned: keep the user's view from now on
+        self._update_texts()
+        self.fig.canvas.draw_idle()
+
+    def _fit_view(self):
+        points = np.vstack([self.positions[self._shown], self._summary_positions])
+        if not len(points):
+            return
+        (x_min, y_min), (x_max, y_max) = points.min(axis=0), points.max(axis=0)
+        pad_x = max(self.x_spacing, 0.05 * (x_max - x_min)) # Big graphs need more than one slot of margin
+        pad_y = max(self.layer_gap, 0.05 * (y_max - y_min))
+        self._fitting = True
+        try:
+            self.ax.set_xlim(x_min - pad_x, x_max + pad_x)
+            self.ax.set_ylim(y_min - pad_y, y_max + pad_y)
+        finally:
+            self._fitting = False
+
+    # --- Interaction ---
+
+    def node_at(self, event):
+        """Node id under a mouse event, or None."""
+        if self._node_artist is None:
+            return None
+        contains, info = self._node_artist.contains(event)
+        return int(self._shown[info['ind'][0]]) if contains and len(info['ind']) else None
+
+    def summary_at(self, event):
+        """Parent of the summary node under a mouse event, or None."""
+        if self._summary_artist is None:
+            return None
+        contains, info = self._summary_artist.contains(event)
+        return self._summary_parents[info['ind'][0]] if contains and len(info['ind']) else None
+
+    def move_node(self, node, x, y):
+        self.positions[node] = (x, y)
+        self._update_artists()
+        self.fig.canvas.draw_idle()
@@ -0,0 +1,261 @@
+from array import array
+
+UNKNOWN = -2 # spent_by: outspends not checked yet
+UNSPENT = -1 # spent_by: checked and unspent; values >= 0 are interned spending txids
+
+class OutpointRecord:
+    """Per-output state. Everything else (labels, tx JSON) is derived on demand."""
+    __slots__ = ("value", "script_type", "depth", "spent_by", "in_offset")
+
+    def __init__(self):
+        self.value = -1 # sats, -1 until known
+        self.script_type = 0 # index into UTXOStore.script_types
+        self.depth = -1
+        self.spent_by = UNKNOWN
+        self.in_offset = -1 # sats of the spending tx's inputs before this one, -1 if unknown
+
+class UTXOStore:
+    """Compact graph of traced outputs keyed by integer-interned outpoints.
+
+    Node ids are dense ints handed out in discovery order. Txids and script
+    types are interned once; an outpoint is keyed by the single int
+    txid_index << 32 | vout. Edges (parent output -> output of the tx that
+    spends it) live in flat arrays with a per-node linked list of outgoing
+    edges. Callers are expected to hold UTXOGraph.graph_lock while mutating it.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._txids = [] # txid index -> txid
+        self._txid_index = {} # txid -> txid index
+        self.script_types = ["unknown"]
+        self._script_type_index = {"unknown": 0}
+        self._node_index = {} # txid index << 32 | vout -> node id
+        self._node_txid = array("l") # node id -> txid index
+        self._node_vout = array("l") # node id -> vout
+        self.records = [] # node id -> OutpointRecord
+        self._visited = bytearray() # node id -> 1 once claimed by a worker
+        self._input_totals = {} # txid index -> sats of all inputs of that (spending) tx
+        self._visited_count = 0
+        self._first_edge = array("l") # node id -> first outgoing edge id, -1 if none
+        self._edge_dst = array("l") # edge id -> destination node id
+        self._edge_next = array("l") # edge id -> next outgoing edge of the same source, -1 at the end
+        self._edge_src = array("l") # edge id -> source node id
+        self._dirty = set() # node ids below _tracked whose value, script type or depth changed (see take_dirty())
+        self._tracked = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, outpoint):
+        return self.find(*outpoint) is not None
+
+    def num_edges(self):
+        return len(self._edge_dst)
+
+    def visited_count(self):
+        return self._visited_count
+
+    # --- Interning ---
+
+    def intern_txid(self, txid):
+        idx = self._txid_index.get(txid)
+        if idx is None:
+            idx = self._txid_index[txid] = len(self._txids)
+            self._txids.append(txid)
+        return idx
+
+    def intern_script_type(self, script_type):
+        idx = self._script_type_index.get(script_type)
+        if idx is None:
+            idx = self._script_type_index[script_type] = len(self.script_types)
+            self.script_types.append(script_type)
+        return idx
+
+    def intern(self, txid, vout):
+        """Return the node id for an outpoint, creating it if needed."""
+        txid_index = self.intern_txid(txid)
+        key = txid_index << 32 | vout
+        node = self._node_index.get(key)
+        if node is None:
+            node = len(self.records)
+            self._node_txid.append(txid_index)
+            self._node_vout.append(vout)
+            self.records.append(OutpointRecord())
+            self._visited.append(0)
+            self._first_edge.append(-1)
+            self._node_index[key] = node # Published last, so a lock-free find() never sees a half-built node
+        return node
+
+    def find(self, txid, vout):
+        """Node id of an outpoint, or None. Safe without the graph lock (single dict lookups)."""
+        idx = self._txid_index.get(txid)
+        return None if idx is None else self._node_index.get(idx << 32 | vout)
+
+    def outpoint(self, node):
+        return self._txids[self._node_txid[node]], self._node_vout[node]
+
+    def txid(self, node):
+        return self._txids[self._node_txid[node]]
+
+    # --- Per-node state ---
+
+    def set_output(self, node, value, script_type):
+        record = self.records[node]
+        script_type = self.intern_script_type(script_type)
+        if record.value != value or record.script_type != script_type:
+            record.value = value
+            record.script_type = script_type
+            self._touch(node)
+
+    def set_depth(self, node, depth):
+        self.records[node].depth = depth
+        self._touch(node)
+
+    def script_type(self, node):
+        return self.script_types[self.records[node].script_type]
+
+    def set_spent_by(self, node, spending_txid):
+        self.records[node].spent_by = UNSPENT if spending_txid is None else self.intern_txid(spending_txid)
+
+    def spent_by(self, node):
+        """Spending txid, or None if unspent or not checked yet."""
+        spent_by = self.records[node].spent_by
+        return self._txids[spent_by] if spent_by >= 0 else None
+
+    def set_input_position(self, node, spending_txid, in_offset, input_total):
+        """Where this output sits among the inputs of its spending tx, in sats (-1 if unknown). Used by taint.py."""
+        self.records[node].in_offset = in_offset
+        if input_total >= 0:
+            self._input_totals[self.intern_txid(spending_txid)] = input_total
+
+    def claim(self, node):
+        """Mark a node as visited; False if it already was."""
+        if self._visited[node]:
+            return False
+        self._visited[node] = 1
+        self._visited_count += 1
+        return True
+
+    def unclaim(self, node):
+        if self._visited[node]:
+            self._visited[node] = 0
+            self._visited_count -= 1
+
+    def is_visited(self, node):
+        return bool(self._visited[node])
+
+    # --- Change tracking ---
+
+    def _touch(self, node):
+        if node < self._tracked: # Nodes added since the last take_dirty() are read in full anyway
+            self._dirty.add(node)
+
+    def take_dirty(self, n_known):
+        """Ids below n_known whose value, script type or depth changed since the previous call.
+        For incremental readers such as render.GraphRenderer.snapshot(), which read nodes n_known and
+        up in full; headless runs never call it, so nothing is tracked. Call with the graph lock held."""
+        dirty = [node for node in self._dirty if node < n_known]
+        self._dirty = set()
+        self._tracked = len(self.records)
+        return dirty
+
+    # --- Edges ---
+
+    def link_outputs(self, src, dsts):
+        """Add src -> dst for every output of the tx that spends src, unless src is linked already.
+        All outputs of a spend are linked in one call, so src has either all of them or none,
+        and this takes O(1) however many outputs the tx has. Returns True if the edges were added."""
+        if self._first_edge[src] != -1:
+            return False
+        for dst in dsts:
+            self.add_edge(src, dst)
+        return True
+
+    def add_edge(self, src, dst):
+        """Append src -> dst. Doesn't check for duplicates; use link_outputs()."""
+        edge = len(self._edge_dst)
+        self._edge_src.append(src)
+        self._edge_dst.append(dst)
+        self._edge_next.append(self._first_edge[src])
+        self._first_edge[src] = edge
+        return True
+
+    def children(self, node):
+        result = []
+        edge = self._first_edge[node]
+        while edge != -1:
+            result.append(self._edge_dst[edge])
+            edge = self._edge_next[edge]
+        return result
+
+    def edges(self):
+        """Iterate (src, dst) pairs in insertion order."""
+        return zip(self._edge_src, self._edge_dst)
+
+    def edges_since(self, start):
+        """(src, dst) pairs of the edges added after the first `start` ones."""
+        return list(zip(self._edge_src[start:], self._edge_dst[start:]))
+
+    # --- Persistence ---
+
+    def to_state(self):
+        """Plain lists/ints describing the whole store (for checkpoint.py). Call with the graph lock held."""
+        return {
+            "txids": list(self._txids),
+            "script_types": list(self.script_types),
+            "nodes": [[txid, vout, r.value, r.script_type, r.depth, r.spent_by, visited, r.in_offset]
+                      for txid, vout, r, visited in zip(self._node_txid, self._node_vout, self.records, self._visited)],
+            "edges": [list(edge) for edge in self.edges()],
+            "input_totals": [[txid, total] for txid, total in self._input_totals.items()],
+        }
+
+    def load_state(self, state):
+        """Replace the contents with a to_state() dict. Node ids are preserved."""
+        self.clear()
+        for txid in state["txids"]:
+            self.intern_txid(txid)
+        for script_type in state["script_types"]:
+            self.intern_script_type(script_type)
+        for txid_index, vout, value, script_type, depth, spent_by, visited, *rest in state["nodes"]:
+            node = self.intern(self._txids[txid_index], vout)
+            record = self.records[node]
+            record.value, record.script_type, record.depth, record.spent_by = value, script_type, depth, spent_by
+            record.in_offset = rest[0] if rest else -1 # Older checkpoints have no input positions
+            if visited: self.claim(node)
+        for src, dst in state["edges"]:
+            self.add_edge(src, dst)
+        self._input_totals.update((txid, total) for txid, total in state.get("input_totals", []))
+
+    def columns(self):
+        """Copies of the per-node, per-txid and per-edge columns as flat arrays, for vectorized analysis
+        with numpy (see taint.py). Call with the graph lock held."""
+        return {
+            "txid": array("l", self._node_txid), # node -> txid index
+            "vout": array("l", self._node_vout),
+            "value": array("q", [record.value for record in self.records]),
+            "in_offset": array("q", [record.in_offset for record in self.records]),
+            "input_total": array("q", [self._input_totals.get(txid, -1) for txid in range(len(self._txids))]),
+            "edge_src": array("l", self._edge_src),
+            "edge_dst": array("l", self._edge_dst),
+        }
+
+    # --- Rendering helpers ---
+
+    def label(self, node):
+        txid, vout = self.outpoint(node)
+        return f"{txid[:8]}:{vout} ({self.script_type(node)})"
+
+    def edge_label(self, dst):
+        value = self.records[dst].value
+        return f"{value / 1e8:.8f} BTC" if value >= 0 else ""
+
+    def to_networkx(self):
+        """Build a networkx.DiGraph over node ids, e.g. for layout or ad-hoc analysis."""
+        import networkx as nx
+        graph = nx.DiGraph()
+        graph.add_nodes_from(range(len(self.records)))
+        graph.add_edges_from(self.edges())
+        return graph
@@ -0,0 +1,157 @@
+"""Value-flow (taint) analysis: how many sats of the seed output reached each traced output.
+
+The spend edges of a UTXOStore become one sparse matrix W (node x node), where
+W[parent, child] is the fraction of the parent's tainted sats that moves into the
+child. The seed's value is then pushed down the DAG one level at a time, each
+level a batch of rows of W. Two attribution rules:
+
+    proportional  every output of a spending tx gets the tx's tainted fraction:
+                  W = child value / total input value of the spending tx
+    fifo          inputs and outputs are laid end to end in tx order, and a parent's
+                  sats go to the outputs they overlap: W = overlap / parent value
+
+Fees keep the rest, so taint never grows along the way. Both rules use the input
+positions recorded while tracing (UTXOStore.set_input_position). Spends traced
+without them, i.e. on block-file backends whose txs carry no prevouts or from
+older checkpoints, fall back to proportional over the outputs' total.
+
+Usage:
+    python -m utxo_tracer.taint utxo_checkpoint.json --rule fifo
+"""
+import argparse
+import json
+import sys
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+from .store import UTXOStore
+
+RULES = ("proportional", "fifo")
+
+def edge_weights(columns, rule="proportional"):
+    """(src, dst, weight) arrays for the spend edges in `columns` (from UTXOStore.columns())."""
+    if rule not in RULES:
+        raise ValueError(f"Unknown taint rule {rule!r}; expected one of {RULES}")
+    txid = np.asarray(columns["txid"], dtype=np.int64)
+    value = np.maximum(np.asarray(columns["value"], dtype=np.float64), 0) # -1 (unknown) carries nothing
+    input_total = np.asarray(columns["input_total"], dtype=np.float64)
+    src = np.asarray(columns["edge_src"], dtype=np.int64)
+    dst = np.asarray(columns["edge_dst"], dtype=np.int64)
+    if not len(src):
+        return src, dst, np.zeros(0)
+
+    spender = txid[dst] # The tx that spends src and creates dst
+    output_total = np.bincount(txid, weights=value, minlength=len(input_total))
+    denominator = np.where(input_total[spender] > 0, input_total[spender], output_total[spender])
+    weight = np.divide(value[dst], denominator, out=np.zeros(len(dst)), where=denominator > 0)
+    if rule == "proportional":
+        return src, dst, weight
+
+    # FIFO: offset of every output within its tx is the running total over the tx's outputs in vout order
+    vout = np.asarray(columns["vout"], dtype=np.int64)
+    order = np.lexsort((vout, txid))
+    before = np.cumsum(value[order]) - value[order]
+    tx_start = np.r_[True, txid[order][1:] != txid[order][:-1]]
+    out_offset = np.empty(len(value))
+    out_offset[order] = before - before[tx_start][np.cumsum(tx_start) - 1]
+
+    in_offset = np.asarray(columns["in_offset"], dtype=np.float64)[src]
+    src_value = value[src]
+    start = np.maximum(in_offset, out_offset[dst])
+    end = np.minimum(in_offset + src_value, out_offset[dst] + value[dst])
+    fifo = np.divide(np.maximum(end - start, 0), src_value, out=np.zeros(len(src)), where=src_value > 0)
+    return src, dst, np.where(in_offset >= 0, fifo, weight) # Unknown input position: proportional
+
+def taint_matrix(columns, rule="proportional"):
+    """Sparse W with W[parent, child] = share of the parent's taint that moves into the child."""
+    n = len(columns["value"])
+    src, dst, weight = edge_weights(columns, rule)
+    return sparse.csr_matrix((weight, (src, dst)), shape=(n, n))
+
+def propagate(columns, seed_node=0, rule="proportional", amount=None):
+    """Tainted sats per node id (float array) when `amount` sats (default: the seed output's value)
+    start at seed_node. Walks the spend DAG below the seed level by level in topological order,
+    one batch of sparse rows per level, so every edge is touched once."""
+    n = len(columns["value"])
+    w = taint_matrix(columns, rule)
+    indptr, indices, data = w.indptr, w.indices, w.data
+    total = np.zeros(n)
+    total[seed_node] = amount if amount is not None else max(columns["value"][seed_node], 0)
+
+    # Indegree over the part reachable from the seed: a node moves on once all its tainted parents have
+    reachable = np.zeros(n, dtype=bool)
+    reachable[csgraph.breadth_first_order(w, seed_node, return_predecessors=False)] = True
+    out_degree = np.diff(indptr)
+    pending = np.bincount(indices[np.repeat(reachable, out_degree)], minlength=n)
+
+    frontier = np.array([seed_node])
+    while frontier.size:
+        edges = _row_edges(indptr, frontier)
+        children = indices[edges]
+        np.add.at(total, children, data[edges] * np.repeat(total[frontier], out_degree[frontier]))
+        np.subtract.at(pending, children, 1)
+        frontier = np.unique(children[pending[children] == 0])
+    return total
+
+def _row_edges(indptr, rows):
+    """Positions in a CSR matrix's indices/data of all entries in `rows`."""
+    starts, lengths = indptr[rows], indptr[rows + 1] - indptr[rows]
+    ends = np.cumsum(lengths)
+    return np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - (ends - lengths), lengths)
+
+def leaf_taint(graph, rule="proportional", amount=None):
+    """The entries of graph.unspent_utxos_found, each with `tainted_sats` and `taint_share` (of the seed
+    output, or of `amount`) added. Only copying the columns holds the graph lock."""
+    with graph.graph_lock:
+        seed_node = graph.store.find(*graph.seed) if graph.seed else 0
+        leaves = [(dict(entry), graph.store.find(entry['txid'], entry['vout'])) for entry in graph.unspent_utxos_found]
+        columns = graph.store.columns()
+    if seed_node is None or not len(columns["value"]):
+        return [entry for entry, _ in leaves]
+    return _attach_taint(columns, seed_node, leaves, rule, amount)
+
+def _attach_taint(columns, seed_node, leaves, rule, amount):
+    taint = propagate(columns, seed_node, rule, amount)
+    origin = amount if amount is not None else max(columns["value"][seed_node], 0)
+    for entry, node in leaves:
+        tainted = taint[node] if node is not None else 0.0
+        entry['tainted_sats'] = int(round(tainted))
+        entry['taint_share'] = tainted / origin if origin else 0.0
+    return [entry for entry, _ in leaves]
+
+def checkpoint_leaf_taint(path, rule="proportional", amount=None):
+    """leaf_taint() for a checkpoint file written by UTXOGraph.save_checkpoint()."""
+    with open(path) as f:
+        state = json.load(f)
+    store = UTXOStore()
+    store.load_state(state)
+    seed_node = store.find(*state["seed"]) if state.get("seed") else 0
+    leaves = []
+    for node in state["unspent"]:
+        txid, vout = store.outpoint(node)
+        record = store.records[node]
+        leaves.append(({'txid': txid, 'vout': vout, 'script_type': store.script_type(node),
+                        'value': record.value, 'depth': record.depth}, node))
+    return _attach_taint(store.columns(), seed_node, leaves, rule, amount)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Attribute the seed's value to the unspent outputs of a checkpoint.")
+    parser.add_argument("checkpoint", help="checkpoint JSON written while tracing (checkpoint_path)")
+    parser.add_argument("--rule", choices=RULES, default="proportional")
+    parser.add_argument("--amount", type=int, default=None, help="sats to trace from the seed (default: its value)")
+    parser.add_argument("--json", action="store_true", help="print one JSON line per leaf")
+    args = parser.parse_args(argv)
+
+    leaves = sorted(checkpoint_leaf_taint(args.checkpoint, args.rule, args.amount),
+                    key=lambda entry: -entry['tainted_sats'])
+    for entry in leaves:
+        if args.json:
+            print(json.dumps(entry))
+        else:
+            print(f"{entry['txid']}:{entry['vout']}  {entry['tainted_sats'] / 1e8:.8f} BTC "
+                  f"({entry['taint_share']:.4%}) of {entry['value'] / 1e8:.8f} BTC, depth {entry['depth']}")
+    total = sum(entry['tainted_sats'] for entry in leaves)
+    print(f"{len(leaves)} unspent output(s) hold {total / 1e8:.8f} BTC of the seed ({args.rule}).", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
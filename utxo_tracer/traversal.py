@@ -0,0 +1,119 @@
+import heapq
+import itertools
+import threading
+import time
+
+# Scoring functions take (value_sats, depth) and return a score; higher scores are traced first.
+# value_sats is -1 when the value is unknown.
+
+def score_by_value(value, depth):
+    """Follow the money: biggest outputs first."""
+    return value
+
+def score_by_depth(value, depth):
+    """Shallowest first, i.e. breadth-first like the unbudgeted trace."""
+    return -depth
+
+def score_by_value_per_hop(value, depth):
+    """Big outputs first, discounted by how far they are from the seed."""
+    return value / (depth + 1)
+
+SCORERS = {
+    "value": score_by_value,
+    "depth": score_by_depth,
+    "value_per_hop": score_by_value_per_hop,
+}
+
+def resolve_scorer(priority):
+    """A scoring function from a SCORERS name or a callable(value_sats, depth)."""
+    if callable(priority):
+        return priority
+    if priority not in SCORERS:
+        raise ValueError(f"Unknown priority {priority!r}; use one of {', '.join(SCORERS)} or a callable")
+    return SCORERS[priority]
+
+class TraceBudget:
+    """Hard limits for one trace (or refresh); None disables a limit.
+
+    max_requests counts HTTP requests (retries included), max_nodes the outputs in the
+    graph and max_wall_time seconds since the trace started. Outputs worth less than
+    min_value sats are never traced. Budgets are checked whenever work is taken from the
+    frontier, so tasks already running may overshoot by up to one request pair each.
+    """
+
+    def __init__(self, max_requests=None, max_nodes=None, max_wall_time=None, min_value=None):
+        self.max_requests = max_requests
+        self.max_nodes = max_nodes
+        self.max_wall_time = max_wall_time
+        self.min_value = min_value
+        self._started = None
+        self._requests_at_start = 0
+
+    def start(self, stats):
+        self._started = time.monotonic()
+        self._requests_at_start = stats.counter_total("http_requests")
+
+    def below_min_value(self, value):
+        return self.min_value is not None and 0 <= value < self.min_value
+
+    def exhausted(self, stats, num_nodes):
+        """Why the budget is spent, or None if there is budget left."""
+        if self.max_nodes is not None and num_nodes >= self.max_nodes:
+            return f"max_nodes={self.max_nodes} reached"
+        if self.max_requests is not None:
+            used = stats.counter_total("http_requests") - self._requests_at_start
+            if used >= self.max_requests:
+                return f"max_requests={self.max_requests} reached"
+        if self.max_wall_time is not None and self._started is not None:
+            if time.monotonic() - self._started >= self.max_wall_time:
+                return f"max_wall_time={self.max_wall_time}s reached"
+        return None
+
+class PriorityFrontier:
+    """Thread-safe best-first queue of outputs to trace, with a cap on how many run at once.
+
+    Entries are (txid, vout, depth, value_sats) tuples. Ties are broken by insertion order.
+    """
+
+    def __init__(self, score, max_in_flight):
+        self.score = score
+        self.max_in_flight = max(1, max_in_flight)
+        self.in_flight = 0
+        self.exhausted_reason = None # Set once the budget ran out
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, txid, vout, depth, value):
+        entry = (txid, vout, depth, value)
+        with self._lock:
+            heapq.heappush(self._heap, (-self.score(value, depth), next(self._counter), entry))
+
+    def take(self, exhausted=None):
+        """Pop the entries that may start now and count them as in flight.
+
+        Returns (ready, dropped). Once `exhausted()` returns a reason, every queued entry
+        is dropped instead, and so is anything pushed later.
+        """
+        with self._lock:
+            if not self._heap:
+                return [], []
+            if self.exhausted_reason is None and exhausted is not None:
+                self.exhausted_reason = exhausted()
+            if self.exhausted_reason:
+                dropped = [entry for _, _, entry in self._heap]
+                self._heap.clear()
+                return [], dropped
+            ready = []
+            while self._heap and self.in_flight < self.max_in_flight:
+                ready.append(heapq.heappop(self._heap)[2])
+                self.in_flight += 1
+            return ready, []
+
+    def done(self):
+        """An entry returned by take() has finished."""
+        with self._lock:
+            self.in_flight -= 1
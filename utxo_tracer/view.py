@@ -0,0 +1,109 @@
+"""Matplotlib front end for a UTXOGraph: drawing surface, node dragging and frame pacing.
+
+UTXOGraph only imports this module from set_active_drawing_surface(), so headless
+tracing (batch workers, scripts, benchmarks without rendering) never loads
+matplotlib or numpy.
+"""
+import time
+from .render import GraphRenderer
+
+class GraphView:
+    """Owns the figure/axes of one UTXOGraph and turns its queued UI updates into frames."""
+
+    def __init__(self, graph, fig, ax, max_fps=4, **render_options):
+        self.graph = graph
+        self.fig = fig
+        self.ax = ax
+        self.renderer = GraphRenderer(fig, ax, max_fps=max_fps, **render_options)
+        self._render_pending = False
+        self._pending_notification_node = None
+        self._pending_message = None
+        self._dragged_node = None
+        self.connect_interactive_events()
+
+    def connect_interactive_events(self):
+        self.fig.canvas.mpl_connect('button_press_event', self.on_button_press)
+        self.fig.canvas.mpl_connect('motion_notify_event', self.on_motion_notify)
+        self.fig.canvas.mpl_connect('button_release_event', self.on_button_release)
+
+    def reset(self):
+        self._dragged_node = None
+        self.renderer.reset()
+        self._render_pending = False
+        self._pending_notification_node = None
+        self._pending_message = None
+
+    def process_ui_updates(self):
+        """Called by the main thread to process UI updates and visualize.
+
+        Every queued update is drained and merged, but a frame is only drawn when the renderer's
+        max_fps allows it; otherwise the merged state waits for the next call. Returns True if a frame was drawn.
+        """
+        graph = self.graph
+        for update in graph._drain_ui_updates():
+            self._render_pending = True
+            data = update.get('data', {})
+            update_type = update.get('type')
+
+            if update_type == 'unspent_notification':
+                self._pending_notification_node = data.get('node')
+                self._pending_message = data.get('message', graph.status_message)
+            elif update_type == 'status_message':
+                self._pending_message = data.get('message', graph.status_message)
+
+        if self._render_pending and self.renderer.frame_due():
+            self.visualize(current_process_message=self._pending_message or graph.status_message,
+                           unspent_notification_node=self._pending_notification_node)
+            return True # Indicates UI was updated
+        return False
+
+    def visualize(self, current_process_message="", unspent_notification_node=None):
+        """Draw a frame now, regardless of max_fps.
+        Only the snapshot of what changed is taken under graph_lock; drawing happens after releasing it."""
+        graph = self.graph
+        started = time.perf_counter()
+
+        with graph.graph_lock:
+            snapshot = self.renderer.snapshot(graph.store)
+
+        title_base = f"UTXO Graph (Max Depth: {graph.max_depth})"
+        display_info = current_process_message or graph.status_message or "Ready"
+        final_title_message = f"{title_base} - {display_info}"
+
+        self.renderer.draw(snapshot, final_title_message, notification_node=unspent_notification_node)
+        graph.stats.observe("visualize_seconds", time.perf_counter() - started)
+        self._render_pending = False
+        self._pending_notification_node = None
+
+    # --- Unfolding summaries (any time) and dragging nodes (only between traces) ---
+
+    def on_button_press(self, event):
+        if event.inaxes != self.ax: return
+        parent = self.renderer.summary_at(event)
+        if parent is not None: # Click on a summary node unfolds it
+            if self.renderer.expand(parent): self._redraw()
+            return
+        if event.button == 3: # Right click on an unfolded node folds its children back
+            node = self.renderer.node_at(event)
+            if node is not None and self.renderer.collapse(node): self._redraw()
+            return
+        if self.graph.is_tracing: # Check overall tracing state
+            self.graph.queue_ui_update('status_message', {'message': "Wait till trace is completed to move nodes."})
+            self._dragged_node = None; return
+        self._dragged_node = self.renderer.node_at(event)
+
+    def _redraw(self):
+        self.visualize(current_process_message=self._pending_message or self.graph.status_message,
+                       unspent_notification_node=self._pending_notification_node)
+
+    def on_motion_notify(self, event):
+        if self.graph.is_tracing or self._dragged_node is None: return
+        if event.inaxes == self.ax:
+            x,y = event.xdata, event.ydata
+            if x is not None and y is not None:
+                self.renderer.move_node(self._dragged_node, x, y) # Moves the existing artists, no full redraw
+
+    def on_button_release(self, event):
+        if self.graph.is_tracing or self._dragged_node is None: self._dragged_node = None; return # Clear if tracing
+        self.graph.queue_ui_update('status_message', {'message': f"Node {self.graph.store.label(self._dragged_node)[:15]} moved"})
+        self._dragged_node = None
@@ -0,0 +1,249 @@
+"""Push-based watching of the unspent frontier, with polling as the fallback.
+
+After a trace, every output in graph.unspent_utxos_found is where the money can
+move next. SpendWatcher subscribes to their addresses over the mempool.space
+websocket ({"track-addresses": [...]}) and reports a spend as soon as a
+transaction spending one of them is announced, so watching costs no requests
+while nothing happens. Outputs the feed can't cover (no address, subscription
+refused) and, while the feed is down or websocket-client isn't installed, all
+watched outputs are polled with bulk outspends requests every poll_interval
+seconds instead. A dropped feed is reconnected in the background.
+
+    watcher = SpendWatcher(graph_manager).start()
+    ...
+    spends = watcher.pop_spends() # [(txid, vout, spending_txid), ...]
+    graph_manager.recheck_outputs([(txid, vout) for txid, vout, _ in spends])
+    watcher.sync() # Watch the new frontier
+
+Needs `pip install websocket-client` for the push feed.
+"""
+import json
+import threading
+
+try:
+    import websocket # websocket-client
+except ImportError:
+    websocket = None
+
+def default_ws_url(base_url):
+    """mempool.space serves REST under .../api and the websocket at .../api/v1/ws."""
+    if not base_url or not base_url.startswith(("http://", "https://")):
+        return None
+    return "ws" + base_url[len("http"):].rstrip("/") + "/v1/ws"
+
+def spent_outpoints(message):
+    """(spent txid, vout, spending txid) for every input of every tx in a websocket message."""
+    txs = []
+    for key in ("address-transactions", "block-transactions"):
+        txs.extend(message.get(key) or [])
+    for per_address in (message.get("multi-address-transactions") or {}).values():
+        txs.extend(per_address.get("mempool") or [])
+        txs.extend(per_address.get("confirmed") or []) # "removed" (evicted/replaced) spends don't count
+    return [(vin["txid"], vin["vout"], tx["txid"])
+            for tx in txs if isinstance(tx, dict) and tx.get("txid")
+            for vin in tx.get("vin") or [] if "txid" in vin and "vout" in vin]
+
+class SpendWatcher:
+    """Reports spends of the outputs in graph.unspent_utxos_found (see module docstring).
+
+    ws_url defaults to the websocket of graph.api.base_url; None (or a backend without one,
+    like blockfile.BlockFileAPI) only polls. Reported spends wait in pop_spends();
+    spend_event is set while there are any.
+    """
+
+    def __init__(self, graph, ws_url="auto", poll_interval=120, reconnect_delay=5, max_reconnect_delay=300,
+                 ping_interval=30):
+        self.graph = graph
+        self.api = graph.api
+        self.ws_url = default_ws_url(getattr(self.api, "base_url", None)) if ws_url == "auto" else ws_url
+        self.poll_interval = poll_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.ping_interval = ping_interval
+        self.connected = False # True while the push feed is up and our subscription was accepted
+        self.spend_event = threading.Event()
+        self._lock = threading.Lock()
+        self._watched = {} # (txid, vout) -> address, or None if it has none
+        self._subscribed = set() # Addresses the feed accepted
+        self._reported = set() # Outpoints already reported, so mempool + confirmed events count once
+        self._spends = []
+        self._ws = None
+        self._poll_now = threading.Event()
+        self._catch_up = False # Next poll checks every watched output: the feed just (re)connected
+        self._stop = threading.Event()
+        self._threads = []
+
+    # --- Watched set ---
+
+    def sync(self):
+        """Watch exactly the current graph.unspent_utxos_found. Call after every trace/refresh.
+        Looks up addresses of new outputs (their txs are normally cached from the trace)."""
+        with self.graph.graph_lock:
+            current = [(entry['txid'], entry['vout']) for entry in self.graph.unspent_utxos_found]
+        with self._lock:
+            new = [outpoint for outpoint in current if outpoint not in self._watched]
+        addresses = {outpoint: self._address_of(*outpoint) for outpoint in new}
+        with self._lock:
+            current_set = set(current)
+            for outpoint in list(self._watched):
+                if outpoint not in current_set:
+                    del self._watched[outpoint]
+            self._watched.update(addresses)
+            # A reported output that is still in the frontier was re-checked and found unspent (the spend was
+            # dropped or replaced, or never re-checked): watch it afresh. Spends not popped yet keep their mark
+            self._reported = {(txid, vout) for txid, vout, _ in self._spends if (txid, vout) in current_set}
+        self._subscribe()
+        return len(current)
+
+    def _address_of(self, txid, vout):
+        tx_details = self.api.get_transaction_details(txid)
+        vouts = (tx_details or {}).get("vout", [])
+        return vouts[vout].get("scriptpubkey_address") if 0 <= vout < len(vouts) else None
+
+    def watched_count(self):
+        with self._lock:
+            return len(self._watched)
+
+    def mode(self):
+        with self._lock:
+            if not self.connected or not self._subscribed:
+                return "polling"
+            covered = all(address in self._subscribed for address in self._watched.values())
+        return "push" if covered else "push+polling"
+
+    # --- Reported spends ---
+
+    def pop_spends(self):
+        """Spends reported since the last call, as (txid, vout, spending_txid)."""
+        with self._lock:
+            spends, self._spends = self._spends, []
+            self.spend_event.clear()
+        return spends
+
+    def _report(self, txid, vout, spending_txid, source):
+        with self._lock:
+            if (txid, vout) not in self._watched or (txid, vout) in self._reported:
+                return
+            self._reported.add((txid, vout))
+            self._spends.append((txid, vout, spending_txid))
+            self.spend_event.set()
+        self.graph.stats.inc("watch_spends", source=source)
+        print(f"[INFO] Watched UTXO {txid}:{vout} spent by {spending_txid} ({source}).")
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Start the feed (if available) and the polling thread. Returns self."""
+        self.sync()
+        if self.ws_url and websocket is None:
+            print("[WARN] websocket-client is not installed (pip install websocket-client); polling instead.")
+        elif self.ws_url:
+            self._threads.append(threading.Thread(target=self._feed_loop, daemon=True))
+        self._threads.append(threading.Thread(target=self._poll_loop, daemon=True))
+        for thread in self._threads: thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._poll_now.set()
+        ws = self._ws
+        if ws: ws.close()
+        for thread in self._threads: thread.join(timeout)
+        self._threads = []
+
+    # --- Push feed ---
+
+    def _feed_loop(self):
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            self._ws = websocket.WebSocketApp(self.ws_url, on_open=self._on_open, on_message=self._on_message,
+                                              on_error=self._on_error)
+            self._ws.run_forever(ping_interval=self.ping_interval, ping_timeout=self.ping_interval / 2)
+            was_connected, self.connected = self.connected, False
+            if self._stop.is_set():
+                break
+            if was_connected:
+                print(f"[WARN] Spend feed {self.ws_url} dropped; polling every {self.poll_interval}s until it is back.")
+                self._poll_now.set() # Cover the gap right away
+                delay = self.reconnect_delay # Back off from scratch after a connection that worked
+            self._stop.wait(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _on_open(self, ws):
+        with self._lock:
+            self._subscribed.clear()
+        self._subscribe()
+
+    def _subscribe(self):
+        """Send the full address list; mempool.space replaces the client's tracked set on every message."""
+        ws = self._ws
+        if ws is None or ws.sock is None or not ws.sock.connected:
+            return
+        with self._lock:
+            addresses = sorted({address for address in self._watched.values() if address})
+        try:
+            ws.send(json.dumps({"track-addresses": addresses}))
+        except Exception as e: # The feed loop notices the dead socket and reconnects
+            print(f"[WARN] Could not subscribe on {self.ws_url}: {e}")
+            return
+        with self._lock:
+            self._subscribed = set(addresses)
+        if not self.connected:
+            self.connected = True
+            self._catch_up = True # Spends from before the subscription were never pushed
+            self._poll_now.set()
+            print(f"[INFO] Watching {len(addresses)} address(es) on {self.ws_url}.")
+
+    def _on_message(self, ws, raw):
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return
+        if not isinstance(message, dict):
+            return
+        for key in ("track-addresses-error", "track-address-error"):
+            if key in message:
+                print(f"[WARN] {self.ws_url} refused the address subscription ({message[key]}); polling instead.")
+                with self._lock:
+                    self._subscribed.clear()
+                self._poll_now.set()
+        for txid, vout, spending_txid in spent_outpoints(message):
+            self._report(txid, vout, spending_txid, "push")
+
+    def _on_error(self, ws, error):
+        if not self._stop.is_set() and self.connected:
+            print(f"[WARN] Spend feed error: {error}")
+
+    # --- Polling fallback ---
+
+    def _unfed(self):
+        """Watched outpoints the push feed doesn't cover right now (all of them after a (re)connect)."""
+        with self._lock:
+            if not self.connected or self._catch_up:
+                self._catch_up = False
+                return [outpoint for outpoint in self._watched if outpoint not in self._reported]
+            return [outpoint for outpoint, address in self._watched.items()
+                    if outpoint not in self._reported and address not in self._subscribed]
+
+    def _poll_loop(self):
+        while not self._stop.is_set():
+            self._poll_now.wait(self.poll_interval)
+            self._poll_now.clear()
+            if self._stop.is_set():
+                break
+            outpoints = self._unfed()
+            if outpoints:
+                try:
+                    self.poll(outpoints)
+                except Exception as e:
+                    print(f"[ERROR] polling watched UTXOs: {e}")
+
+    def poll(self, outpoints):
+        """Check the outspends of `outpoints` over REST (bulk where the backend supports it)."""
+        txids = list(dict.fromkeys(txid for txid, _ in outpoints))
+        self.api.invalidate_outspends_many(txids)
+        outspends = self.api.get_spending_transactions_bulk(txids)
+        for txid, vout in outpoints:
+            spending_txid = (outspends.get(txid) or {}).get(vout)
+            if spending_txid:
+                self._report(txid, vout, spending_txid, "poll")